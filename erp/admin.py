@@ -1,8 +1,38 @@
+from django.conf import settings
 from django.contrib import admin, messages
 from django.core.exceptions import ValidationError
-from django.db.models import Sum
+from django.core.paginator import Paginator
+from django.db.models import QuerySet, Sum
+from django.utils.functional import cached_property
 
-from .models import Product, Customer, SalesOrder, SalesOrderItem, StockMovement
+from .db import estimate_row_count
+from .models import (
+    Product, Customer, SalesOrder, SalesOrderItem, StockMovement, StockMovementArchive,
+    StockSnapshot, DailyCustomerSales, DailyProductSales, Job,
+)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Use the table's estimated size instead of COUNT(*) for unfiltered
+    changelists over ERP_ADMIN_EXACT_COUNT_LIMIT rows.
+    """
+
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        if isinstance(qs, QuerySet) and not qs.query.where:
+            estimate = estimate_row_count(qs.model, qs.db)
+            if estimate is not None and estimate > settings.ERP_ADMIN_EXACT_COUNT_LIMIT:
+                return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # Skip the extra unfiltered COUNT(*) shown next to filtered results.
+    show_full_result_count = False
+    list_per_page = 50
 
 
 class SalesOrderItemInline(admin.TabularInline):
@@ -10,18 +40,24 @@ class SalesOrderItemInline(admin.TabularInline):
     extra = 0
     fields = ("product", "qty", "price", "line_total")
     readonly_fields = ("line_total",)
+    autocomplete_fields = ("product",)
 
 
 @admin.register(SalesOrder)
-class SalesOrderAdmin(admin.ModelAdmin):
+class SalesOrderAdmin(LargeTableAdmin):
     list_display = ("order_number", "customer", "status", "total_amount", "order_date")
+    list_select_related = ("customer",)
+    list_filter = ("status", "order_date")
+    search_fields = ("=order_number", "=customer__code")
+    search_help_text = "Exact order number or customer code."
+    autocomplete_fields = ("customer",)
+    raw_id_fields = ("created_by",)
     inlines = [SalesOrderItemInline]
     readonly_fields = ("total_amount",)
 
     def save_model(self, request, obj, form, change):
-        obj._old_status = None
-        if change and obj.pk:
-            obj._old_status = SalesOrder.objects.get(pk=obj.pk).status
+        # The form's initial data is the row as loaded for this change.
+        obj._old_status = form.initial.get("status") if change else None
         super().save_model(request, obj, form, change)
 
     def save_related(self, request, form, formsets, change):
@@ -49,6 +85,76 @@ class SalesOrderAdmin(admin.ModelAdmin):
             messages.error(request, f"Order status failed: {e}")
 
 
-admin.site.register(Product)
-admin.site.register(Customer)
-admin.site.register(StockMovement)
+@admin.register(Product)
+class ProductAdmin(LargeTableAdmin):
+    list_display = ("sku", "name", "category", "selling_price", "stock_qty")
+    list_filter = ("category",)
+    search_fields = ("^sku",)
+    search_help_text = "SKU prefix."
+    ordering = ("sku",)
+
+
+@admin.register(Customer)
+class CustomerAdmin(LargeTableAdmin):
+    list_display = ("code", "name", "phone", "email", "current_balance")
+    readonly_fields = ("current_balance",)
+    search_fields = ("^code",)
+    search_help_text = "Customer code prefix."
+    ordering = ("code",)
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(LargeTableAdmin):
+    list_display = ("timestamp", "product", "qty", "movement_type", "user")
+    list_select_related = ("product", "user")
+    list_filter = ("movement_type", "timestamp")
+    search_fields = ("=product__sku",)
+    search_help_text = "Exact product SKU."
+    raw_id_fields = ("product", "user")
+    ordering = ("-timestamp", "id")
+
+
+@admin.register(StockMovementArchive)
+class StockMovementArchiveAdmin(LargeTableAdmin):
+    list_display = ("timestamp", "product", "qty", "movement_type", "user")
+    list_select_related = ("product", "user")
+    list_filter = ("movement_type", "timestamp")
+    search_fields = ("=product__sku",)
+    search_help_text = "Exact product SKU."
+    ordering = ("-timestamp", "id")
+
+    # Written only by the archive_stock_movements command.
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(LargeTableAdmin):
+    list_display = ("product", "taken_at", "last_movement_id", "stock_qty")
+    list_select_related = ("product",)
+    raw_id_fields = ("product",)
+
+
+@admin.register(DailyProductSales)
+class DailyProductSalesAdmin(LargeTableAdmin):
+    list_display = ("day", "product", "qty", "revenue")
+    list_select_related = ("product",)
+    raw_id_fields = ("product",)
+
+
+@admin.register(DailyCustomerSales)
+class DailyCustomerSalesAdmin(LargeTableAdmin):
+    list_display = ("day", "customer", "orders", "revenue")
+    list_select_related = ("customer",)
+    raw_id_fields = ("customer",)
+
+
+@admin.register(Job)
+class JobAdmin(LargeTableAdmin):
+    list_display = ("id", "kind", "status", "created_by", "created_at", "finished_at")
+    list_select_related = ("created_by",)
+    list_filter = ("status", "kind")
+    raw_id_fields = ("created_by",)
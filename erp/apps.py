@@ -2,4 +2,8 @@ from django.apps import AppConfig
 
 
 class ErpConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
     name = 'erp'
+
+    def ready(self):
+        from . import db, signals  # noqa: F401
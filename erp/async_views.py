@@ -0,0 +1,245 @@
+"""
+Native async read endpoints for the hot list/retrieve paths.
+
+DRF views are sync-only, so under ASGI each request is pushed through a
+thread. These views authenticate, query (Django async ORM) and serialize on
+the event loop instead. They mirror the sync views' permissions and
+serializers; lists page by primary key with ``?after=<id>``.
+``StockMovementStreamView`` holds its connection open as an SSE stream.
+"""
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework.exceptions import APIException
+from rest_framework.fields import DateTimeField
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .authentication import ClaimsJWTAuthentication, user_from_claims
+from .db import committed_max_id
+from .models import Product, Customer, SalesOrder, StockMovement
+from .pagination import IdCursorPagination
+from .permissions import ProductPermission, CustomerPermission, SalesOrderPermission
+from .serializers import ProductSerializer, CustomerSerializer, SalesOrderSerializer
+from .stock_feed import WAKE, read_movements, stock_feed
+from .versioning import version_etag
+
+
+class AsyncReadAPIView(View):
+    http_method_names = ["get", "head", "options"]
+    queryset = None
+    serializer_class = None
+    permission_classes = []
+
+    async def authenticate(self, request):
+        auth = ClaimsJWTAuthentication()
+        header = auth.get_header(request)
+        raw_token = auth.get_raw_token(header) if header else None
+        if raw_token is None:
+            return None
+
+        token = auth.get_validated_token(raw_token)
+        user = user_from_claims(token)
+        if user is not None:
+            return user
+
+        user_id = token.get(jwt_settings.USER_ID_CLAIM)
+        return await get_user_model().objects.filter(
+            **{jwt_settings.USER_ID_FIELD: user_id, "is_active": True}
+        ).afirst()
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            request.user = await self.authenticate(request)
+        except APIException as exc:
+            return JsonResponse({"detail": str(exc.detail)}, status=exc.status_code)
+        if request.user is None:
+            return JsonResponse(
+                {"detail": "Authentication credentials were not provided."}, status=401
+            )
+
+        for permission in self.permission_classes:
+            if not permission().has_permission(request, self):
+                return JsonResponse(
+                    {"detail": "You do not have permission to perform this action."},
+                    status=403,
+                )
+
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except Http404:
+            return JsonResponse({"detail": "No object matches the given query."}, status=404)
+
+
+class AsyncListAPIView(AsyncReadAPIView):
+    page_size = IdCursorPagination.page_size
+    max_page_size = IdCursorPagination.max_page_size
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.GET.get("page_size", self.page_size))
+        except ValueError:
+            size = self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    async def get(self, request, *args, **kwargs):
+        page_size = self.get_page_size(request)
+        qs = self.queryset.order_by("pk")
+        after = request.GET.get("after")
+        if after:
+            if not after.isdigit():
+                return JsonResponse({"after": "Expected an integer id."}, status=400)
+            qs = qs.filter(pk__gt=int(after))
+
+        rows = [obj async for obj in qs[: page_size + 1]]
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        next_url = None
+        if has_more:
+            params = request.GET.copy()
+            params["after"] = rows[-1].pk
+            next_url = request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+
+        return JsonResponse(
+            {"next": next_url, "results": self.serializer_class(rows, many=True).data}
+        )
+
+
+class AsyncRetrieveAPIView(AsyncReadAPIView):
+    async def get(self, request, pk, *args, **kwargs):
+        try:
+            obj = await self.queryset.aget(pk=pk)
+        except self.queryset.model.DoesNotExist:
+            raise Http404
+        response = JsonResponse(self.serializer_class(obj).data)
+        if hasattr(obj, "version"):
+            response["ETag"] = version_etag(obj.version)
+        return response
+
+
+class AsyncProductListAPIView(AsyncListAPIView):
+    queryset = Product.objects.all()
+    serializer_class = ProductSerializer
+    permission_classes = [ProductPermission]
+
+
+class AsyncProductRetrieveAPIView(AsyncRetrieveAPIView):
+    queryset = Product.objects.all()
+    serializer_class = ProductSerializer
+    permission_classes = [ProductPermission]
+
+
+class AsyncCustomerListAPIView(AsyncListAPIView):
+    queryset = Customer.objects.all()
+    serializer_class = CustomerSerializer
+    permission_classes = [CustomerPermission]
+
+
+class AsyncCustomerRetrieveAPIView(AsyncRetrieveAPIView):
+    queryset = Customer.objects.all()
+    serializer_class = CustomerSerializer
+    permission_classes = [CustomerPermission]
+
+
+class AsyncSalesOrderListAPIView(AsyncListAPIView):
+    queryset = SalesOrder.objects.prefetch_related("items__product")
+    serializer_class = SalesOrderSerializer
+    permission_classes = [SalesOrderPermission]
+
+
+class AsyncSalesOrderRetrieveAPIView(AsyncRetrieveAPIView):
+    queryset = SalesOrder.objects.prefetch_related("items__product")
+    serializer_class = SalesOrderSerializer
+    permission_classes = [SalesOrderPermission]
+
+
+class StockMovementStreamView(AsyncReadAPIView):
+    """
+    Server-Sent Events feed of committed stock movements, so POS clients can
+    follow stock levels instead of polling ``products/``. Each event's id is
+    the ``StockMovement.id`` and its data carries the product's current
+    ``stock_qty``. Movements from any process arrive within
+    ERP_STOCK_FEED_POLL_INTERVAL seconds (see erp/stock_feed.py).
+
+    A client reconnecting with ``Last-Event-ID`` (or ``?last_event_id=``)
+    first gets the movements after that id. If there are more than
+    ERP_STOCK_FEED_BACKLOG of them, or some have been archived, it gets a
+    ``reset`` event instead and should reload ``products/``.
+
+    The stream stays open, so it must be served through the ASGI app
+    (mini_erp/asgi.py).
+    """
+
+    timestamp = DateTimeField()
+
+    async def get(self, request, *args, **kwargs):
+        last_id = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
+        if last_id is not None:
+            try:
+                last_id = int(last_id)
+            except ValueError:
+                last_id = -1
+            if last_id < 0:
+                return JsonResponse({"last_event_id": "Expected a stock movement id."}, status=400)
+
+        subscription = stock_feed.subscribe()
+        try:
+            # Everything up to ``head`` has committed, and the stream follows
+            # on from it, so nothing committed out of id order is skipped.
+            head = await sync_to_async(committed_max_id)(StockMovement)
+            frames = await self.catch_up(last_id, head) if last_id is not None else []
+        except BaseException:
+            subscription.close()
+            raise
+        subscription.position = head
+
+        response = StreamingHttpResponse(
+            self.stream(subscription, frames), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    async def catch_up(self, last_id, head):
+        """The backlog frames for the movements after ``last_id`` up to ``head``."""
+        limit = settings.ERP_STOCK_FEED_BACKLOG
+        events = await sync_to_async(read_movements)(last_id, head, limit + 1)
+        if len(events) > limit or any(
+            event["movement_type"] == StockMovement.MOVEMENT_CARRY_FORWARD for event in events
+        ):
+            return [f"event: reset\nid: {head}\ndata: {{}}\n\n"]
+        return [self.frame(event) for event in events]
+
+    def frame(self, event):
+        data = {**event, "timestamp": self.timestamp.to_representation(event["timestamp"])}
+        return f"id: {event['id']}\ndata: {json.dumps(data)}\n\n"
+
+    async def stream(self, subscription, frames):
+        try:
+            for frame in frames:
+                yield frame
+            tick = min(settings.ERP_STOCK_FEED_POLL_INTERVAL, settings.ERP_STOCK_FEED_KEEPALIVE)
+            last_sent = time.monotonic()
+            while True:
+                try:
+                    event = await subscription.get(tick)
+                except TimeoutError:
+                    event = WAKE
+                if event is WAKE:
+                    await stock_feed.poll()
+                    if time.monotonic() - last_sent >= settings.ERP_STOCK_FEED_KEEPALIVE:
+                        # Keeps proxies from timing out an idle connection.
+                        yield ": keepalive\n\n"
+                        last_sent = time.monotonic()
+                    continue
+                if event is None:
+                    return
+                yield self.frame(event)
+                last_sent = time.monotonic()
+        finally:
+            subscription.close()
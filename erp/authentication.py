@@ -0,0 +1,95 @@
+"""
+JWT authentication without a database hit per request.
+
+Tokens issued by ``RoleClaimsTokenObtainPairSerializer`` (and re-stamped by
+``RoleClaimsTokenRefreshSerializer``) carry a user snapshot, the user's
+Admin/Sales roles read from the database and a token version.
+``ClaimsJWTAuthentication`` builds an unsaved-but-persisted ``User`` from
+those claims while the version still matches ``get_token_version``; role,
+group or user changes bump the version and the token falls back to the
+regular database lookup.
+"""
+from django.contrib.auth import get_user_model
+from django.db import router
+from rest_framework.exceptions import AuthenticationFailed
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .permissions import get_token_version, issue_token_version
+
+ROLE_CLAIMS = frozenset({"Admin", "Sales"})
+
+
+def add_user_claims(token, user):
+    # The version is read first: a change committed in between leaves the
+    # claims newer than the version, never the other way round.
+    token["tv"] = issue_token_version(user.pk)
+    token["username"] = user.get_username()
+    token["is_active"] = user.is_active
+    token["is_staff"] = user.is_staff
+    token["is_superuser"] = user.is_superuser
+    token["roles"] = sorted(ROLE_CLAIMS.intersection(user.groups.values_list("name", flat=True)))
+    return token
+
+
+def user_from_claims(token):
+    """Return a ``User`` built from the token claims, or None if stale."""
+    if "tv" not in token or not token.get("is_active"):
+        return None
+    user_id = token.get(jwt_settings.USER_ID_CLAIM)
+    if user_id is None or token["tv"] != get_token_version(user_id):
+        return None
+
+    User = get_user_model()
+    id_field = User._meta.get_field(jwt_settings.USER_ID_FIELD)
+    user = User(
+        **{id_field.attname: id_field.to_python(user_id)},
+        username=token["username"],
+        is_staff=token["is_staff"],
+        is_superuser=token["is_superuser"],
+        is_active=token["is_active"],
+    )
+    # Behave like a fetched row, so it can be assigned to foreign keys.
+    user._state.adding = False
+    user._state.db = router.db_for_read(User)
+    user._erp_roles = frozenset(token["roles"])
+    return user
+
+
+class RoleClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        # The access token copies these claims from the refresh token.
+        return add_user_claims(super().get_token(user), user)
+
+
+class RoleClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    default_error_messages = {
+        "no_active_account": "No active account found for the given token.",
+    }
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = AccessToken(data["access"])
+        user = get_user_model().objects.filter(
+            **{jwt_settings.USER_ID_FIELD: access[jwt_settings.USER_ID_CLAIM]}
+        ).first()
+        if user is None or not user.is_active:
+            raise AuthenticationFailed(self.error_messages["no_active_account"], "no_active_account")
+        data["access"] = str(add_user_claims(access, user))
+        return data
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        user = user_from_claims(validated_token)
+        if user is None:
+            user = super().get_user(validated_token)
+        return user
+
+
+class ClaimsJWTScheme(SimpleJWTScheme):
+    target_class = ClaimsJWTAuthentication
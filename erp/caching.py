@@ -0,0 +1,125 @@
+"""
+Per-table versions for conditional GET and the optional response cache.
+
+Every write to a cached table bumps its ``TableVersion`` counter in the
+writing transaction, so writes from any process (job workers, management
+commands, other app servers) reach every reader. Read views derive their
+ETag from the versions of the tables they read, answer 304 when the client
+is current, and may serve the rendered body from ``ERP_RESPONSE_CACHE`` (a
+Django cache alias, size-bounded through its MAX_ENTRIES culling plus
+``ERP_RESPONSE_CACHE_MAX_BYTES`` per entry, and expiring with its TIMEOUT).
+
+Readers keep the counters in the default cache for
+``ERP_TABLE_VERSION_CACHE_TIMEOUT`` seconds. The writing process drops its
+copy on commit; every other process sees the write once its copy expires.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+
+VERSION_KEY = "erp:version:{}"
+
+
+def _version_key(label):
+    return VERSION_KEY.format(label)
+
+
+def bump_table_version(model):
+    """Count a change to ``model``'s table as part of the current transaction."""
+    from .models import TableVersion
+
+    label = model._meta.label_lower
+    versions = TableVersion.objects.filter(label=label)
+    if not versions.update(version=F("version") + 1):
+        _, created = TableVersion.objects.get_or_create(label=label, defaults={"version": 1})
+        if not created:
+            # Another transaction created the row first; still count ours.
+            versions.update(version=F("version") + 1)
+    transaction.on_commit(lambda: cache.delete(_version_key(label)))
+
+
+def get_table_versions(models):
+    from .models import TableVersion
+
+    labels = [model._meta.label_lower for model in models]
+    cached = cache.get_many([_version_key(label) for label in labels])
+    versions = {label: cached[_version_key(label)] for label in labels if _version_key(label) in cached}
+    missing = [label for label in labels if label not in versions]
+    if missing:
+        stored = dict(
+            TableVersion.objects.filter(label__in=missing).values_list("label", "version")
+        )
+        fetched = {label: stored.get(label, 0) for label in missing}
+        cache.set_many(
+            {_version_key(label): version for label, version in fetched.items()},
+            settings.ERP_TABLE_VERSION_CACHE_TIMEOUT,
+        )
+        versions.update(fetched)
+    return [versions[label] for label in labels]
+
+
+def get_response_cache():
+    alias = getattr(settings, "ERP_RESPONSE_CACHE", None)
+    return caches[alias] if alias else None
+
+
+class ConditionalGetMixin:
+    """
+    ETag support for read views over ``version_models``, with an optional
+    server-side cache of the rendered response.
+
+    No Last-Modified: HTTP dates have whole-second resolution, so a write in
+    the same second as the last read would still answer If-Modified-Since
+    with a stale 304.
+    """
+
+    version_models = ()
+
+    def get_etag(self, cache_key):
+        """The response's ETag; by default the table-version key itself."""
+        return cache_key
+
+    def get(self, request, *args, **kwargs):
+        versions = get_table_versions(self.version_models)
+        seed = "|".join(
+            [*map(str, versions), request.build_absolute_uri(), request.META.get("HTTP_ACCEPT", "")]
+        )
+        self.cache_key = '"%s"' % hashlib.md5(seed.encode()).hexdigest()
+
+        # A cached body remembers its ETag, so views with their own ETags
+        # still answer conditional requests without touching the database.
+        response_cache = get_response_cache()
+        cached = response_cache.get(self.cache_key) if response_cache else None
+        self.etag = cached[2] if cached is not None else self.get_etag(self.cache_key)
+
+        not_modified = get_conditional_response(request, etag=self.etag)
+        if not_modified is not None:
+            return not_modified
+
+        if cached is not None:
+            content, content_type, _ = cached
+            return HttpResponse(content, content_type=content_type)
+
+        return super().get(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        etag = getattr(self, "etag", None)
+        if etag is None or response.status_code not in (200, 304):
+            return response
+
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+
+        response_cache = get_response_cache()
+        if response_cache and response.status_code == 200 and hasattr(response, "render"):
+            response.render()
+            max_bytes = getattr(settings, "ERP_RESPONSE_CACHE_MAX_BYTES", 256 * 1024)
+            if len(response.content) <= max_bytes:
+                response_cache.set(self.cache_key, (response.content, response["Content-Type"], etag))
+        return response
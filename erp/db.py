@@ -0,0 +1,131 @@
+"""
+Database connection tuning, read-replica routing, row-count estimates and
+commit-ordered id positions.
+
+``configure_sqlite`` applies ``ERP_SQLITE_PRAGMAS`` (WAL, busy_timeout,
+synchronous) to every new SQLite connection. ``ReadReplicaRouter`` sends
+reads made while serving a safe-method request (flagged by
+``ReplicaRoutingMiddleware``) to ``ERP_DB_REPLICA_ALIAS``; writes, reads
+outside a request and anything inside ``transaction.atomic`` stay on the
+primary.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Max
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_use_replica = ContextVar("erp_use_replica", default=False)
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    # Straight on the DB-API connection: connection setup is not request
+    # work, so it stays out of execute wrappers (request metrics) and query
+    # logs.
+    for name, value in getattr(settings, "ERP_SQLITE_PRAGMAS", {}).items():
+        connection.connection.execute(f"PRAGMA {name} = {value}")
+
+
+def replica_alias():
+    alias = getattr(settings, "ERP_DB_REPLICA_ALIAS", None)
+    return alias if alias in settings.DATABASES else None
+
+
+@contextmanager
+def read_from_replica(enabled=True):
+    token = _use_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with read_from_replica(request.method in SAFE_METHODS):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with read_from_replica(request.method in SAFE_METHODS):
+            return await self.get_response(request)
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = replica_alias()
+        if alias is None or not _use_replica.get():
+            return None
+        # Reads inside a transaction must see its own writes and locks.
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+def estimate_row_count(model, using=DEFAULT_DB_ALIAS):
+    """
+    Cheap approximate row count for ``model``'s table, or None if the
+    backend has no estimate. PostgreSQL reads planner statistics; SQLite
+    takes the rowid span, which overcounts only by deleted rows.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+        elif connection.vendor == "sqlite":
+            cursor.execute(
+                f"SELECT MAX(rowid) - MIN(rowid) + 1 FROM {connection.ops.quote_name(table)}"
+            )
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+def committed_max_id(model, using=DEFAULT_DB_ALIAS):
+    """
+    The highest id of ``model`` such that every row at or below it has
+    committed (or rolled back); rows inserted later get higher ids.
+
+    Ids are handed out at insert time but become visible at commit, so on
+    PostgreSQL a lower id can commit after a higher one and ``Max("id")``
+    alone may skip it. A SHARE lock on the table, held just for this
+    read, waits out every transaction still inserting into it. SQLite
+    commits one writer at a time, so its ids already commit in order.
+    Call it outside ``transaction.atomic`` so the lock is released at once.
+    """
+    connection = connections[using]
+    with transaction.atomic(using=using):
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"LOCK TABLE {connection.ops.quote_name(model._meta.db_table)} IN SHARE MODE"
+                )
+        return model._base_manager.using(using).aggregate(pos=Max("id"))["pos"] or 0
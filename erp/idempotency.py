@@ -0,0 +1,104 @@
+"""
+Safe client retries for order writes.
+
+A request sent with an ``Idempotency-Key`` header runs in one transaction
+that starts by inserting an ``IdempotencyKey`` row for (user, key) and ends
+by storing the serialized response on it. A retry with the same key is
+answered from that row in a single lookup, without running the view again.
+A duplicate that arrives while the first request is still running blocks on
+the row's unique index entry until the first commits, then replays its
+response. Reusing a key for a different request gets 422. A request that
+fails with an exception rolls back together with its key, so it can be
+retried.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+# Response headers replayed along with the body.
+STORED_HEADERS = ("Location",)
+
+
+def request_fingerprint(request):
+    data = request.data
+    if hasattr(data, "lists"):
+        data = dict(data.lists())
+    seed = json.dumps(
+        [request.method, request.get_full_path(), data], sort_keys=True, cls=DjangoJSONEncoder
+    )
+    return hashlib.sha256(seed.encode()).hexdigest()
+
+
+def expiry_cutoff():
+    """Keys created before this are past ERP_IDEMPOTENCY_TTL."""
+    return timezone.now() - timedelta(seconds=settings.ERP_IDEMPOTENCY_TTL)
+
+
+class IdempotentMixin:
+    def post(self, request, *args, **kwargs):
+        return self.idempotent(super().post, request, *args, **kwargs)
+
+    def put(self, request, *args, **kwargs):
+        return self.idempotent(super().put, request, *args, **kwargs)
+
+    def patch(self, request, *args, **kwargs):
+        return self.idempotent(super().patch, request, *args, **kwargs)
+
+    def idempotent(self, handler, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return handler(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {"detail": f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        fingerprint = request_fingerprint(request)
+        record = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+        if record is not None and record.created_at < expiry_cutoff():
+            IdempotencyKey.objects.filter(pk=record.pk).delete()
+            record = None
+        if record is not None:
+            return self.replay(record, fingerprint)
+
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(
+                        user=request.user, key=key, fingerprint=fingerprint
+                    )
+            except IntegrityError:
+                # A duplicate got there first; the insert waited for it to commit.
+                return self.replay(
+                    IdempotencyKey.objects.get(user=request.user, key=key), fingerprint
+                )
+
+            response = handler(request, *args, **kwargs)
+            record.status_code = response.status_code
+            record.response = response.data
+            record.headers = {h: response[h] for h in STORED_HEADERS if h in response}
+            record.save(update_fields=["status_code", "response", "headers"])
+        return response
+
+    def replay(self, record, fingerprint):
+        if record.fingerprint != fingerprint:
+            return Response(
+                {"detail": f"{IDEMPOTENCY_HEADER} was already used for a different request."},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        response = Response(record.response, status=record.status_code, headers=record.headers)
+        response[REPLAYED_HEADER] = "true"
+        return response
@@ -0,0 +1,146 @@
+"""
+Streaming product import from XLSX or CSV.
+
+Rows are read one at a time (openpyxl read-only mode / csv reader),
+validated without touching the database, and upserted by ``sku`` in chunks
+with ``bulk_create(update_conflicts=True)``, so memory is bounded by the
+chunk size rather than by the file size. Blank cells count as absent.
+
+New products start at their imported stock; existing ones are brought to it
+by ``adjustment`` stock movements, never by overwriting ``stock_qty``.
+"""
+import csv
+import io
+
+import openpyxl
+from django.db import transaction
+from django.db.models import F
+from rest_framework import serializers
+
+from .caching import bump_table_version
+from .models import Product, set_stock_levels
+
+# Accepts both the field names and the headers of reports/products.xlsx.
+HEADER_ALIASES = {
+    "sku": "sku",
+    "name": "name",
+    "category": "category",
+    "cost": "cost_price",
+    "cost_price": "cost_price",
+    "selling": "selling_price",
+    "selling_price": "selling_price",
+    "stock": "stock_qty",
+    "stock_qty": "stock_qty",
+}
+REQUIRED_COLUMNS = {"sku", "name", "cost_price", "selling_price"}
+MAX_REPORTED_ERRORS = 1000
+
+
+class ProductImportError(Exception):
+    pass
+
+
+class ProductImportRowSerializer(serializers.Serializer):
+    sku = serializers.CharField(max_length=50)
+    name = serializers.CharField(max_length=255)
+    category = serializers.CharField(max_length=100, allow_blank=True, required=False, default="")
+    cost_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    selling_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    stock_qty = serializers.IntegerField(min_value=0, required=False)
+
+
+def read_rows(fileobj, filename):
+    """Yield the rows of an uploaded ``.xlsx`` or ``.csv`` file as tuples."""
+    name = (filename or "").lower()
+    if name.endswith(".xlsx"):
+        wb = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+        try:
+            yield from wb.worksheets[0].iter_rows(values_only=True)
+        finally:
+            wb.close()
+    elif name.endswith(".csv"):
+        text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+        try:
+            for row in csv.reader(text):
+                yield tuple(None if cell == "" else cell for cell in row)
+        finally:
+            text.detach()
+    else:
+        raise ProductImportError("Expected a .xlsx or .csv file.")
+
+
+def _columns(header):
+    columns = [
+        HEADER_ALIASES.get(str(cell).strip().lower()) if cell is not None else None
+        for cell in header
+    ]
+    missing = REQUIRED_COLUMNS.difference(columns)
+    if missing:
+        raise ProductImportError(f"Missing column(s): {', '.join(sorted(missing))}.")
+    return columns
+
+
+def _upsert(chunk, stock, update_fields, user):
+    """Upsert ``chunk`` (``{sku: Product}``); ``stock`` holds the imported stock levels."""
+    with transaction.atomic():
+        existing = dict(Product.objects.filter(sku__in=list(stock)).values_list("sku", "pk"))
+        Product.objects.bulk_create(
+            chunk.values(),
+            update_conflicts=True,
+            unique_fields=["sku"],
+            update_fields=update_fields,
+        )
+        # The upsert leaves version alone on existing rows.
+        Product.objects.filter(sku__in=list(chunk)).update(version=F("version") + 1)
+        if existing:
+            set_stock_levels({pk: stock[sku] for sku, pk in existing.items()}, user=user)
+    return len(chunk)
+
+
+def import_products(rows, chunk_size=1000, user=None):
+    """
+    Upsert products from ``rows`` (header first) and return a summary with
+    the rejected rows (1-based row numbers, as in the spreadsheet). Stock
+    adjustments are recorded against ``user``.
+    """
+    rows = iter(rows)
+    try:
+        columns = _columns(next(rows))
+    except StopIteration:
+        raise ProductImportError("The file is empty.")
+    update_fields = [c for c in dict.fromkeys(columns) if c and c not in ("sku", "stock_qty")]
+
+    upserted = 0
+    rejected = []
+    rejected_count = 0
+    chunk = {}
+    stock = {}
+    for number, row in enumerate(rows, start=2):
+        if all(cell is None for cell in row):
+            continue
+
+        data = {column: value for column, value in zip(columns, row) if column and value is not None}
+        serializer = ProductImportRowSerializer(data=data)
+        if not serializer.is_valid():
+            rejected_count += 1
+            if len(rejected) < MAX_REPORTED_ERRORS:
+                rejected.append({"row": number, "errors": serializer.errors})
+            continue
+
+        # Later rows win when a sku repeats inside a chunk.
+        product = Product(**serializer.validated_data)
+        chunk[product.sku] = product
+        if "stock_qty" in serializer.validated_data:
+            stock[product.sku] = product.stock_qty
+        else:
+            stock.pop(product.sku, None)
+        if len(chunk) >= chunk_size:
+            upserted += _upsert(chunk, stock, update_fields, user)
+            chunk, stock = {}, {}
+
+    if chunk:
+        upserted += _upsert(chunk, stock, update_fields, user)
+    if upserted:
+        bump_table_version(Product)
+
+    return {"upserted": upserted, "rejected_count": rejected_count, "rejected": rejected}
@@ -0,0 +1,24 @@
+"""
+Entry points for ``run_jobs`` pool processes.
+
+Spawned children unpickle these before Django is configured, so this module
+must not import models at import time.
+"""
+
+
+def init_worker_process():
+    import django
+
+    django.setup()
+
+
+def execute_job_in_pool(job_id):
+    from django.db import connections
+
+    from .jobs import execute_job
+
+    try:
+        return execute_job(job_id)
+    finally:
+        # Pool processes are long-lived; do not leave connections idle.
+        connections.close_all()
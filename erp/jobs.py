@@ -0,0 +1,148 @@
+"""
+Database-backed background jobs.
+
+``enqueue`` inserts a ``Job`` row; ``manage.py run_jobs`` claims queued rows
+with a conditional UPDATE (so several workers can share the table) and runs
+them in a process pool. Handlers are registered with ``@job_handler(kind)``
+and return a JSON-serialisable result; they may also attach a file to
+``job.result_file``. Views opt in with ``AsyncJobMixin``: a request sent
+with ``Prefer: respond-async`` (or ``?async=1``) gets ``202 Accepted`` and
+the job's status URL instead of waiting for the work.
+"""
+import logging
+import tempfile
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import Job, Product, SalesOrder, transition_orders
+from .reports import write_products_csv, write_products_xlsx
+
+logger = logging.getLogger(__name__)
+
+JOB_HANDLERS = {}
+
+
+def job_handler(kind):
+    def register(func):
+        JOB_HANDLERS[kind] = func
+        return func
+
+    return register
+
+
+def enqueue(kind, payload=None, user=None):
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind {kind!r}.")
+    return Job.objects.create(kind=kind, payload=payload or {}, created_by=user)
+
+
+def claim_jobs(limit):
+    """Mark up to ``limit`` queued jobs as running and return their ids."""
+    claimed = []
+    candidates = Job.objects.filter(status=Job.STATUS_QUEUED).order_by("id")
+    for pk in candidates.values_list("pk", flat=True)[: limit * 2]:
+        # Another worker may have taken it since the SELECT.
+        taken = Job.objects.filter(pk=pk, status=Job.STATUS_QUEUED).update(
+            status=Job.STATUS_RUNNING,
+            started_at=timezone.now(),
+            attempts=F("attempts") + 1,
+        )
+        if taken:
+            claimed.append(pk)
+            if len(claimed) == limit:
+                break
+    return claimed
+
+
+def requeue_stale_jobs():
+    """Put back jobs whose worker died mid-run; give up after the retry limit."""
+    cutoff = timezone.now() - timedelta(seconds=settings.ERP_JOB_TIMEOUT)
+    stale = Job.objects.filter(status=Job.STATUS_RUNNING, started_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=settings.ERP_JOB_MAX_ATTEMPTS).update(
+        status=Job.STATUS_FAILED, error="Worker did not finish the job.", finished_at=timezone.now()
+    )
+    return stale.update(status=Job.STATUS_QUEUED), failed
+
+
+def finish_job(job_id, error):
+    Job.objects.filter(pk=job_id, status=Job.STATUS_RUNNING).update(
+        status=Job.STATUS_FAILED, error=error, finished_at=timezone.now()
+    )
+
+
+def execute_job(job_id):
+    """Run a claimed job and record its outcome; returns the final status."""
+    job = Job.objects.select_related("created_by").get(pk=job_id)
+    try:
+        job.result = JOB_HANDLERS[job.kind](job)
+    except Exception as exc:
+        logger.exception("Job %s failed", job_id)
+        job.status = Job.STATUS_FAILED
+        job.error = "".join(traceback.format_exception_only(exc)).strip()
+    else:
+        job.status = Job.STATUS_SUCCEEDED
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "result", "result_file", "error", "finished_at"])
+    return job.status
+
+
+@job_handler("products_report")
+def products_report(job):
+    fmt = job.payload.get("format", "xlsx")
+    writers = {"xlsx": write_products_xlsx, "csv": write_products_csv}
+    if fmt not in writers:
+        raise ValueError(f"Unknown report format {fmt!r}.")
+
+    qs = Product.objects.all().order_by("id")
+    options = {"mode": "w+b"} if fmt == "xlsx" else {"mode": "w+", "newline": "", "encoding": "utf-8"}
+    with tempfile.TemporaryFile(**options) as out:
+        writers[fmt](qs, out)
+        out.seek(0)
+        job.result_file.save(f"products_report_{job.pk}.{fmt}", File(out), save=False)
+    return {"rows": qs.count()}
+
+
+@job_handler("order_status")
+def order_status(job):
+    with transaction.atomic():
+        order = SalesOrder.objects.select_for_update().get(pk=job.payload["order_id"])
+        order.set_status(
+            job.payload["status"], user=job.created_by, expected_version=job.payload.get("version")
+        )
+    return {"order_id": order.pk, "status": order.status}
+
+
+@job_handler("order_transition")
+def order_transition(job):
+    results = transition_orders(job.payload["orders"], job.payload["status"], user=job.created_by)
+    return {"results": results}
+
+
+def job_url(request, job):
+    return request.build_absolute_uri(reverse("job-detail", args=[job.pk]))
+
+
+class AsyncJobMixin:
+    def wants_async(self, request):
+        prefer = request.headers.get("Prefer", "")
+        if "respond-async" in (p.strip() for p in prefer.split(",")):
+            return True
+        return request.query_params.get("async") in ("1", "true")
+
+    def accepted(self, job):
+        url = job_url(self.request, job)
+        resp = Response(
+            {"job": job.pk, "kind": job.kind, "status": job.status, "url": url},
+            status=status.HTTP_202_ACCEPTED,
+        )
+        resp["Location"] = url
+        return resp
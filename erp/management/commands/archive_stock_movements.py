@@ -0,0 +1,94 @@
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Case, IntegerField, Max, Sum, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from erp.models import StockMovement, StockMovementArchive
+
+
+class Command(BaseCommand):
+    help = (
+        "Move StockMovement rows from before --before (default: "
+        "ERP_STOCK_MOVEMENT_HOT_DAYS ago) to StockMovementArchive, leaving one "
+        "carry-forward row per product with their sum."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--before", help="ISO date; defaults to ERP_STOCK_MOVEMENT_HOT_DAYS ago.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if options["before"]:
+            before = parse_date(options["before"])
+            if before is None:
+                raise CommandError("--before must be an ISO date.")
+        else:
+            before = timezone.localdate() - timedelta(days=settings.ERP_STOCK_MOVEMENT_HOT_DAYS)
+        cutoff = timezone.make_aware(datetime.combine(before, time.min))
+
+        old = StockMovement.objects.filter(timestamp__lt=cutoff)
+        archived = products = 0
+        last_product = 0
+        while True:
+            chunk = list(
+                old.filter(product_id__gt=last_product)
+                .order_by("product_id")
+                .values_list("product_id", flat=True)
+                .distinct()[:batch_size]
+            )
+            if not chunk:
+                break
+            last_product = chunk[-1]
+            # One transaction per chunk keeps each product's ledger total
+            # intact at every commit without locking the table for the run.
+            with transaction.atomic():
+                archived += self.archive(old.filter(product_id__in=chunk), cutoff, batch_size)
+            products += len(chunk)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Archived {archived} movement(s) of {products} product(s) from before {before}."
+            )
+        )
+
+    def archive(self, rows, cutoff, batch_size):
+        copied = 0
+        batch = []
+        for row in rows.ledger().order_by("id").values(
+            "id", "product_id", "qty", "movement_type", "user_id", "timestamp"
+        ).iterator(chunk_size=batch_size):
+            batch.append(StockMovementArchive(**row))
+            if len(batch) >= batch_size:
+                copied += len(StockMovementArchive.objects.bulk_create(batch))
+                batch = []
+        if batch:
+            copied += len(StockMovementArchive.objects.bulk_create(batch))
+
+        # Earlier carry-forwards are folded into the new sums. Each product
+        # keeps its highest id as the carry-forward row, so the table's max
+        # id (and with it the next id handed out) never moves backwards onto
+        # an archived one.
+        totals = {
+            keep: qty
+            for keep, qty in rows.order_by().values("product_id").annotate(
+                keep=Max("id"), qty=Sum("qty")
+            ).values_list("keep", "qty")
+        }
+        rows.exclude(id__in=list(totals)).delete()
+        StockMovement.objects.filter(id__in=list(totals)).update(
+            qty=Case(
+                *[When(id=keep, then=Value(qty)) for keep, qty in totals.items()],
+                output_field=IntegerField(),
+            ),
+            movement_type=StockMovement.MOVEMENT_CARRY_FORWARD,
+            user=None,
+            # Later than every row it stands for; the ledger pagination
+            # relies on that ordering.
+            timestamp=cutoff,
+        )
+        return copied
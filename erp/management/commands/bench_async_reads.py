@@ -0,0 +1,79 @@
+import asyncio
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from erp.models import Product, Customer, SalesOrder
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the sync read views against their async counterparts "
+        "through the ASGI handler with many concurrent connections."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--username", required=True, help="User to authenticate as.")
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument("--requests", type=int, default=500)
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options["username"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user named {options['username']!r}.")
+        token = str(AccessToken.for_user(user))
+        # The in-process ASGI client always sends Host: testserver.
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "testserver"]
+
+        paths = ["products/", "customers/", "orders/"]
+        for model, prefix in ((Product, "products"), (Customer, "customers"), (SalesOrder, "orders")):
+            pk = model.objects.order_by("pk").values_list("pk", flat=True).first()
+            if pk is not None:
+                paths.append(f"{prefix}/{pk}/")
+
+        self.stdout.write(
+            f"{'endpoint':<24}{'mode':<7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'errors':>8}"
+        )
+        for path in paths:
+            for mode, prefix in (("sync", "/api/"), ("async", "/api/async/")):
+                stats = asyncio.run(
+                    self.bench(prefix + path, token, options["requests"], options["concurrency"])
+                )
+                self.stdout.write(
+                    f"{path:<24}{mode:<7}{stats['rps']:>9.1f}{stats['p50']:>9.1f}"
+                    f"{stats['p95']:>9.1f}{stats['errors']:>8}"
+                )
+
+    async def bench(self, url, token, total, concurrency):
+        client = AsyncClient()
+        headers = {"Authorization": f"Bearer {token}"}
+        latencies = []
+        errors = 0
+        remaining = iter(range(total))
+
+        async def worker():
+            nonlocal errors
+            for _ in remaining:
+                started = time.perf_counter()
+                resp = await client.get(url, headers=headers)
+                latencies.append((time.perf_counter() - started) * 1000)
+                if resp.status_code != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            "rps": total / elapsed,
+            "p50": statistics.median(latencies),
+            "p95": latencies[int(len(latencies) * 0.95) - 1],
+            "errors": errors,
+        }
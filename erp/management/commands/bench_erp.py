@@ -0,0 +1,274 @@
+import json
+import statistics
+import subprocess
+import time
+import tracemalloc
+from itertools import count
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern
+from django.utils import timezone
+
+from erp import urls as erp_urls
+from erp.authentication import RoleClaimsTokenObtainPairSerializer
+from erp.jobs import enqueue, execute_job
+from erp.models import Product, Customer, SalesOrder, StockMovement, StockMovementArchive
+
+JSON = "application/json"
+# Updates need If-Match; the bench does not race itself, so any version will do.
+ANY_VERSION = {"If-Match": "*"}
+# Routes the in-process client cannot time, with the reason.
+UNBENCHED_ROUTES = {
+    "stock-movements/stream/": "SSE stream that never ends; needs an ASGI server",
+}
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "Run every erp API route (plus the order create/confirm/cancel flow) "
+        "against the current database and report latency percentiles, queries "
+        "per request and peak memory as JSON. Writes data: use a seeded copy."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--username", default="bench_admin", help="Admin user to run as.")
+        parser.add_argument("--requests", type=int, default=30, help="Requests per scenario.")
+        parser.add_argument("--output", help="Write the results to this JSON file.")
+        parser.add_argument("--baseline", help="Previous results JSON to compare against.")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            self.user = User.objects.get(username=options["username"])
+        except User.DoesNotExist:
+            raise CommandError(f"No user {options['username']!r}; run seed_erp first.")
+        if not Product.objects.exists() or not Customer.objects.exists():
+            raise CommandError("No products/customers; run seed_erp first.")
+
+        # The in-process client always sends Host: testserver.
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "testserver"]
+        token = RoleClaimsTokenObtainPairSerializer.get_token(self.user).access_token
+        self.client = Client(HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.seq = count()
+        self.run_id = int(time.time())
+
+        scenarios = self.scenarios()
+        self.check_coverage(scenarios)
+
+        results = {}
+        for name, make_request in scenarios:
+            results[name] = self.measure(make_request, options["requests"])
+            self.stdout.write(self.format_row(name, results[name]))
+
+        report = {
+            "commit": self.git_commit(),
+            "created_at": timezone.now().isoformat(),
+            "requests_per_scenario": options["requests"],
+            "dataset": {
+                "products": Product.objects.count(),
+                "customers": Customer.objects.count(),
+                "orders": SalesOrder.objects.count(),
+                "stock_movements": StockMovement.objects.count(),
+                "archived_stock_movements": StockMovementArchive.objects.count(),
+            },
+            "results": results,
+        }
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        if options["baseline"]:
+            self.compare(options["baseline"], results)
+
+    # ----- measurement -----
+
+    def request(self, method, path, data=None, content_type="application/json", headers=None):
+        kwargs = {"headers": headers or {}}
+        if data is not None:
+            kwargs["data"] = json.dumps(data) if content_type == "application/json" else data
+            if content_type:
+                kwargs["content_type"] = content_type
+        resp = getattr(self.client, method)(f"/api/{path}", **kwargs)
+        if resp.streaming:
+            b"".join(resp.streaming_content)
+        return resp
+
+    def measure(self, make_request, n):
+        latencies, queries, statuses = [], [], set()
+        for _ in range(n):
+            method, path, data, content_type, headers = self.normalize(make_request())
+            with CaptureQueriesContext(connections["default"]) as ctx:
+                started = time.perf_counter()
+                resp = self.request(method, path, data, content_type, headers)
+                latencies.append((time.perf_counter() - started) * 1000)
+            queries.append(len(ctx.captured_queries))
+            statuses.add(resp.status_code)
+
+        # Peak memory is measured on one extra request, so tracemalloc's
+        # overhead does not distort the latency figures.
+        method, path, data, content_type, headers = self.normalize(make_request())
+        tracemalloc.start()
+        self.request(method, path, data, content_type, headers)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        return {
+            "p50_ms": round(statistics.median(latencies), 2),
+            "p95_ms": round(_percentile(latencies, 95), 2),
+            "p99_ms": round(_percentile(latencies, 99), 2),
+            "queries_mean": round(statistics.mean(queries), 2),
+            "queries_max": max(queries),
+            "peak_kb": round(peak / 1024, 1),
+            "statuses": sorted(statuses),
+        }
+
+    @staticmethod
+    def normalize(req):
+        method, path, *rest = req
+        data = rest[0] if rest else None
+        content_type = rest[1] if len(rest) > 1 else "application/json"
+        headers = rest[2] if len(rest) > 2 else None
+        return method, path, data, content_type, headers
+
+    # ----- scenarios -----
+
+    def unique(self):
+        return f"{self.run_id}-{next(self.seq)}"
+
+    def new_product(self):
+        return Product.objects.create(
+            sku=f"BENCHTMP-{self.unique()}", name="Bench temp",
+            cost_price=1, selling_price=2, stock_qty=1_000_000,
+        )
+
+    def new_customer(self):
+        return Customer.objects.create(code=f"BENCHTMP-{self.unique()}", name="Bench temp")
+
+    def order_payload(self, status="pending"):
+        products = list(Product.objects.order_by("-stock_qty").values("id", "selling_price")[:3])
+        return {
+            "customer": Customer.objects.order_by("id").values_list("id", flat=True).first(),
+            "order_date": timezone.localdate().isoformat(),
+            "status": status,
+            "items": [
+                {"product": p["id"], "qty": 1, "price": str(p["selling_price"])} for p in products
+            ],
+        }
+
+    def new_order(self):
+        resp = self.request("post", "orders/create/", self.order_payload())
+        return resp.json()["id"]
+
+    def order_flow(self):
+        order_id = self.new_order()
+        self.request("patch", f"orders/{order_id}/update/", {"status": "confirmed"}, headers=ANY_VERSION)
+        return ("patch", f"orders/{order_id}/update/", {"status": "cancelled"}, JSON, ANY_VERSION)
+
+    def import_file(self):
+        from io import BytesIO
+
+        f = BytesIO(
+            f"sku,name,cost_price,selling_price\nBENCHIMP-{self.unique()},Imported,1.00,2.00\n".encode()
+        )
+        f.name = "products.csv"
+        return ("post", "products/import/", {"file": f}, None)
+
+    def scenarios(self):
+        product = Product.objects.order_by("id").first().pk
+        customer = Customer.objects.order_by("id").first().pk
+        order = SalesOrder.objects.order_by("id").values_list("pk", flat=True).first() or self.new_order()
+        movement = StockMovement.objects.order_by("id").values_list("pk", flat=True).first()
+        job = enqueue("products_report", {"format": "csv"}, user=self.user)
+        execute_job(job.pk)
+
+        scenarios = [
+            ("auth/register/", lambda: ("post", "auth/register/", {"username": f"bench-{self.unique()}", "password": "bench-pass-123"})),
+            ("search/", lambda: ("get", "search/?q=product 12&limit=10")),
+            ("products/", lambda: ("get", "products/")),
+            ("products/create/", lambda: ("post", "products/create/", {"sku": f"BENCHNEW-{self.unique()}", "name": "New", "cost_price": "1.00", "selling_price": "2.00"})),
+            ("products/import/", self.import_file),
+            ("products/<int:pk>/", lambda: ("get", f"products/{product}/")),
+            ("products/<int:pk>/update/", lambda: ("patch", f"products/{product}/update/", {"category": "Bench"}, JSON, ANY_VERSION)),
+            ("products/<int:pk>/delete/", lambda: ("delete", f"products/{self.new_product().pk}/delete/")),
+            ("customers/", lambda: ("get", "customers/")),
+            ("customers/create/", lambda: ("post", "customers/create/", {"code": f"BENCHNEW-{self.unique()}", "name": "New"})),
+            ("customers/<int:pk>/", lambda: ("get", f"customers/{customer}/")),
+            ("customers/<int:pk>/update/", lambda: ("patch", f"customers/{customer}/update/", {"address": "Bench"})),
+            ("customers/<int:pk>/delete/", lambda: ("delete", f"customers/{self.new_customer().pk}/delete/")),
+            ("customers/<int:pk>/statement/", lambda: ("get", f"customers/{customer}/statement/")),
+            ("orders/", lambda: ("get", "orders/")),
+            ("orders/create/", lambda: ("post", "orders/create/", self.order_payload())),
+            ("orders/bulk/", lambda: ("post", "orders/bulk/", [self.order_payload() for _ in range(20)])),
+            ("orders/transition/", lambda: ("post", "orders/transition/", {"orders": [self.new_order() for _ in range(20)], "status": "confirmed"})),
+            ("orders/<int:pk>/", lambda: ("get", f"orders/{order}/")),
+            ("orders/<int:pk>/update/", lambda: ("patch", f"orders/{self.new_order()}/update/", {"status": "confirmed"}, JSON, ANY_VERSION)),
+            ("orders/<int:pk>/delete/", lambda: ("delete", f"orders/{self.new_order()}/delete/")),
+            ("flow: create/confirm/cancel", self.order_flow),
+            ("stock-movements/", lambda: ("get", "stock-movements/")),
+            ("stock-movements/<int:pk>/", lambda: ("get", f"stock-movements/{movement}/")),
+            ("reports/products.xlsx", lambda: ("get", "reports/products.xlsx")),
+            ("reports/products.csv", lambda: ("get", "reports/products.csv")),
+            ("reports/products.xlsx (async)", lambda: ("get", "reports/products.xlsx?async=1")),
+            ("jobs/<int:pk>/", lambda: ("get", f"jobs/{job.pk}/")),
+            ("jobs/<int:pk>/result/", lambda: ("get", f"jobs/{job.pk}/result/")),
+            ("reports/sales/products/", lambda: ("get", "reports/sales/products/")),
+            ("reports/sales/customers/", lambda: ("get", "reports/sales/customers/")),
+            ("reports/sales/daily/", lambda: ("get", "reports/sales/daily/")),
+            ("metrics/", lambda: ("get", "metrics/")),
+            ("async/products/", lambda: ("get", "async/products/")),
+            ("async/products/<int:pk>/", lambda: ("get", f"async/products/{product}/")),
+            ("async/customers/", lambda: ("get", "async/customers/")),
+            ("async/customers/<int:pk>/", lambda: ("get", f"async/customers/{customer}/")),
+            ("async/orders/", lambda: ("get", "async/orders/")),
+            ("async/orders/<int:pk>/", lambda: ("get", f"async/orders/{order}/")),
+        ]
+        return scenarios
+
+    def check_coverage(self, scenarios):
+        covered = {name for name, _ in scenarios}
+        routes = {str(p.pattern) for p in erp_urls.urlpatterns if isinstance(p, URLPattern)}
+        for route in sorted(routes - covered - UNBENCHED_ROUTES.keys()):
+            self.stderr.write(self.style.WARNING(f"No benchmark scenario for route {route}"))
+
+    # ----- reporting -----
+
+    def format_row(self, name, r):
+        return (
+            f"{name:<32} p50={r['p50_ms']:>8.2f}ms p95={r['p95_ms']:>8.2f}ms "
+            f"p99={r['p99_ms']:>8.2f}ms q={r['queries_mean']:>6.1f} "
+            f"peak={r['peak_kb']:>9.1f}KiB status={r['statuses']}"
+        )
+
+    def compare(self, path, results):
+        with open(path) as f:
+            baseline = json.load(f)
+        self.stdout.write(f"\nCompared with {path} (commit {baseline.get('commit')}):")
+        for name, current in results.items():
+            previous = baseline["results"].get(name)
+            if not previous:
+                continue
+            change = (current["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"] * 100 if previous["p95_ms"] else 0
+            queries = current["queries_mean"] - previous["queries_mean"]
+            flag = " <-- regression" if change > 20 or queries > 0 else ""
+            self.stdout.write(f"{name:<32} p95 {change:+6.1f}%  queries {queries:+.1f}{flag}")
+
+    @staticmethod
+    def git_commit():
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
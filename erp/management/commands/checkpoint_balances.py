@@ -0,0 +1,78 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import DateField, DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from erp.models import Customer, CustomerBalanceCheckpoint, DailyCustomerSales
+
+ZERO = Value(0, output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+class Command(BaseCommand):
+    help = (
+        "Record each customer's balance at the end of --day (default: the "
+        "last day of the previous month), starting from their previous "
+        "checkpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--day", help="ISO date; defaults to the end of last month.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if options["day"]:
+            day = parse_date(options["day"])
+            if day is None:
+                raise CommandError("--day must be an ISO date.")
+        else:
+            day = timezone.localdate().replace(day=1) - timedelta(days=1)
+
+        previous = CustomerBalanceCheckpoint.objects.filter(
+            customer=OuterRef("pk"), day__lt=day
+        ).order_by("-day")
+        # Revenue after the previous checkpoint (or ever, without one) up to
+        # and including ``day``, read from the daily rollup.
+        revenue = (
+            DailyCustomerSales.objects.filter(
+                customer=OuterRef("pk"), day__gt=OuterRef("previous_day"), day__lte=day
+            )
+            .values("customer")
+            .annotate(total=Sum("revenue"))
+            .values("total")
+        )
+        customers = (
+            Customer.objects.exclude(balance_checkpoints__day=day)
+            .annotate(
+                previous_balance=Subquery(previous.values("balance")[:1]),
+                previous_day=Coalesce(
+                    Subquery(previous.values("day")[:1]), Value(date.min, output_field=DateField())
+                ),
+            )
+            .annotate(moved=Coalesce(Subquery(revenue), ZERO))
+            .order_by("pk")
+            .values_list("pk", "opening_balance", "previous_balance", "moved")
+        )
+
+        created = 0
+        batch = []
+        for pk, opening_balance, previous_balance, moved in customers.iterator(
+            chunk_size=batch_size
+        ):
+            if previous_balance is None:
+                previous_balance = opening_balance or 0
+            batch.append(
+                CustomerBalanceCheckpoint(customer_id=pk, day=day, balance=previous_balance + moved)
+            )
+            if len(batch) >= batch_size:
+                created += len(CustomerBalanceCheckpoint.objects.bulk_create(batch))
+                batch = []
+        if batch:
+            created += len(CustomerBalanceCheckpoint.objects.bulk_create(batch))
+
+        self.stdout.write(self.style.SUCCESS(f"Created {created} balance checkpoint(s) for {day}."))
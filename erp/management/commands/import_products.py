@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from erp.importers import MAX_REPORTED_ERRORS, ProductImportError, import_products, read_rows
+
+
+class Command(BaseCommand):
+    help = "Upsert products by SKU from an .xlsx or .csv file, streaming it in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        try:
+            with open(path, "rb") as f:
+                result = import_products(read_rows(f, path), chunk_size=options["chunk_size"])
+        except (OSError, ProductImportError) as e:
+            raise CommandError(str(e))
+
+        for rejected in result["rejected"]:
+            self.stderr.write(f"Row {rejected['row']}: {rejected['errors']}")
+        if result["rejected_count"] > MAX_REPORTED_ERRORS:
+            self.stderr.write(f"... {result['rejected_count'] - MAX_REPORTED_ERRORS} more rejected row(s).")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Upserted {result['upserted']} product(s), rejected {result['rejected_count']} row(s)."
+            )
+        )
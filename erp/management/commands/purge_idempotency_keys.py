@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from erp.idempotency import expiry_cutoff
+from erp.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Delete idempotency keys older than ERP_IDEMPOTENCY_TTL."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        expired = IdempotencyKey.objects.filter(created_at__lt=expiry_cutoff())
+
+        # Small batches keep each delete's lock short on a busy table.
+        deleted = 0
+        while True:
+            pks = list(expired.values_list("pk", flat=True)[:batch_size])
+            if not pks:
+                break
+            deleted += IdempotencyKey.objects.filter(pk__in=pks).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired idempotency key(s)."))
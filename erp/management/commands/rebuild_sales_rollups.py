@@ -0,0 +1,104 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from erp.caching import bump_table_version
+from erp.models import (
+    Customer, CustomerBalanceCheckpoint, DailyCustomerSales, DailyProductSales,
+    SalesOrder, SalesOrderItem,
+)
+
+ZERO = Value(0, output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the daily sales rollups, customer balances and balance "
+        "checkpoints from all confirmed orders."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        DailyProductSales.objects.all().delete()
+        DailyCustomerSales.objects.all().delete()
+
+        product_rows = (
+            SalesOrderItem.objects.filter(order__status=SalesOrder.STATUS_CONFIRMED)
+            .values("order__order_date", "product_id")
+            .annotate(qty=Sum("qty"), revenue=Sum("line_total"))
+            .order_by()
+        )
+        DailyProductSales.objects.bulk_create(
+            (
+                DailyProductSales(
+                    day=row["order__order_date"],
+                    product_id=row["product_id"],
+                    qty=row["qty"],
+                    revenue=row["revenue"],
+                )
+                for row in product_rows.iterator(chunk_size=batch_size)
+            ),
+            batch_size=batch_size,
+        )
+
+        customer_rows = (
+            SalesOrder.objects.filter(status=SalesOrder.STATUS_CONFIRMED)
+            .values("order_date", "customer_id")
+            .annotate(orders=Count("id", distinct=True), revenue=Sum("items__line_total"))
+            .order_by()
+        )
+        DailyCustomerSales.objects.bulk_create(
+            (
+                DailyCustomerSales(
+                    day=row["order_date"],
+                    customer_id=row["customer_id"],
+                    orders=row["orders"],
+                    revenue=row["revenue"] or 0,
+                )
+                for row in customer_rows.iterator(chunk_size=batch_size)
+            ),
+            batch_size=batch_size,
+        )
+
+        self.rebuild_balances()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt {DailyProductSales.objects.count()} product and "
+                f"{DailyCustomerSales.objects.count()} customer rollup rows."
+            )
+        )
+
+    def rebuild_balances(self):
+        # Balances are the opening balance plus confirmed revenue, which the
+        # customer rollup just rebuilt holds per day.
+        def revenue(**filters):
+            return Coalesce(
+                Subquery(
+                    DailyCustomerSales.objects.filter(**filters)
+                    .values("customer")
+                    .annotate(total=Sum("revenue"))
+                    .values("total")
+                ),
+                ZERO,
+            )
+
+        def opening(customer):
+            return Coalesce(
+                Subquery(Customer.objects.filter(pk=customer).values("opening_balance")[:1]),
+                ZERO,
+            )
+
+        Customer.objects.update(
+            current_balance=Coalesce("opening_balance", ZERO) + revenue(customer=OuterRef("pk"))
+        )
+        CustomerBalanceCheckpoint.objects.update(
+            balance=opening(OuterRef("customer_id"))
+            + revenue(customer=OuterRef("customer_id"), day__lte=OuterRef("day"))
+        )
+        bump_table_version(Customer)
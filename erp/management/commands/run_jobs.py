@@ -0,0 +1,98 @@
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from erp.job_pool import execute_job_in_pool, init_worker_process
+from erp.jobs import claim_jobs, execute_job, finish_job, requeue_stale_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued background jobs (reports, large order confirmations) from "
+        "the Job table in a pool of worker processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=2,
+                            help="Pool size; 0 runs jobs in this process.")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds between polls.")
+        parser.add_argument("--once", action="store_true",
+                            help="Exit once the queue is empty instead of polling forever.")
+
+    def handle(self, *args, **options):
+        requeued, failed = requeue_stale_jobs()
+        if requeued or failed:
+            self.stdout.write(f"Requeued {requeued} stale job(s), failed {failed}.")
+
+        if options["processes"] <= 0:
+            self.run_inline(options)
+        else:
+            self.run_pool(options)
+
+    def run_inline(self, options):
+        while True:
+            claimed = claim_jobs(1)
+            if not claimed:
+                if options["once"]:
+                    return
+                time.sleep(options["poll_interval"])
+                continue
+            self.report(claimed[0], execute_job(claimed[0]))
+
+    def new_pool(self, size):
+        # Children must not inherit this process's open connections.
+        connections.close_all()
+        return ProcessPoolExecutor(
+            max_workers=size,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker_process,
+        )
+
+    def run_pool(self, options):
+        size = options["processes"]
+        pool = self.new_pool(size)
+        running = {}
+        try:
+            while True:
+                free = size - len(running)
+                if free:
+                    for job_id in claim_jobs(free):
+                        running[pool.submit(execute_job_in_pool, job_id)] = job_id
+
+                if not running:
+                    if options["once"]:
+                        return
+                    time.sleep(options["poll_interval"])
+                    continue
+
+                done, _ = wait(running, timeout=options["poll_interval"], return_when=FIRST_COMPLETED)
+                try:
+                    for future in done:
+                        job_id = running.pop(future)
+                        try:
+                            status = future.result()
+                        except BrokenProcessPool:
+                            raise
+                        except Exception as exc:
+                            finish_job(job_id, f"Worker error: {exc}")
+                            status = "failed"
+                        self.report(job_id, status)
+                except BrokenProcessPool:
+                    # A child died (e.g. OOM-killed); every job it shared the
+                    # pool with is lost, so fail them and start a fresh pool.
+                    for job_id in [job_id, *running.values()]:
+                        finish_job(job_id, "Worker process died.")
+                        self.report(job_id, "failed")
+                    running = {}
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = self.new_pool(size)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def report(self, job_id, status):
+        style = self.style.SUCCESS if status == "succeeded" else self.style.ERROR
+        self.stdout.write(style(f"Job #{job_id} {status}."))
@@ -0,0 +1,203 @@
+import random
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.models import Group, User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from erp.models import Product, Customer, SalesOrder, SalesOrderItem, StockMovement
+from erp.numbering import allocate_order_number
+
+CATEGORIES = ["Beverages", "Snacks", "Dairy", "Bakery", "Household", "Personal care", "Frozen", "Produce"]
+BENCH_PASSWORD = "bench-pass-123"
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a reproducible, realistic dataset (skewed SKU popularity, long "
+        "stock-movement history) for load tests and benchmarks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=1000)
+        parser.add_argument("--customers", type=int, default=200)
+        parser.add_argument("--orders", type=int, default=5000)
+        parser.add_argument("--max-lines", type=int, default=8)
+        parser.add_argument("--movements", type=int, default=20000,
+                            help="Extra ledger rows on top of the ones orders produce.")
+        parser.add_argument("--days", type=int, default=365, help="History length.")
+        parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of SKU popularity.")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.today = timezone.localdate()
+        self.days = options["days"]
+
+        admin, sales = self.seed_users()
+        products = self.seed_products(options["products"])
+        customers = self.seed_customers(options["customers"])
+
+        # Zipf-like popularity: a few SKUs take most of the lines.
+        weights = [1 / (rank ** options["skew"]) for rank in range(1, len(products) + 1)]
+        self.cum_weights = list(accumulate(weights))
+        self.products = products
+
+        orders = self.seed_orders(options["orders"], options["max_lines"], customers, sales)
+        movements = self.seed_movements(options["movements"], admin)
+
+        call_command("rebuild_sales_rollups", stdout=self.stdout)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded {len(products)} products, {len(customers)} customers, {orders} orders "
+                f"and {movements} stock movements. Users: bench_admin / bench_sales "
+                f"(password {BENCH_PASSWORD!r})."
+            )
+        )
+
+    def seed_users(self):
+        admin, created = User.objects.get_or_create(
+            username="bench_admin", defaults={"is_staff": True, "is_superuser": True}
+        )
+        if created:
+            admin.set_password(BENCH_PASSWORD)
+            admin.save(update_fields=["password"])
+        sales, created = User.objects.get_or_create(username="bench_sales")
+        if created:
+            sales.set_password(BENCH_PASSWORD)
+            sales.save(update_fields=["password"])
+        sales.groups.add(Group.objects.get_or_create(name="Sales")[0])
+        return admin, sales
+
+    def seed_products(self, count):
+        start = Product.objects.count()
+        products = []
+        for n in range(start, start + count):
+            cost = Decimal(self.rng.randint(50, 50000)) / 100
+            products.append(
+                Product(
+                    sku=f"BENCH-{n:07d}",
+                    name=f"Product {n}",
+                    category=self.rng.choice(CATEGORIES),
+                    cost_price=cost,
+                    selling_price=(cost * Decimal(self.rng.uniform(1.1, 1.8))).quantize(Decimal("0.01")),
+                    stock_qty=self.rng.randint(1000, 100000),
+                )
+            )
+        return Product.objects.bulk_create(products, batch_size=self.batch_size)
+
+    def seed_customers(self, count):
+        start = Customer.objects.count()
+        customers = [
+            Customer(
+                code=f"BC-{n:06d}",
+                name=f"Customer {n}",
+                phone=f"+20{self.rng.randint(10**9, 10**10 - 1)}",
+                opening_balance=Decimal(self.rng.randint(0, 100000)) / 100,
+            )
+            for n in range(start, start + count)
+        ]
+        return Customer.objects.bulk_create(customers, batch_size=self.batch_size)
+
+    def random_moment(self):
+        day = self.today - timedelta(days=self.rng.randrange(self.days))
+        moment = datetime.combine(day, time()) + timedelta(seconds=self.rng.randrange(86400))
+        return day, timezone.make_aware(moment)
+
+    def seed_orders(self, count, max_lines, customers, user):
+        statuses = [SalesOrder.STATUS_CONFIRMED] * 6 + [SalesOrder.STATUS_PENDING] * 3 + [SalesOrder.STATUS_CANCELLED]
+        created = 0
+        while created < count:
+            size = min(self.batch_size, count - created)
+            with transaction.atomic():
+                self.seed_order_batch(size, max_lines, customers, user, statuses)
+            created += size
+        return created
+
+    def seed_order_batch(self, size, max_lines, customers, user, statuses):
+        orders, lines, moments = [], [], []
+        for _ in range(size):
+            day, moment = self.random_moment()
+            picked = self.rng.choices(
+                self.products, cum_weights=self.cum_weights, k=self.rng.randint(1, max_lines)
+            )
+            items = []
+            for product in picked:
+                qty = self.rng.randint(1, 5)
+                items.append(
+                    SalesOrderItem(
+                        product=product,
+                        qty=qty,
+                        price=product.selling_price,
+                        line_total=product.selling_price * qty,
+                    )
+                )
+            orders.append(
+                SalesOrder(
+                    order_number=allocate_order_number(),
+                    customer=self.rng.choice(customers),
+                    order_date=day,
+                    created_by=user,
+                    status=self.rng.choice(statuses),
+                    total_amount=sum(item.line_total for item in items),
+                )
+            )
+            lines.append(items)
+            moments.append(moment)
+
+        SalesOrder.objects.bulk_create(orders)
+        items, movements = [], []
+        for order, order_items, moment in zip(orders, lines, moments):
+            for item in order_items:
+                item.order = order
+                items.append(item)
+                if order.status == SalesOrder.STATUS_PENDING:
+                    continue
+                movements.append(self.movement(item.product, -item.qty, StockMovement.MOVEMENT_SALE, user, moment))
+                if order.status == SalesOrder.STATUS_CANCELLED:
+                    movements.append(
+                        self.movement(item.product, item.qty, StockMovement.MOVEMENT_RETURN, user, moment)
+                    )
+        SalesOrderItem.objects.bulk_create(items, batch_size=self.batch_size)
+        self.insert_movements(movements)
+
+    def seed_movements(self, count, user):
+        created = 0
+        while created < count:
+            size = min(self.batch_size, count - created)
+            movements = []
+            for product in self.rng.choices(self.products, cum_weights=self.cum_weights, k=size):
+                qty = self.rng.randint(1, 10)
+                if self.rng.random() < 0.8:
+                    movements.append(self.movement(product, -qty, StockMovement.MOVEMENT_SALE, user))
+                else:
+                    movements.append(self.movement(product, qty, StockMovement.MOVEMENT_RETURN, user))
+            with transaction.atomic():
+                self.insert_movements(movements)
+            created += size
+        return StockMovement.objects.count()
+
+    def movement(self, product, qty, movement_type, user, moment=None):
+        return StockMovement(
+            product=product,
+            qty=qty,
+            movement_type=movement_type,
+            user=user,
+            timestamp=moment or self.random_moment()[1],
+        )
+
+    def insert_movements(self, movements):
+        # timestamp is auto_now_add, so the insert stamps every row with the
+        # current time; the generated dates are written back afterwards.
+        moments = [movement.timestamp for movement in movements]
+        with transaction.atomic():
+            StockMovement.objects.bulk_create(movements, batch_size=self.batch_size)
+            for movement, moment in zip(movements, moments):
+                movement.timestamp = moment
+            StockMovement.objects.bulk_update(movements, ["timestamp"], batch_size=self.batch_size)
@@ -0,0 +1,82 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from erp.db import committed_max_id
+from erp.models import Product, StockMovement, StockSnapshot, movement_total
+
+
+class Command(BaseCommand):
+    help = (
+        "Record per-product stock snapshots over the StockMovement ledger, "
+        "starting from the last checkpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        # Read before the snapshot transaction starts: every movement up to
+        # ``head`` has committed, and every later one gets a higher id.
+        head = committed_max_id(StockMovement)
+        # Movements are timestamped when inserted, so all of them up to
+        # ``head`` are older than this.
+        taken_at = timezone.now()
+        with transaction.atomic():
+            self.snapshot(head, taken_at, options["batch_size"])
+
+    def snapshot(self, head, taken_at, batch_size):
+        checkpoint = (
+            StockSnapshot.objects.aggregate(pos=Max("last_movement_id"))["pos"] or 0
+        )
+
+        # Only products that moved since the last checkpoint, plus products
+        # that have never been snapshotted, need a new row.
+        moved = StockMovement.objects.filter(id__gt=checkpoint, id__lte=head)
+        previous = StockSnapshot.objects.filter(product=OuterRef("pk")).order_by(
+            "-last_movement_id"
+        )
+        products = (
+            Product.objects.filter(
+                Q(Exists(moved.filter(product=OuterRef("pk"))))
+                | ~Q(Exists(StockSnapshot.objects.filter(product=OuterRef("pk"))))
+            )
+            .annotate(
+                previous_qty=Subquery(previous.values("stock_qty")[:1]),
+                moved_qty=movement_total(id__gt=checkpoint, id__lte=head),
+                later_qty=movement_total(id__gt=head),
+            )
+            .order_by("pk")
+            .values_list("pk", "stock_qty", "previous_qty", "moved_qty", "later_qty")
+        )
+
+        created = 0
+        batch = []
+        for pk, stock_qty, previous_qty, moved_qty, later_qty in products.iterator(
+            chunk_size=batch_size
+        ):
+            if previous_qty is not None:
+                qty = previous_qty + moved_qty
+            else:
+                qty = stock_qty - later_qty
+            batch.append(
+                StockSnapshot(
+                    product_id=pk,
+                    taken_at=taken_at,
+                    last_movement_id=head,
+                    stock_qty=qty,
+                )
+            )
+            if len(batch) >= batch_size:
+                created += len(StockSnapshot.objects.bulk_create(batch))
+                batch = []
+        if batch:
+            created += len(StockSnapshot.objects.bulk_create(batch))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {created} snapshot(s) at movement #{head} "
+                f"(previous checkpoint #{checkpoint})."
+            )
+        )
@@ -0,0 +1,171 @@
+"""
+Per-request latency / SQL instrumentation.
+
+``RequestMetricsMiddleware`` counts and times SQL through
+``connection.execute_wrapper`` (so it works with ``DEBUG = False``), adds a
+``Server-Timing`` header and records in-process histograms per resolved URL,
+which ``metrics_view`` exposes in the Prometheus text format.
+"""
+import bisect
+import hmac
+import threading
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.label_names = label_names
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(s[0]), s[1], s[2]) for labels, s in self._series.items()]
+
+        for labels, counts, total, count in sorted(snapshot):
+            label_str = ",".join(
+                f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels)
+            )
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{label_str},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_str}}} {total}")
+            lines.append(f"{self.name}_count{{{label_str}}} {count}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    "erp_http_request_duration_seconds", "Request latency.", LATENCY_BUCKETS, ("view", "method", "status")
+)
+REQUEST_QUERIES = Histogram(
+    "erp_http_request_queries", "SQL queries per request.", QUERY_BUCKETS, ("view", "method")
+)
+REQUEST_SQL_TIME = Histogram(
+    "erp_http_request_sql_duration_seconds", "SQL time per request.", LATENCY_BUCKETS, ("view", "method")
+)
+RESPONSE_SIZE = Histogram(
+    "erp_http_response_size_bytes", "Response body size (non-streaming).", SIZE_BUCKETS, ("view", "method")
+)
+HISTOGRAMS = (REQUEST_LATENCY, REQUEST_QUERIES, REQUEST_SQL_TIME, RESPONSE_SIZE)
+
+
+class _QueryTimer:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+def _view_label(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    return match.view_name if match.url_name else match.route
+
+
+class RequestMetricsMiddleware:
+    # Async-capable so that, under ASGI, the async views and the SSE stream
+    # do not get pushed through a thread for this middleware's sake.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer = _QueryTimer()
+        started = time.perf_counter()
+        with self.timed_queries(timer):
+            response = self.get_response(request)
+        return self.record(request, response, timer, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        timer = _QueryTimer()
+        started = time.perf_counter()
+        # Connections are per thread, and the async ORM runs in the request's
+        # thread-sensitive worker, so the wrappers go on that thread's ones.
+        stack = await sync_to_async(self.timed_queries)(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.record(request, response, timer, time.perf_counter() - started)
+
+    @staticmethod
+    def timed_queries(timer):
+        stack = ExitStack()
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(timer))
+        return stack
+
+    def record(self, request, response, timer, elapsed):
+        view = _view_label(request)
+        method = request.method
+        REQUEST_LATENCY.observe((view, method, str(response.status_code)), elapsed)
+        REQUEST_QUERIES.observe((view, method), timer.count)
+        REQUEST_SQL_TIME.observe((view, method), timer.duration)
+        if not response.streaming:
+            RESPONSE_SIZE.observe((view, method), len(response.content))
+
+        response["Server-Timing"] = (
+            f"app;dur={elapsed * 1000:.1f}, "
+            f'db;dur={timer.duration * 1000:.1f};desc="{timer.count} queries"'
+        )
+        return response
+
+
+def _metrics_allowed(request):
+    token = getattr(settings, "ERP_METRICS_TOKEN", None)
+    if token:
+        header = request.META.get("HTTP_AUTHORIZATION", "")
+        return hmac.compare_digest(header, f"Bearer {token}")
+    # Without a token, only local / INTERNAL_IPS scrapers are allowed.
+    internal = {"127.0.0.1", "::1", *getattr(settings, "INTERNAL_IPS", ())}
+    return request.META.get("REMOTE_ADDR") in internal
+
+
+def metrics_view(request):
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden()
+    lines = [line for histogram in HISTOGRAMS for line in histogram.render()]
+    return HttpResponse("\n".join(lines) + "\n", content_type="text/plain; version=0.0.4")
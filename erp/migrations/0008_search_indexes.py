@@ -0,0 +1,78 @@
+# Generated by Django 6.0 on 2026-10-17 12:05
+
+from django.db import migrations
+
+# Search indexes for erp/search.py. SQLite gets external-content FTS5 tables
+# kept in sync by triggers (which also fire for bulk_create upserts and
+# queryset updates); PostgreSQL gets pg_trgm GIN indexes.
+
+FTS_TABLES = {
+    "erp_product": ("erp_product_fts", ("sku", "name", "category")),
+    "erp_customer": ("erp_customer_fts", ("code", "name", "phone")),
+}
+
+
+def _sqlite_statements(source, fts, columns):
+    cols = ", ".join(columns)
+    new = ", ".join(f"new.{c}" for c in columns)
+    old = ", ".join(f"old.{c}" for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({cols}, content='{source}', "
+        f"content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='1 2 3')",
+        f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {source} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {source} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END",
+        # Only searchable columns: stock updates must not rewrite the index.
+        f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {cols} ON {source} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+POSTGRES_STATEMENTS = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS product_sku_upper_idx ON erp_product (UPPER(sku) varchar_pattern_ops)",
+    "CREATE INDEX IF NOT EXISTS product_name_trgm_idx ON erp_product USING gin (UPPER(name) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS customer_code_upper_idx ON erp_customer (UPPER(code) varchar_pattern_ops)",
+    "CREATE INDEX IF NOT EXISTS customer_name_trgm_idx ON erp_customer USING gin (UPPER(name) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS customer_phone_trgm_idx ON erp_customer USING gin (phone gin_trgm_ops)",
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        for source, (fts, columns) in FTS_TABLES.items():
+            for sql in _sqlite_statements(source, fts, columns):
+                schema_editor.execute(sql)
+    elif vendor == "postgresql":
+        for sql in POSTGRES_STATEMENTS:
+            schema_editor.execute(sql)
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        for fts, _ in FTS_TABLES.values():
+            for suffix in ("ai", "ad", "au"):
+                schema_editor.execute(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+            schema_editor.execute(f"DROP TABLE IF EXISTS {fts}")
+    elif vendor == "postgresql":
+        for name in (
+            "product_sku_upper_idx", "product_name_trgm_idx", "customer_code_upper_idx",
+            "customer_name_trgm_idx", "customer_phone_trgm_idx",
+        ):
+            schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('erp', '0007_admin_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
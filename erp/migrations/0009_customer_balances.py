@@ -0,0 +1,70 @@
+# Generated by Django 6.0 on 2026-10-17 11:55
+
+from importlib import import_module
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+# Adding current_balance (and, on older SQLite, removing it) rebuilds
+# erp_customer, which drops the FTS5 sync triggers from 0008; they are
+# recreated here.
+search_indexes = import_module("erp.migrations.0008_search_indexes")
+
+
+def restore_customer_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    fts, columns = search_indexes.FTS_TABLES["erp_customer"]
+    for suffix in ("ai", "ad", "au"):
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+    for sql in search_indexes._sqlite_statements("erp_customer", fts, columns):
+        if sql.startswith("CREATE TRIGGER") or "'rebuild'" in sql:
+            schema_editor.execute(sql)
+
+
+def backfill_current_balance(apps, schema_editor):
+    Customer = apps.get_model("erp", "Customer")
+    SalesOrder = apps.get_model("erp", "SalesOrder")
+    confirmed = (
+        SalesOrder.objects.filter(customer=OuterRef("pk"), status="confirmed")
+        .values("customer")
+        .annotate(total=Sum("total_amount"))
+        .values("total")
+    )
+    zero = Value(0, output_field=models.DecimalField(max_digits=14, decimal_places=2))
+    Customer.objects.update(
+        current_balance=Coalesce("opening_balance", zero) + Coalesce(Subquery(confirmed), zero)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('erp', '0008_search_indexes'),
+    ]
+
+    operations = [
+        # Runs last when unapplying, after the column is dropped.
+        migrations.RunPython(migrations.RunPython.noop, restore_customer_search_triggers),
+        migrations.AddField(
+            model_name='customer',
+            name='current_balance',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14),
+        ),
+        migrations.RunPython(restore_customer_search_triggers, migrations.RunPython.noop),
+        migrations.RunPython(backfill_current_balance, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='CustomerBalanceCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_checkpoints', to='erp.customer')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('customer', 'day'), name='balancecheckpoint_unique_day')],
+            },
+        ),
+    ]
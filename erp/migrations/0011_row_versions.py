@@ -0,0 +1,42 @@
+# Generated by Django 6.0 on 2026-10-17 12:05
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+# As in 0009: adding the column rebuilds erp_product on SQLite, dropping the
+# FTS5 sync triggers from 0008.
+search_indexes = import_module("erp.migrations.0008_search_indexes")
+
+
+def restore_product_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    fts, columns = search_indexes.FTS_TABLES["erp_product"]
+    for suffix in ("ai", "ad", "au"):
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+    for sql in search_indexes._sqlite_statements("erp_product", fts, columns):
+        if sql.startswith("CREATE TRIGGER") or "'rebuild'" in sql:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('erp', '0010_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_product_search_triggers),
+        migrations.AddField(
+            model_name='product',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.RunPython(restore_product_search_triggers, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='salesorder',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
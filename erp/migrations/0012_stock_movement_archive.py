@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-17 12:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('erp', '0011_row_versions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='movement_type',
+            field=models.CharField(choices=[('sale', 'Sale'), ('return', 'Return'), ('carry_forward', 'Carried forward')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='StockMovementArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('qty', models.IntegerField()),
+                ('movement_type', models.CharField(choices=[('sale', 'Sale'), ('return', 'Return'), ('carry_forward', 'Carried forward')], max_length=20)),
+                ('timestamp', models.DateTimeField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_stock_movements', to='erp.product')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-timestamp', 'id'], name='stockarchive_ts_id_idx'), models.Index(fields=['product', 'timestamp'], name='stockarchive_product_ts_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-17 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('erp', '0014_user_token_versions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='movement_type',
+            field=models.CharField(choices=[('sale', 'Sale'), ('return', 'Return'), ('adjustment', 'Adjustment'), ('carry_forward', 'Carried forward')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='stockmovementarchive',
+            name='movement_type',
+            field=models.CharField(choices=[('sale', 'Sale'), ('return', 'Return'), ('adjustment', 'Adjustment'), ('carry_forward', 'Carried forward')], max_length=20),
+        ),
+    ]
@@ -1,18 +1,106 @@
+from collections import defaultdict
+from datetime import datetime
+
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models, transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
 from django.utils import timezone
-from django.utils.crypto import get_random_string
+
+from .caching import bump_table_version
+from .stock_feed import stock_feed
 from django.core.exceptions import ValidationError
 
 
+def movement_total(**filters):
+    """
+    Correlated subquery summing ledger ``qty`` for the outer product: the
+    hot ``StockMovement`` rows (without carry-forwards) plus the archived
+    ones, so time- and id-bounded sums see every original movement.
+    """
+
+    def total(queryset):
+        movements = (
+            queryset.filter(product=OuterRef("pk"), **filters)
+            .order_by()
+            .values("product")
+            .annotate(total=Sum("qty"))
+            .values("total")
+        )
+        return Coalesce(Subquery(movements, output_field=IntegerField()), 0)
+
+    return total(StockMovement.objects.ledger()) + total(StockMovementArchive.objects.all())
+
+
+class ProductQuerySet(models.QuerySet):
+    def with_stock_as_of(self, when):
+        """
+        Annotate ``stock_as_of``: stock on hand at ``when``.
+
+        Starts from the latest ``StockSnapshot`` taken at or before ``when``
+        and adds only the movements recorded after it. Products without such
+        a snapshot are rolled back from the current ``stock_qty`` instead.
+        """
+        snapshot = StockSnapshot.objects.filter(
+            product=OuterRef("pk"), taken_at__lte=when
+        ).order_by("-taken_at", "-last_movement_id")
+
+        return self.annotate(
+            snapshot_qty=Subquery(snapshot.values("stock_qty")[:1]),
+            snapshot_position=Subquery(snapshot.values("last_movement_id")[:1]),
+        ).annotate(
+            stock_as_of=Case(
+                When(
+                    snapshot_qty__isnull=False,
+                    then=F("snapshot_qty")
+                    + movement_total(
+                        id__gt=OuterRef("snapshot_position"), timestamp__lte=when
+                    ),
+                ),
+                default=F("stock_qty") - movement_total(timestamp__gt=when),
+                output_field=IntegerField(),
+            )
+        )
+
+
+class VersionConflict(Exception):
+    """The row changed after the version the caller expected."""
+
+
+class RowVersionMixin:
+    """
+    Bumps the model's ``version`` column on every save of an existing row;
+    code that writes with ``queryset.update()`` bumps it in the same
+    statement. Views expose it as the row's ETag (see erp/versioning.py).
+    """
+
+    def save(self, *args, **kwargs):
+        if self._state.adding or kwargs.get("force_insert"):
+            return super().save(*args, **kwargs)
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = [*kwargs["update_fields"], "version"]
+        self.version = F("version") + 1
+        super().save(*args, **kwargs)
+        # Deferred: reloaded from the row on first access, if any.
+        del self.__dict__["version"]
 
-class Product(models.Model):
+
+class Product(RowVersionMixin, models.Model):
     sku = models.CharField(max_length=50, unique=True)
     name = models.CharField(max_length=255)
     category = models.CharField(max_length=100, blank=True)
     cost_price = models.DecimalField(max_digits=10, decimal_places=2)
     selling_price = models.DecimalField(max_digits=10, decimal_places=2)
     stock_qty = models.IntegerField(default=0)
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["category"], name="product_category_idx"),
+        ]
 
     def __str__(self):
         return f"{self.sku} - {self.name}"
@@ -27,12 +115,97 @@ class Customer(models.Model):
     opening_balance = models.DecimalField(
         max_digits=12, decimal_places=2, null=True, blank=True
     )
+    # Opening balance plus confirmed sales; maintained by record_sales().
+    current_balance = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, editable=False
+    )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if "opening_balance" in instance.__dict__:
+            instance._loaded_opening_balance = instance.opening_balance
+        return instance
+
+    @transaction.atomic
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.current_balance = self.opening_balance or 0
+            return super().save(*args, **kwargs)
+
+        # Never write current_balance from a possibly stale instance; order
+        # confirmations move it concurrently. Opening balance edits are
+        # applied to it as a delta instead.
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None:
+            update_fields = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name != "current_balance"
+            ]
+        kwargs["update_fields"] = [f for f in update_fields if f != "current_balance"]
+
+        delta = 0
+        if "opening_balance" in kwargs["update_fields"]:
+            if not hasattr(self, "_loaded_opening_balance"):
+                self._loaded_opening_balance = (
+                    Customer.objects.filter(pk=self.pk).values_list("opening_balance", flat=True).first()
+                )
+            delta = (self.opening_balance or 0) - (self._loaded_opening_balance or 0)
+
+        super().save(*args, **kwargs)
+        if delta:
+            Customer.objects.filter(pk=self.pk).update(current_balance=F("current_balance") + delta)
+            # Checkpoints include the opening balance, so they move with it.
+            self.balance_checkpoints.update(balance=F("balance") + delta)
+            self.current_balance += delta
+        self._loaded_opening_balance = self.opening_balance
 
     def __str__(self):
         return f"{self.code} - {self.name}"
 
 
-class SalesOrder(models.Model):
+class OrderNumberSequence(models.Model):
+    """Next unallocated value of a named order-number sequence."""
+
+    name = models.CharField(max_length=50, unique=True)
+    next_value = models.BigIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.name}: {self.next_value}"
+
+
+class TableVersion(models.Model):
+    """
+    Change counter of a cached table, bumped inside every writing
+    transaction (see erp/caching.py).
+    """
+
+    label = models.CharField(max_length=100, unique=True)
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.label}: {self.version}"
+
+
+class UserTokenVersion(models.Model):
+    """
+    Counter baked into a user's access tokens, bumped whenever their roles
+    or account change (see erp/permissions.py).
+    """
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="token_version",
+    )
+    version = models.BigIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.version}"
+
+
+class SalesOrder(RowVersionMixin, models.Model):
     STATUS_PENDING = "pending"
     STATUS_CONFIRMED = "confirmed"
     STATUS_CANCELLED = "cancelled"
@@ -57,59 +230,80 @@ class SalesOrder(models.Model):
         max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING
     )
     total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "order_date"], name="salesorder_status_date_idx"),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.order_number:
-            self.order_number = get_random_string(10).upper()
+            from .numbering import allocate_order_number
+
+            self.order_number = allocate_order_number()
         super().save(*args, **kwargs)
 
     def __str__(self):
         return self.order_number
-    
-    @transaction.atomic
-    def confirm(self, user=None):
-        items = self.items.select_related("product").all()
-
-        for item in items:
-            if item.product.stock_qty < item.qty:
-                raise ValidationError(
-                    f"Not enough stock for product {item.product.sku}. "
-                    f"Available={item.product.stock_qty}, Requested={item.qty}"
-                )
-
-        for item in items:
-            product = item.product
-            product.stock_qty -= item.qty
-            product.save(update_fields=["stock_qty"])
-
-            StockMovement.objects.create(
-                product=product,
-                qty=-item.qty,
-                movement_type=StockMovement.MOVEMENT_SALE,
-                user=user,
-            )
 
-        self.status = self.STATUS_CONFIRMED
-        self.save(update_fields=["status"])
+    @transaction.atomic
+    def set_status(self, new_status, user=None, expected_version=None):
+        """
+        Move to ``new_status``, applying stock for confirm/cancel. With
+        ``expected_version`` the status write is conditional on it and
+        raises ``VersionConflict`` if the order changed since.
+        """
+        if self.status != self.STATUS_CONFIRMED and new_status == self.STATUS_CONFIRMED:
+            self.confirm(user=user, expected_version=expected_version)
+
+        elif self.status == self.STATUS_CONFIRMED and new_status == self.STATUS_CANCELLED:
+            self.cancel(user=user, expected_version=expected_version)
+
+        else:
+            self._write_status(new_status, expected_version)
+
+    def _write_status(self, new_status, expected_version=None):
+        if expected_version is None:
+            self.status = new_status
+            self.save(update_fields=["status"])
+            return
+
+        # One conditional UPDATE; it runs before any stock row is touched,
+        # so a stale request fails without waiting on product locks.
+        updated = SalesOrder.objects.filter(pk=self.pk, version=expected_version).update(
+            status=new_status, version=F("version") + 1
+        )
+        if not updated:
+            raise VersionConflict(f"Order {self.order_number} changed since version {expected_version}.")
+        self.status = new_status
+        self.version = expected_version + 1
 
     @transaction.atomic
-    def cancel(self, user=None):
-        items = self.items.select_related("product").all()
-
-        for item in items:
-            product = item.product
-            product.stock_qty += item.qty
-            product.save(update_fields=["stock_qty"])
-
-            StockMovement.objects.create(
-                product=product,
-                qty=item.qty,
-                movement_type=StockMovement.MOVEMENT_RETURN,
-                user=user,
-            )
+    def confirm(self, user=None, expected_version=None):
+        self._write_status(self.STATUS_CONFIRMED, expected_version)
+        lines = list(
+            self.items.values_list("product_id", "qty", "line_total").order_by("id")
+        )
+        apply_stock_movements(
+            [(product_id, -qty) for product_id, qty, _ in lines],
+            StockMovement.MOVEMENT_SALE,
+            user=user,
+        )
+        record_sales([(self, lines, 1)])
 
-        self.status = self.STATUS_CANCELLED
-        self.save(update_fields=["status"])
+    @transaction.atomic
+    def cancel(self, user=None, expected_version=None):
+        self._write_status(self.STATUS_CANCELLED, expected_version)
+        lines = list(
+            self.items.values_list("product_id", "qty", "line_total").order_by("id")
+        )
+        apply_stock_movements(
+            [(product_id, qty) for product_id, qty, _ in lines],
+            StockMovement.MOVEMENT_RETURN,
+            user=user,
+        )
+        record_sales([(self, lines, -1)])
 
     def __str__(self):
         return self.order_number
@@ -135,13 +329,26 @@ class SalesOrderItem(models.Model):
         super().save(*args, **kwargs)
 
 
+class StockMovementQuerySet(models.QuerySet):
+    def ledger(self):
+        """Original movements only, without the archiver's carry-forward rows."""
+        return self.exclude(movement_type=StockMovement.MOVEMENT_CARRY_FORWARD)
+
+
 class StockMovement(models.Model):
     MOVEMENT_SALE = "sale"
     MOVEMENT_RETURN = "return"
+    # Stock set directly, e.g. by a product import.
+    MOVEMENT_ADJUSTMENT = "adjustment"
+    # One per product, left by ``archive_stock_movements``: the sum of the
+    # movements it moved to StockMovementArchive.
+    MOVEMENT_CARRY_FORWARD = "carry_forward"
 
     MOVEMENT_CHOICES = [
         (MOVEMENT_SALE, "Sale"),
         (MOVEMENT_RETURN, "Return"),
+        (MOVEMENT_ADJUSTMENT, "Adjustment"),
+        (MOVEMENT_CARRY_FORWARD, "Carried forward"),
     ]
 
     product = models.ForeignKey(
@@ -154,5 +361,528 @@ class StockMovement(models.Model):
     )
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    objects = StockMovementQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-timestamp", "id"], name="stockmove_ts_id_idx"),
+            models.Index(fields=["product", "timestamp"], name="stockmove_product_ts_idx"),
+        ]
+
     def __str__(self):
         return f"{self.product} - {self.qty} ({self.movement_type})"
+
+
+class StockMovementArchive(models.Model):
+    """
+    ``StockMovement`` rows older than the hot window, moved here unchanged
+    (same id) by the ``archive_stock_movements`` command.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="archived_stock_movements"
+    )
+    qty = models.IntegerField()
+    movement_type = models.CharField(max_length=20, choices=StockMovement.MOVEMENT_CHOICES)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    timestamp = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-timestamp", "id"], name="stockarchive_ts_id_idx"),
+            models.Index(fields=["product", "timestamp"], name="stockarchive_product_ts_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.product} - {self.qty} ({self.movement_type}, archived)"
+
+
+class StockSnapshot(models.Model):
+    """
+    Stock of one product after every ledger movement up to
+    ``last_movement_id``; written by the ``snapshot_stock`` command.
+    """
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="stock_snapshots"
+    )
+    taken_at = models.DateTimeField()
+    last_movement_id = models.BigIntegerField()
+    stock_qty = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "last_movement_id"], name="stocksnapshot_unique_position"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["product", "-taken_at"], name="stocksnapshot_product_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.product} @ {self.taken_at}: {self.stock_qty}"
+
+
+class DailyProductSales(models.Model):
+    """Confirmed sales per product and order day, kept current by confirm/cancel."""
+
+    day = models.DateField()
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="daily_sales"
+    )
+    qty = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "product"], name="dailyproductsales_unique_day"),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.product}: {self.qty}"
+
+
+class DailyCustomerSales(models.Model):
+    """Confirmed sales per customer and order day, kept current by confirm/cancel."""
+
+    day = models.DateField()
+    customer = models.ForeignKey(
+        Customer, on_delete=models.CASCADE, related_name="daily_sales"
+    )
+    orders = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "customer"], name="dailycustomersales_unique_day"),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.customer}: {self.revenue}"
+
+
+class CustomerBalanceCheckpoint(models.Model):
+    """
+    A customer's balance at the end of ``day``, written by the
+    ``checkpoint_balances`` command and kept current by confirm/cancel of
+    orders dated on or before it.
+    """
+
+    customer = models.ForeignKey(
+        Customer, on_delete=models.CASCADE, related_name="balance_checkpoints"
+    )
+    day = models.DateField()
+    balance = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["customer", "day"], name="balancecheckpoint_unique_day"),
+        ]
+
+    def __str__(self):
+        return f"{self.customer} @ {self.day}: {self.balance}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    The stored outcome of a request sent with an ``Idempotency-Key`` header,
+    replayed for retries of it (see erp/idempotency.py).
+    """
+
+    key = models.CharField(max_length=255)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="idempotency_keys"
+    )
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    headers = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="idempotencykey_unique_user_key"),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.user_id})"
+
+
+class Job(models.Model):
+    """A unit of background work, run by ``manage.py run_jobs`` (see erp/jobs.py)."""
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_SUCCEEDED = "succeeded"
+    STATUS_FAILED = "failed"
+
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_SUCCEEDED, "Succeeded"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    result = models.JSONField(null=True, blank=True)
+    result_file = models.FileField(upload_to="jobs/", blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="jobs",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "id"], name="job_status_id_idx"),
+        ]
+
+    @property
+    def finished(self):
+        return self.status in (self.STATUS_SUCCEEDED, self.STATUS_FAILED)
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+
+def _stock_error(sku, available, requested):
+    return ValidationError(
+        f"Not enough stock for product {sku}. "
+        f"Available={available}, Requested={requested}"
+    )
+
+
+def apply_stock_movements(lines, movement_type, user=None):
+    """
+    Apply signed ``(product_id, qty)`` lines to ``Product.stock_qty`` and
+    record one ``StockMovement`` per line.
+
+    Quantities are netted per product, the products are locked in id order
+    (so overlapping orders cannot deadlock) and the whole change is written
+    as a single conditional UPDATE plus one bulk INSERT, whatever the number
+    of lines. Raises ``ValidationError`` if any product would go negative.
+    Must be called inside a transaction; once it commits,
+    ``stock-movements/stream/`` subscribers are sent the movements straight
+    away (erp/stock_feed.py).
+    """
+    lines = [(product_id, qty, movement_type) for product_id, qty in lines]
+    if not lines:
+        return []
+
+    deltas = _net_deltas(lines)
+    stock = _lock_stock(deltas)
+    for product_id, (sku, stock_qty) in stock.items():
+        if stock_qty + deltas[product_id] < 0:
+            raise _stock_error(sku, stock_qty, -deltas[product_id])
+    return _write_stock_movements(lines, stock, user)
+
+
+def set_stock_levels(levels, user=None):
+    """
+    Bring each product in ``levels`` (``{product_id: stock_qty}``) to that
+    stock level, recording the difference as an ``adjustment`` movement so
+    the ledger still adds up to ``stock_qty``. Must be called inside a
+    transaction.
+    """
+    stock = _lock_stock(levels)
+    lines = [
+        (product_id, levels[product_id] - stock_qty, StockMovement.MOVEMENT_ADJUSTMENT)
+        for product_id, (_, stock_qty) in stock.items()
+        if levels[product_id] != stock_qty
+    ]
+    if not lines:
+        return []
+    return _write_stock_movements(lines, stock, user=user)
+
+
+def _net_deltas(lines):
+    deltas = defaultdict(int)
+    for product_id, qty, _ in lines:
+        deltas[product_id] += qty
+    return deltas
+
+
+def _lock_stock(product_ids):
+    """Lock the products in id order; returns ``{pk: (sku, stock_qty)}``."""
+    locked = (
+        Product.objects.select_for_update()
+        .filter(pk__in=sorted(product_ids))
+        .order_by("pk")
+        .values_list("pk", "sku", "stock_qty")
+    )
+    return {product_id: (sku, stock_qty) for product_id, sku, stock_qty in locked}
+
+
+def _write_stock_movements(lines, stock, user=None):
+    """
+    Write ``(product_id, qty, movement_type)`` lines, already checked
+    against ``stock`` from ``_lock_stock()``, as one UPDATE and one INSERT.
+    """
+    deltas = _net_deltas(lines)
+    product_ids = sorted(deltas)
+
+    # The stock guard lives in the WHERE clause as well, so the decrement
+    # stays correct on backends where select_for_update() is a no-op.
+    condition = Q()
+    for product_id in product_ids:
+        delta = deltas[product_id]
+        if delta < 0:
+            condition |= Q(pk=product_id, stock_qty__gte=-delta)
+        else:
+            condition |= Q(pk=product_id)
+
+    updated = Product.objects.filter(condition).update(
+        stock_qty=F("stock_qty")
+        + Case(
+            *[When(pk=pk, then=Value(deltas[pk])) for pk in product_ids],
+            default=Value(0),
+            output_field=IntegerField(),
+        ),
+        version=F("version") + 1,
+    )
+    if updated != len(product_ids):
+        for product_id, sku, stock_qty in Product.objects.filter(
+            pk__in=product_ids
+        ).values_list("pk", "sku", "stock_qty"):
+            if stock_qty + deltas[product_id] < 0:
+                raise _stock_error(sku, stock_qty, -deltas[product_id])
+        raise ValidationError("Stock changed concurrently, please retry.")
+
+    bump_table_version(Product)
+
+    movements = StockMovement.objects.bulk_create(
+        [
+            StockMovement(
+                product_id=product_id,
+                qty=qty,
+                movement_type=movement_type,
+                user=user,
+            )
+            for product_id, qty, movement_type in lines
+        ]
+    )
+    transaction.on_commit(stock_feed.notify)
+    return movements
+
+
+def increment_rollups(model, key, deltas):
+    """
+    Add ``deltas`` (``{(day, key_id): {field: delta}}``) to the rollup rows
+    of ``model``, creating missing rows first. Costs one INSERT and one
+    UPDATE however many rows are touched.
+    """
+    if not deltas:
+        return
+
+    model.objects.bulk_create(
+        [model(day=day, **{f"{key}_id": pk}) for day, pk in deltas],
+        ignore_conflicts=True,
+    )
+
+    rows = Q()
+    for day, pk in deltas:
+        rows |= Q(day=day, **{f"{key}_id": pk})
+
+    fields = next(iter(deltas.values())).keys()
+    model.objects.filter(rows).update(
+        **{
+            field: F(field)
+            + Case(
+                *[
+                    When(day=day, **{f"{key}_id": pk}, then=Value(values[field]))
+                    for (day, pk), values in deltas.items()
+                ],
+                default=Value(0),
+                output_field=model._meta.get_field(field),
+            )
+            for field in fields
+        }
+    )
+
+
+def _order_day(order):
+    # order_date defaults to timezone.now(), so an unsaved default is a datetime.
+    if isinstance(order.order_date, datetime):
+        return timezone.localdate(order.order_date)
+    return order.order_date
+
+
+def record_sales(entries):
+    """
+    Apply ``(order, lines, sign)`` entries to the daily sales rollups and
+    the customers' balances and later checkpoints. ``lines`` are the
+    order's ``(product_id, qty, line_total)``; ``sign`` is 1 on confirm and
+    -1 on cancel. The query count does not grow with the number of orders.
+    """
+    products = defaultdict(lambda: {"qty": 0, "revenue": Decimal("0")})
+    customers = defaultdict(lambda: {"orders": 0, "revenue": Decimal("0")})
+    balances = defaultdict(lambda: defaultdict(Decimal))
+    for order, lines, sign in entries:
+        day = _order_day(order)
+        revenue = Decimal("0")
+        for product_id, qty, line_total in lines:
+            products[(day, product_id)]["qty"] += sign * qty
+            products[(day, product_id)]["revenue"] += sign * line_total
+            revenue += sign * line_total
+        customers[(day, order.customer_id)]["orders"] += sign
+        customers[(day, order.customer_id)]["revenue"] += revenue
+        balances[order.customer_id][day] += revenue
+
+    increment_rollups(DailyProductSales, "product", products)
+    increment_rollups(DailyCustomerSales, "customer", customers)
+
+    balances = {
+        customer_id: {day: revenue for day, revenue in days.items() if revenue}
+        for customer_id, days in balances.items()
+    }
+    balances = {customer_id: days for customer_id, days in balances.items() if days}
+    if not balances:
+        return
+
+    Customer.objects.filter(pk__in=list(balances)).update(
+        current_balance=F("current_balance")
+        + Case(
+            *[When(pk=pk, then=Value(sum(days.values()))) for pk, days in balances.items()],
+            default=Value(Decimal("0")),
+            output_field=Customer._meta.get_field("current_balance"),
+        )
+    )
+    # A checkpoint gains the revenue of every order on or before its day:
+    # with each customer's days latest first, the first matching When
+    # carries the running total up to that day.
+    rows = Q()
+    whens = []
+    for customer_id, days in balances.items():
+        rows |= Q(customer_id=customer_id, day__gte=min(days))
+        running = Decimal("0")
+        steps = []
+        for day in sorted(days):
+            running += days[day]
+            steps.append(When(customer_id=customer_id, day__gte=day, then=Value(running)))
+        whens += reversed(steps)
+    CustomerBalanceCheckpoint.objects.filter(rows).update(
+        balance=F("balance")
+        + Case(
+            *whens,
+            default=Value(Decimal("0")),
+            output_field=CustomerBalanceCheckpoint._meta.get_field("balance"),
+        )
+    )
+    bump_table_version(Customer)
+
+
+@transaction.atomic
+def transition_orders(order_ids, new_status, user=None):
+    """
+    Move many orders to ``new_status`` at once, applying stock and sales
+    for the ones being confirmed or cancelled as ``set_status`` would.
+
+    The products of all the orders are locked once. Cancellations are
+    credited first, then each confirmation is checked, in the given order,
+    against the stock left by the ones before it; a confirmation that does
+    not fit is left as it is and reported. Statuses, the netted stock
+    deltas with their movements, and the rollups are each written in bulk.
+    Returns one ``{"id", "ok", ...}`` result per order id, in order.
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    orders = SalesOrder.objects.select_for_update().in_bulk(order_ids)
+    errors = {pk: ["Not found."] for pk in order_ids if pk not in orders}
+
+    confirming, cancelling, others = [], [], []
+    for pk in order_ids:
+        order = orders.get(pk)
+        if order is None:
+            continue
+        if order.status != SalesOrder.STATUS_CONFIRMED and new_status == SalesOrder.STATUS_CONFIRMED:
+            confirming.append(order)
+        elif order.status == SalesOrder.STATUS_CONFIRMED and new_status == SalesOrder.STATUS_CANCELLED:
+            cancelling.append(order)
+        else:
+            others.append(order)
+
+    lines = defaultdict(list)
+    for order_id, *line in (
+        SalesOrderItem.objects.filter(order__in=confirming + cancelling)
+        .order_by("id")
+        .values_list("order_id", "product_id", "qty", "line_total")
+    ):
+        lines[order_id].append(tuple(line))
+
+    stock = _lock_stock({line[0] for order_lines in lines.values() for line in order_lines})
+    available = {product_id: stock_qty for product_id, (_, stock_qty) in stock.items()}
+    movements = []
+    for order in cancelling:
+        for product_id, qty, _ in lines[order.pk]:
+            available[product_id] += qty
+            movements.append((product_id, qty, StockMovement.MOVEMENT_RETURN))
+
+    confirmed = []
+    for order in confirming:
+        needed = defaultdict(int)
+        for product_id, qty, _ in lines[order.pk]:
+            needed[product_id] += qty
+        short = next((pk for pk in sorted(needed) if available[pk] < needed[pk]), None)
+        if short is not None:
+            errors[order.pk] = _stock_error(stock[short][0], available[short], needed[short]).messages
+            continue
+        for product_id, qty in needed.items():
+            available[product_id] -= qty
+        movements += [
+            (product_id, -qty, StockMovement.MOVEMENT_SALE) for product_id, qty, _ in lines[order.pk]
+        ]
+        confirmed.append(order)
+
+    # Guarded on the status each order was read with, so a concurrent
+    # change cannot skip (or repeat) its stock update.
+    moved = confirmed + cancelling + others
+    by_status = defaultdict(list)
+    for order in moved:
+        by_status[order.status].append(order.pk)
+    if moved:
+        guard = Q()
+        for status, pks in by_status.items():
+            guard |= Q(pk__in=pks, status=status)
+        updated = SalesOrder.objects.filter(guard).update(
+            status=new_status, version=F("version") + 1
+        )
+        if updated != len(moved):
+            raise ValidationError("Orders changed concurrently, please retry.")
+
+    if movements:
+        _write_stock_movements(movements, stock, user)
+    record_sales(
+        [(order, lines[order.pk], 1) for order in confirmed]
+        + [(order, lines[order.pk], -1) for order in cancelling]
+    )
+
+    results = []
+    for pk in order_ids:
+        if pk in errors:
+            results.append({"id": pk, "ok": False, "errors": errors[pk]})
+            continue
+        order = orders[pk]
+        order.status = new_status
+        order.version += 1
+        results.append(
+            {
+                "id": pk,
+                "ok": True,
+                "order_number": order.order_number,
+                "status": order.status,
+                "version": order.version,
+            }
+        )
+    return results
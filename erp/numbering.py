@@ -0,0 +1,116 @@
+"""
+Order number allocation.
+
+``SalesOrder.save`` asks the allocator configured by
+``ERP_ORDER_NUMBER_ALLOCATOR`` for a number. The default allocator reserves
+blocks of ``ERP_ORDER_NUMBER_BLOCK_SIZE`` values from an
+``OrderNumberSequence`` row and hands them out from memory, so numbers are
+unique without a per-order round trip or a retry on collision, and they
+increase within a block (which keeps inserts at the right edge of the
+unique index).
+"""
+import threading
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+from django.utils.module_loading import import_string
+
+from .models import OrderNumberSequence
+
+DEFAULT_ALLOCATOR = "erp.numbering.BlockOrderNumberAllocator"
+DEFAULT_FORMAT = "SO-{year}-{seq:06d}"
+DEFAULT_BLOCK_SIZE = 50
+
+
+class RandomOrderNumberAllocator:
+    """The original scheme: ten random upper-case characters."""
+
+    def allocate(self):
+        return get_random_string(10).upper()
+
+
+class _Block:
+    def __init__(self, db, start, end):
+        self.db = db
+        self.next = start
+        self.end = end
+        self.durable = False
+
+    def mark_durable(self):
+        self.durable = True
+
+
+class BlockOrderNumberAllocator:
+    """
+    Hands out numbers from blocks reserved in ``OrderNumberSequence``.
+
+    A block reserved inside a transaction only becomes durable once that
+    transaction commits; if it rolls back, the block is dropped so the same
+    range can never be handed out twice. Blocks are per thread, so each
+    worker allocates without locking.
+    """
+
+    def __init__(self, pattern=None, block_size=None):
+        self.pattern = pattern or getattr(settings, "ERP_ORDER_NUMBER_FORMAT", DEFAULT_FORMAT)
+        self.block_size = block_size or getattr(
+            settings, "ERP_ORDER_NUMBER_BLOCK_SIZE", DEFAULT_BLOCK_SIZE
+        )
+        self._local = threading.local()
+
+    def sequence_name(self, now):
+        # Patterns with {year} restart the sequence every year.
+        if "{year" in self.pattern:
+            return f"sales_order:{now.year}"
+        return "sales_order"
+
+    def allocate(self):
+        now = timezone.localdate()
+        name = self.sequence_name(now)
+        blocks = self._local.__dict__.setdefault("blocks", {})
+
+        block = blocks.get(name)
+        if block is None or block.next >= block.end or not self._is_live(block):
+            block = blocks[name] = self._reserve(name)
+
+        seq = block.next
+        block.next += 1
+        return self.pattern.format(year=now.year, seq=seq)
+
+    def _reserve(self, name):
+        db = router.db_for_write(OrderNumberSequence)
+        sequences = OrderNumberSequence.objects.using(db)
+        with transaction.atomic(using=db):
+            bump = {"next_value": F("next_value") + self.block_size}
+            if not sequences.filter(name=name).update(**bump):
+                sequences.get_or_create(name=name)
+                sequences.filter(name=name).update(**bump)
+            end = sequences.values_list("next_value", flat=True).get(name=name)
+
+        block = _Block(db, end - self.block_size, end)
+        transaction.on_commit(block.mark_durable, using=db)
+        return block
+
+    def _is_live(self, block):
+        if block.durable:
+            return True
+        # Not committed yet: only usable while its transaction is still open,
+        # i.e. while the commit hook is still pending on the connection.
+        pending = connections[block.db].run_on_commit
+        return any(func == block.mark_durable for _, func, _ in pending)
+
+
+_allocators = {}
+
+
+def get_order_number_allocator():
+    path = getattr(settings, "ERP_ORDER_NUMBER_ALLOCATOR", DEFAULT_ALLOCATOR)
+    if path not in _allocators:
+        _allocators[path] = import_string(path)()
+    return _allocators[path]
+
+
+def allocate_order_number():
+    return get_order_number_allocator().allocate()
@@ -0,0 +1,123 @@
+import heapq
+from itertools import islice
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+from .models import StockMovement
+
+
+class IdCursorPagination(CursorPagination):
+    """Keyset pagination on the primary key; page cost does not grow with depth."""
+
+    ordering = "id"
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+
+class StockMovementCursorPagination(IdCursorPagination):
+    ordering = ("-timestamp", "id")
+
+
+class LedgerCursorPagination(StockMovementCursorPagination):
+    """
+    Pages over the stock ledger: the hot ``StockMovement`` rows merged with
+    ``StockMovementArchive``, in ``(-timestamp, id)`` order.
+
+    Cursors hold the last row's ``(timestamp, id)``. Every archived row is
+    older than its product's carry-forward row, so until a page reaches a
+    carry-forward the hot table alone answers it in one query; past that
+    point (and on every backwards page) both tables are read and merged, and
+    the cursor remembers it.
+    """
+
+    def paginate_ledger(self, hot, archive, request, view=None):
+        """
+        ``hot`` and ``archive`` are ``values()`` querysets over StockMovement
+        (carry-forward rows included) and StockMovementArchive.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        position, merged = self.decode_position(self.cursor)
+        reverse = self.cursor is not None and self.cursor.reverse
+        carry_forward = StockMovement.MOVEMENT_CARRY_FORWARD
+
+        rows = None
+        if not merged and not reverse:
+            rows = list(self.after(hot, position, reverse)[: self.page_size + 1])
+            if any(row["movement_type"] == carry_forward for row in rows):
+                rows = None
+        if rows is None:
+            merged = True
+            rows = list(
+                islice(
+                    heapq.merge(
+                        self.after(hot.exclude(movement_type=carry_forward), position, reverse)[
+                            : self.page_size + 1
+                        ],
+                        self.after(archive, position, reverse)[: self.page_size + 1],
+                        key=lambda row: (row["timestamp"], -row["id"]),
+                        reverse=not reverse,
+                    ),
+                    self.page_size + 1,
+                )
+            )
+
+        has_more = len(rows) > self.page_size
+        self.page = rows[: self.page_size]
+        self.merged = merged
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        if (self.has_next or self.has_previous) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    @staticmethod
+    def after(queryset, position, reverse):
+        if reverse:
+            queryset = queryset.order_by("timestamp", "-id")
+        else:
+            queryset = queryset.order_by("-timestamp", "id")
+        if position is None:
+            return queryset
+        timestamp, pk = position
+        if reverse:
+            return queryset.filter(Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__lt=pk))
+        return queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__gt=pk))
+
+    def decode_position(self, cursor):
+        if cursor is None:
+            return None, False
+        try:
+            timestamp, pk, merged = cursor.position.split("|")
+            timestamp = parse_datetime(timestamp)
+            if timestamp is None:
+                raise ValueError
+            return (timestamp, int(pk)), merged == "1"
+        except (AttributeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_position(self, row):
+        return "%s|%d|%d" % (row["timestamp"].isoformat(), row["id"], self.merged)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False, position=self.encode_position(self.page[-1]))
+        )
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=True, position=self.encode_position(self.page[0]))
+        )
@@ -1,12 +1,120 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
 from rest_framework.permissions import BasePermission, SAFE_METHODS
 
+from .caching import bump_table_version, get_table_versions
+from .models import UserTokenVersion
+
+ROLES_CACHE_TIMEOUT = 60 * 10
+TOKEN_VERSION_KEY = "erp:token-version:{}"
+
+
+def _roles_cache_key(user_id, version):
+    return f"erp:roles:{version}:{user_id}"
+
+
+def _user_version(user_id):
+    """The user's ``UserTokenVersion``, or 0 without one."""
+    key = TOKEN_VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = (
+            UserTokenVersion.objects.filter(user_id=user_id).values_list("version", flat=True).first()
+            or 0
+        )
+        cache.set(key, version, settings.ERP_TOKEN_VERSION_CACHE_TIMEOUT)
+    return version
+
+
+def _versions(user_id):
+    (groups,) = get_table_versions([Group])
+    return groups, _user_version(user_id)
+
+
+def get_user_roles(user):
+    """
+    Return the names of the user's groups.
+
+    Resolved once per request (memoised on the user object) and shared
+    across requests through the cache, keyed by the user's versions; see
+    ``invalidate_user_roles``.
+    """
+    roles = getattr(user, "_erp_roles", None)
+    if roles is not None:
+        return roles
+
+    key = _roles_cache_key(user.pk, "%d.%d" % _versions(user.pk))
+    roles = cache.get(key)
+    if roles is None:
+        roles = frozenset(user.groups.values_list("name", flat=True))
+        cache.set(key, roles, ROLES_CACHE_TIMEOUT)
+
+    user._erp_roles = roles
+    return roles
+
+
+def get_token_version(user_id):
+    """
+    Return the user's current token version, or None if none was issued.
+
+    Access tokens carry the version they were issued with; role claims are
+    only trusted while it still matches (see ``erp.authentication``). The
+    versions live in the database and each process caches them for
+    ``ERP_TOKEN_VERSION_CACHE_TIMEOUT`` seconds, which bounds how long
+    another process keeps trusting revoked claims.
+    """
+    groups, version = _versions(user_id)
+    return f"{groups}.{version}" if version else None
+
+
+def issue_token_version(user_id):
+    """Return the token version to stamp on a new token, read from the database."""
+    token_version, _ = UserTokenVersion.objects.get_or_create(user_id=user_id)
+    cache.set(
+        TOKEN_VERSION_KEY.format(user_id),
+        token_version.version,
+        settings.ERP_TOKEN_VERSION_CACHE_TIMEOUT,
+    )
+    (groups,) = get_table_versions([Group])
+    return f"{groups}.{token_version.version}"
+
+
+def invalidate_user_roles(user_ids=None):
+    """
+    Bump the token versions of ``user_ids``, or of every user when None,
+    as part of the current transaction. That drops their cached roles and
+    the role claims of tokens issued before.
+    """
+    if user_ids is None:
+        bump_table_version(Group)
+        return
+
+    user_ids = list(user_ids)
+    # Users without a row yet still need their cached roles dropped.
+    UserTokenVersion.objects.bulk_create(
+        [
+            UserTokenVersion(user_id=pk)
+            for pk in get_user_model().objects.filter(
+                pk__in=user_ids, token_version__isnull=True
+            ).values_list("pk", flat=True)
+        ],
+        ignore_conflicts=True,
+    )
+    UserTokenVersion.objects.filter(user_id__in=user_ids).update(version=F("version") + 1)
+    keys = [TOKEN_VERSION_KEY.format(pk) for pk in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
 
 def is_admin(user):
-    return user.is_superuser or user.groups.filter(name="Admin").exists()
+    return user.is_superuser or "Admin" in get_user_roles(user)
 
 
 def is_sales(user):
-    return user.groups.filter(name="Sales").exists()
+    return "Sales" in get_user_roles(user)
 
 
 class ProductPermission(BasePermission):
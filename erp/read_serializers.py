@@ -0,0 +1,103 @@
+"""
+Read-only fast path for the large listings.
+
+The list views fetch exactly the columns they render with ``values()`` and
+build the response dicts here, skipping per-field ``ModelSerializer`` work.
+Output matches ``ProductSerializer``, ``SalesOrderSerializer`` and
+``StockMovementSerializer`` key for key; values are formatted with the same
+DRF fields those serializers use.
+"""
+from rest_framework import serializers
+
+from .models import SalesOrderItem
+
+_money = serializers.DecimalField(max_digits=12, decimal_places=2)
+_date = serializers.DateField()
+_timestamp = serializers.DateTimeField()
+
+
+PRODUCT_FIELDS = ("id", "sku", "name", "category", "cost_price", "selling_price", "stock_qty", "version")
+
+
+def product_rows(rows):
+    money = _money.to_representation
+    out = []
+    for row in rows:
+        data = {"id": row["id"]}
+        if "stock_as_of" in row:
+            data["stock_as_of"] = row["stock_as_of"]
+        data["sku"] = row["sku"]
+        data["name"] = row["name"]
+        data["category"] = row["category"]
+        data["cost_price"] = money(row["cost_price"])
+        data["selling_price"] = money(row["selling_price"])
+        data["stock_qty"] = row["stock_qty"]
+        data["version"] = row["version"]
+        out.append(data)
+    return out
+
+
+STOCK_MOVEMENT_FIELDS = (
+    "id", "product_id", "product__name", "qty", "movement_type", "user__username", "timestamp",
+)
+
+
+def stock_movement_rows(rows):
+    timestamp = _timestamp.to_representation
+    out = []
+    for row in rows:
+        data = {
+            "id": row["id"],
+            "product": row["product_id"],
+            "product_name": row["product__name"],
+            "qty": row["qty"],
+            "movement_type": row["movement_type"],
+        }
+        # StockMovementSerializer skips ``username`` when there is no user.
+        if row["user__username"] is not None:
+            data["username"] = row["user__username"]
+        data["timestamp"] = timestamp(row["timestamp"])
+        out.append(data)
+    return out
+
+
+SALES_ORDER_FIELDS = (
+    "id", "order_number", "customer_id", "order_date", "status", "total_amount", "version",
+)
+
+
+def sales_order_rows(rows):
+    """Render a page of orders; their items are read in one extra query."""
+    money = _money.to_representation
+    date = _date.to_representation
+
+    items = {row["id"]: [] for row in rows}
+    for item in (
+        SalesOrderItem.objects.filter(order_id__in=list(items))
+        .order_by("id")
+        .values("id", "order_id", "product_id", "product__name", "qty", "price", "line_total")
+    ):
+        items[item["order_id"]].append(
+            {
+                "id": item["id"],
+                "product": item["product_id"],
+                "product_name": item["product__name"],
+                "qty": item["qty"],
+                "price": money(item["price"]),
+                "line_total": money(item["line_total"]),
+            }
+        )
+
+    return [
+        {
+            "id": row["id"],
+            "order_number": row["order_number"],
+            "customer": row["customer_id"],
+            "order_date": date(row["order_date"]),
+            "status": row["status"],
+            "total_amount": money(row["total_amount"]),
+            "version": row["version"],
+            "items": items[row["id"]],
+        }
+        for row in rows
+    ]
@@ -0,0 +1,84 @@
+"""
+Product report writers, shared by the report views and the job worker, and
+customer account statements.
+"""
+import csv
+
+import openpyxl
+from django.db.models import F, Sum, Window
+from openpyxl.utils import get_column_letter
+
+from .models import DailyCustomerSales, SalesOrder
+
+PRODUCT_REPORT_HEADERS = ["ID", "SKU", "Name", "Category", "Cost", "Selling", "Stock"]
+PRODUCT_REPORT_FIELDS = ["id", "sku", "name", "category", "cost_price", "selling_price", "stock_qty"]
+REPORT_CHUNK_SIZE = 2000
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def product_report_rows(qs):
+    """Yield report rows while holding at most one chunk of products in memory."""
+    return qs.values_list(*PRODUCT_REPORT_FIELDS).iterator(chunk_size=REPORT_CHUNK_SIZE)
+
+
+def write_products_xlsx(qs, out):
+    # write_only keeps only the current row in memory and spools the
+    # sheet to disk, so memory stays flat as the catalogue grows.
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Products")
+
+    for col in range(1, len(PRODUCT_REPORT_HEADERS) + 1):
+        ws.column_dimensions[get_column_letter(col)].width = 18
+
+    ws.append(PRODUCT_REPORT_HEADERS)
+    for pk, sku, name, category, cost, selling, stock in product_report_rows(qs):
+        ws.append([pk, sku, name, category, float(cost), float(selling), stock])
+
+    wb.save(out)
+
+
+def write_products_csv(qs, out):
+    writer = csv.writer(out)
+    writer.writerow(PRODUCT_REPORT_HEADERS)
+    writer.writerows(product_report_rows(qs))
+
+
+def customer_statement(customer, start, end):
+    """
+    ``customer``'s confirmed orders dated ``start``..``end`` with a running
+    balance. The opening balance comes from the latest checkpoint before
+    ``start`` plus the daily rollup since, so earlier orders are never read.
+    """
+    checkpoint = (
+        customer.balance_checkpoints.filter(day__lt=start).order_by("-day").values("day", "balance").first()
+    )
+    gap = DailyCustomerSales.objects.filter(customer=customer, day__lt=start)
+    if checkpoint:
+        opening = checkpoint["balance"]
+        gap = gap.filter(day__gt=checkpoint["day"])
+    else:
+        opening = customer.opening_balance or 0
+    opening += gap.aggregate(total=Sum("revenue"))["total"] or 0
+
+    entries = list(
+        SalesOrder.objects.filter(
+            customer=customer, status=SalesOrder.STATUS_CONFIRMED, order_date__range=(start, end)
+        )
+        .annotate(
+            running=Window(Sum("total_amount"), order_by=[F("order_date").asc(), F("id").asc()])
+        )
+        .order_by("order_date", "id")
+        .values("id", "order_number", "order_date", "total_amount", "running")
+    )
+    for entry in entries:
+        entry["balance"] = opening + entry.pop("running")
+
+    return {
+        "customer": customer.pk,
+        "start": start,
+        "end": end,
+        "opening_balance": opening,
+        "closing_balance": entries[-1]["balance"] if entries else opening,
+        "entries": entries,
+    }
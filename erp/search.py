@@ -0,0 +1,89 @@
+"""
+Type-ahead search over products and customers.
+
+On SQLite the lookups go through FTS5 tables (``erp_product_fts``,
+``erp_customer_fts``) that triggers keep in sync with every insert, upsert,
+update and delete of the source rows (see migration 0008). Terms are
+matched as ranked prefixes, SKU/code hits weighted above names. PostgreSQL
+uses the pg_trgm indexes from the same migration; other backends fall back
+to plain prefix/substring filters.
+"""
+import re
+
+from django.db import connections
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .models import Customer, Product
+from .read_serializers import PRODUCT_FIELDS, product_rows
+
+CUSTOMER_FIELDS = ("id", "code", "name", "phone")
+
+# column weights for bm25(), in table column order
+FTS_INDEXES = {
+    Product: ("erp_product_fts", ("sku", "name", "category"), (10.0, 4.0, 1.0)),
+    Customer: ("erp_customer_fts", ("code", "name", "phone"), (10.0, 4.0, 6.0)),
+}
+
+# Same word split as FTS5's unicode61 tokenizer, so "BENCH-0001" becomes
+# "bench" AND "0001".
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def search_terms(query):
+    return _TOKEN_RE.findall(query.lower())[:8]
+
+
+def fts_match_expression(terms):
+    # Each term becomes a quoted prefix query, so user input never reaches
+    # the FTS5 query syntax; terms are ANDed.
+    return " ".join('"%s"*' % term.replace('"', '""') for term in terms)
+
+
+def _fts_search(model, fields, terms, limit, using):
+    table, _, weights = FTS_INDEXES[model]
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    source = qn(model._meta.db_table)
+    columns = ", ".join(f"{source}.{qn(f)}" for f in fields)
+    sql = (
+        f"SELECT {columns} FROM {qn(table)} "
+        f"JOIN {source} ON {source}.{qn('id')} = {qn(table)}.rowid "
+        f"WHERE {qn(table)} MATCH %s "
+        f"ORDER BY bm25({qn(table)}, {', '.join(map(str, weights))}) LIMIT %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [fts_match_expression(terms), limit])
+        return [dict(zip(fields, row)) for row in cursor.fetchall()]
+
+
+def _orm_search(model, fields, terms, limit, using):
+    code_field = "sku" if model is Product else "code"
+    qs = model.objects.using(using)
+    for term in terms:
+        term_filter = Q(**{f"{code_field}__istartswith": term}) | Q(name__icontains=term)
+        if model is Customer:
+            term_filter |= Q(phone__contains=term)
+        qs = qs.filter(term_filter)
+
+    ranking = [Case(When(**{f"{code_field}__istartswith": terms[0]}, then=Value(0)),
+                    default=Value(1), output_field=IntegerField())]
+    if connections[using].vendor == "postgresql":
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        ranking.append(-TrigramWordSimilarity(" ".join(terms), "name"))
+    return list(qs.order_by(*ranking, code_field).values(*fields)[:limit])
+
+
+def search(model, query, limit):
+    """Return up to ``limit`` rows of ``model`` matching ``query``, best first."""
+    terms = search_terms(query)
+    if not terms:
+        return []
+
+    fields = PRODUCT_FIELDS if model is Product else CUSTOMER_FIELDS
+    using = model.objects.db
+    if connections[using].vendor == "sqlite":
+        rows = _fts_search(model, fields, terms, limit, using)
+    else:
+        rows = _orm_search(model, fields, terms, limit, using)
+    return product_rows(rows) if model is Product else rows
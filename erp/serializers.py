@@ -1,9 +1,10 @@
 from decimal import Decimal
 
 from django.db import transaction
+from django.urls import reverse
 from rest_framework import serializers
 
-from .models import Product, Customer, SalesOrder, SalesOrderItem, StockMovement
+from .models import Product, Customer, Job, SalesOrder, SalesOrderItem, StockMovement
 
 from django.contrib.auth.models import User, Group
 from rest_framework import serializers
@@ -37,6 +38,9 @@ class   UserRegisterSerializer(serializers.ModelSerializer):
 
 
 class ProductSerializer(serializers.ModelSerializer):
+    # Only present when the view annotated it (``?as_of=``).
+    stock_as_of = serializers.IntegerField(read_only=True)
+
     class Meta:
         model = Product
         fields = "__all__"
@@ -48,7 +52,65 @@ class CustomerSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+def _parse_pk(value):
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def prefetch_order_relations(orders):
+    """
+    Resolve every product and customer referenced by a batch of raw order
+    payloads in one query each, for use as serializer context.
+    """
+    product_ids, customer_ids = set(), set()
+    for order in orders:
+        if not isinstance(order, dict):
+            continue
+        customer_ids.add(_parse_pk(order.get("customer")))
+        for item in order.get("items") or []:
+            if isinstance(item, dict):
+                product_ids.add(_parse_pk(item.get("product")))
+
+    # Bad pks are left for the serializer field to reject.
+    product_ids.discard(None)
+    customer_ids.discard(None)
+    return {
+        "products": Product.objects.in_bulk(product_ids),
+        "customers": Customer.objects.in_bulk(customer_ids),
+    }
+
+
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Looks the pk up in ``context[context_key]`` when the view prefetched the
+    related rows, and falls back to a per-value query otherwise.
+    """
+
+    def __init__(self, context_key, **kwargs):
+        self.context_key = context_key
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        prefetched = self.context.get(self.context_key)
+        if prefetched is None:
+            return super().to_internal_value(data)
+        pk = _parse_pk(data)
+        if pk is None:
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            return prefetched[pk]
+        except KeyError:
+            self.fail("does_not_exist", pk_value=data)
+
+
 class SalesOrderItemSerializer(serializers.ModelSerializer):
+    product = PrefetchedPrimaryKeyRelatedField(
+        "products", queryset=Product.objects.all()
+    )
     product_name = serializers.ReadOnlyField(source="product.name")
 
     class Meta:
@@ -81,11 +143,14 @@ class StockMovementSerializer(serializers.ModelSerializer):
         ]
 
 class SalesOrderSerializer(serializers.ModelSerializer):
+    customer = PrefetchedPrimaryKeyRelatedField(
+        "customers", queryset=Customer.objects.all()
+    )
     items = SalesOrderItemSerializer(many=True)
 
     class Meta:
         model = SalesOrder
-        fields = ["id", "order_number", "customer", "order_date", "status", "total_amount", "items"]
+        fields = ["id", "order_number", "customer", "order_date", "status", "total_amount", "version", "items"]
         read_only_fields = ["order_number", "total_amount"]
 
     @transaction.atomic
@@ -93,8 +158,7 @@ class SalesOrderSerializer(serializers.ModelSerializer):
         items_data = validated_data.pop("items")
         user = self.context["request"].user
 
-        order = SalesOrder.objects.create(created_by=user, **validated_data)
-
+        items = []
         total = Decimal("0.00")
         for item in items_data:
             product = item["product"]
@@ -102,21 +166,33 @@ class SalesOrderSerializer(serializers.ModelSerializer):
             price = item.get("price") or product.selling_price
 
             line_total = Decimal(price) * qty
-
-            SalesOrderItem.objects.create(
-                order=order,
-                product=product,
-                qty=qty,
-                price=price,
+            items.append(
+                SalesOrderItem(
+                    product=product,
+                    qty=qty,
+                    price=price,
+                    line_total=line_total,
+                )
             )
 
             total += line_total
 
-        order.total_amount = total
-        order.save(update_fields=["total_amount"])
+        order = SalesOrder.objects.create(
+            created_by=user, total_amount=total, **validated_data
+        )
+        for item in items:
+            item.order = order
+        SalesOrderItem.objects.bulk_create(items)
 
         if order.status == SalesOrder.STATUS_CONFIRMED:
-            order.confirm(user=user)
+            order.confirm(user=user, expected_version=order.version)
+
+        # Seed the prefetch cache so the response renders the items just
+        # inserted without reading them (and their products) back.
+        cached_items = order.items.all()
+        cached_items._result_cache = items
+        cached_items._prefetch_done = True
+        order._prefetched_objects_cache = {"items": cached_items}
 
         return order
 
@@ -124,15 +200,82 @@ class SalesOrderSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         user = self.context["request"].user
         new_status = validated_data.get("status", instance.status)
+        instance.set_status(
+            new_status, user=user, expected_version=validated_data.get("expected_version")
+        )
+        return instance
+
 
-        if instance.status != SalesOrder.STATUS_CONFIRMED and new_status == SalesOrder.STATUS_CONFIRMED:
-            instance.confirm(user=user)
+class OrderTransitionSerializer(serializers.Serializer):
+    orders = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=1000
+    )
+    status = serializers.ChoiceField(choices=SalesOrder.STATUS_CHOICES)
 
-        elif instance.status == SalesOrder.STATUS_CONFIRMED and new_status == SalesOrder.STATUS_CANCELLED:
-            instance.cancel(user=user)
 
-        else:
-            instance.status = new_status
-            instance.save(update_fields=["status"])
+class ProductSalesReportSerializer(serializers.Serializer):
+    product = serializers.IntegerField(source="product_id")
+    sku = serializers.CharField(source="product__sku")
+    name = serializers.CharField(source="product__name")
+    qty = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
 
-        return instance
+
+class CustomerSalesReportSerializer(serializers.Serializer):
+    customer = serializers.IntegerField(source="customer_id")
+    code = serializers.CharField(source="customer__code")
+    name = serializers.CharField(source="customer__name")
+    orders = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
+class DailySalesReportSerializer(serializers.Serializer):
+    day = serializers.DateField()
+    orders = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
+class StatementEntrySerializer(serializers.Serializer):
+    order = serializers.IntegerField(source="id")
+    order_number = serializers.CharField()
+    date = serializers.DateField(source="order_date")
+    amount = serializers.DecimalField(max_digits=14, decimal_places=2, source="total_amount")
+    balance = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
+class CustomerStatementSerializer(serializers.Serializer):
+    customer = serializers.IntegerField()
+    start = serializers.DateField()
+    end = serializers.DateField()
+    opening_balance = serializers.DecimalField(max_digits=14, decimal_places=2)
+    closing_balance = serializers.DecimalField(max_digits=14, decimal_places=2)
+    entries = StatementEntrySerializer(many=True)
+
+
+class CustomerSearchSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Customer
+        fields = ["id", "code", "name", "phone"]
+
+
+class SearchResultSerializer(serializers.Serializer):
+    products = ProductSerializer(many=True, required=False)
+    customers = CustomerSearchSerializer(many=True, required=False)
+
+
+class JobSerializer(serializers.ModelSerializer):
+    result_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = [
+            "id", "kind", "status", "payload", "result", "result_url", "error",
+            "attempts", "created_at", "started_at", "finished_at",
+        ]
+
+    def get_result_url(self, obj):
+        if obj.status != Job.STATUS_SUCCEEDED:
+            return None
+        url = reverse("job-result", args=[obj.pk])
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request else url
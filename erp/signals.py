@@ -0,0 +1,42 @@
+from django.contrib.auth.models import Group, User
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .caching import bump_table_version
+from .models import Customer, Product
+from .permissions import invalidate_user_roles
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+
+    if not reverse:
+        invalidate_user_roles([instance.pk])
+    elif pk_set:
+        invalidate_user_roles(pk_set)
+    else:
+        invalidate_user_roles()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, **kwargs):
+    invalidate_user_roles()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, created=False, **kwargs):
+    # Covers is_active / is_superuser / password changes baked into tokens.
+    if not created:
+        invalidate_user_roles([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def catalogue_changed(sender, **kwargs):
+    bump_table_version(sender)
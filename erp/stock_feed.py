@@ -0,0 +1,171 @@
+"""
+Fan-out of committed stock movements to SSE subscribers.
+
+Every open ``stock-movements/stream/`` connection holds a ``Subscription``
+with its own position in the ledger. ``StockFeed.poll`` reads the movements
+past the lowest position once for all of them and pushes each subscriber
+the ones it has not had yet, on that subscriber's event loop. Reads stop at
+``committed_max_id``, so a movement whose transaction commits after one
+with a higher id is still delivered, in id order.
+
+Streams poll at least every ERP_STOCK_FEED_POLL_INTERVAL seconds (one
+database read per interval per process, however many are open), so
+movements committed by any process (job workers, management commands,
+other app servers) reach every subscriber. ``apply_stock_movements`` also
+calls ``notify`` on commit, which polls straight away for this process's
+own movements.
+"""
+import asyncio
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .db import committed_max_id
+
+# Queued for a subscriber when a poll is due.
+WAKE = object()
+
+
+def read_movements(after, upto, limit):
+    """
+    The events for movements with ``after < id <= upto``, oldest first and
+    at most ``limit`` of them. ``stock_qty`` is the product's current level.
+    """
+    from .models import StockMovement
+
+    rows = (
+        StockMovement.objects.filter(id__gt=after, id__lte=upto)
+        .order_by("id")
+        .values("id", "product_id", "qty", "movement_type", "product__stock_qty", "timestamp")[:limit]
+    )
+    return [
+        {
+            "id": row["id"],
+            "product": row["product_id"],
+            "qty": row["qty"],
+            "movement_type": row["movement_type"],
+            "stock_qty": row["product__stock_qty"],
+            "timestamp": row["timestamp"],
+        }
+        for row in rows
+    ]
+
+
+class Subscription:
+    def __init__(self, feed, loop):
+        self.feed = feed
+        self.loop = loop
+        self.queue = asyncio.Queue()
+        self.overflowed = False
+        # The last movement id sent; None until the stream starts following.
+        self.position = None
+
+    def push(self, events):
+        # Runs on the subscriber's event loop.
+        if self.overflowed:
+            return
+        if self.queue.qsize() + len(events) > settings.ERP_STOCK_FEED_MAX_PENDING:
+            # A stalled client: end its stream instead of buffering without
+            # bound. It reconnects with Last-Event-ID and catches up.
+            self.overflowed = True
+            self.queue.put_nowait(None)
+            return
+        for event in events:
+            self.queue.put_nowait(event)
+
+    def wake(self):
+        # Runs on the subscriber's event loop.
+        if not self.overflowed and self.queue.empty():
+            self.queue.put_nowait(WAKE)
+
+    async def get(self, timeout):
+        """
+        The next event, ``WAKE`` when a poll is due, or ``None`` once
+        overflowed. Raises TimeoutError.
+        """
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.feed.unsubscribe(self)
+
+
+class StockFeed:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._subscribers = set()
+        self._last_poll = 0.0
+        self._due = False
+
+    def subscribe(self):
+        """Register the running event loop's caller for new movements."""
+        subscription = Subscription(self, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def notify(self):
+        """New movements have committed: have the next stream poll at once."""
+        self._due = True
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            self._call(subscription, subscription.wake)
+
+    def _call(self, subscription, method, *args):
+        try:
+            subscription.loop.call_soon_threadsafe(method, *args)
+        except RuntimeError:
+            # Its loop is gone; the stream never got to clean up.
+            self.unsubscribe(subscription)
+
+    async def poll(self):
+        await sync_to_async(self.poll_sync)()
+
+    def poll_sync(self):
+        """
+        Push the movements committed since the last poll to the following
+        subscribers, unless another poll is running or the last one was
+        under ERP_STOCK_FEED_POLL_INTERVAL ago and nothing was notified.
+        """
+        if not self._poll_lock.acquire(blocking=False):
+            return
+        try:
+            if not self._due and (
+                time.monotonic() - self._last_poll < settings.ERP_STOCK_FEED_POLL_INTERVAL
+            ):
+                return
+            self._due = False
+            self._last_poll = time.monotonic()
+            with self._lock:
+                subscribers = [s for s in self._subscribers if s.position is not None]
+            if not subscribers:
+                return
+
+            from .models import StockMovement
+
+            low = min(subscription.position for subscription in subscribers)
+            head = committed_max_id(StockMovement)
+            limit = settings.ERP_STOCK_FEED_BACKLOG
+            events = read_movements(low, head, limit)
+            upto = head
+            if len(events) == limit:
+                # Pick up the rest on the next stream's turn.
+                upto = events[-1]["id"]
+                self._due = True
+            for subscription in subscribers:
+                pending = [event for event in events if event["id"] > subscription.position]
+                subscription.position = max(subscription.position, upto)
+                if pending:
+                    self._call(subscription, subscription.push, pending)
+        finally:
+            self._poll_lock.release()
+
+
+stock_feed = StockFeed()
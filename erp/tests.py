@@ -1 +1,1691 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+import openpyxl
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import F, Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .admin import EstimatedCountPaginator
+from .authentication import ClaimsJWTAuthentication
+from .db import (
+    ReadReplicaRouter,
+    ReplicaRoutingMiddleware,
+    _use_replica,
+    committed_max_id,
+    configure_sqlite,
+    read_from_replica,
+)
+from .models import (
+    Product, Customer, SalesOrder, SalesOrderItem, StockMovement, StockMovementArchive,
+    StockSnapshot, CustomerBalanceCheckpoint, DailyCustomerSales, DailyProductSales, IdempotencyKey, Job,
+    VersionConflict,
+)
+from .importers import import_products
+from .numbering import BlockOrderNumberAllocator
+from .permissions import TOKEN_VERSION_KEY, get_user_roles, is_admin, is_sales
+from .serializers import ProductSerializer, SalesOrderSerializer, StockMovementSerializer
+from .stock_feed import stock_feed
+
+
+def make_product(sku, stock_qty=10, price="5.00"):
+    return Product.objects.create(
+        sku=sku,
+        name=f"Product {sku}",
+        cost_price=Decimal("1.00"),
+        selling_price=Decimal(price),
+        stock_qty=stock_qty,
+    )
+
+
+def make_order(customer, user, lines):
+    order = SalesOrder.objects.create(customer=customer, created_by=user)
+    for product, qty in lines:
+        SalesOrderItem.objects.create(
+            order=order, product=product, qty=qty, price=product.selling_price
+        )
+    return order
+
+
+class SalesOrderStockTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("sales", password="secret123")
+        cls.customer = Customer.objects.create(code="C1", name="Customer")
+
+    def test_confirm_and_cancel_move_stock(self):
+        a = make_product("A", stock_qty=10)
+        b = make_product("B", stock_qty=4)
+        order = make_order(self.customer, self.user, [(a, 3), (b, 4), (a, 2)])
+
+        order.confirm(user=self.user)
+        a.refresh_from_db()
+        b.refresh_from_db()
+        self.assertEqual((a.stock_qty, b.stock_qty), (5, 0))
+        self.assertEqual(
+            list(StockMovement.objects.order_by("id").values_list("product_id", "qty")),
+            [(a.id, -3), (b.id, -4), (a.id, -2)],
+        )
+
+        order.cancel(user=self.user)
+        a.refresh_from_db()
+        b.refresh_from_db()
+        self.assertEqual((a.stock_qty, b.stock_qty), (10, 4))
+        self.assertEqual(order.status, SalesOrder.STATUS_CANCELLED)
+
+    def test_confirm_rejects_short_stock(self):
+        a = make_product("A", stock_qty=10)
+        b = make_product("B", stock_qty=1)
+        order = make_order(self.customer, self.user, [(a, 3), (b, 2)])
+
+        with self.assertRaisesMessage(
+            ValidationError, "Not enough stock for product B. Available=1, Requested=2"
+        ):
+            order.confirm(user=self.user)
+
+        a.refresh_from_db()
+        self.assertEqual(a.stock_qty, 10)
+        self.assertFalse(StockMovement.objects.exists())
+        order.refresh_from_db()
+        self.assertEqual(order.status, SalesOrder.STATUS_PENDING)
+
+    def test_confirm_query_count_is_independent_of_lines(self):
+        products = [make_product(f"P{i}", stock_qty=100) for i in range(20)]
+        small = make_order(self.customer, self.user, [(products[0], 1)])
+        large = make_order(self.customer, self.user, [(p, 1) for p in products])
+
+        with self.assertNumQueries(15):
+            small.confirm(user=self.user)
+        with self.assertNumQueries(15):
+            large.confirm(user=self.user)
+
+
+class SalesOrderBulkCreateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("sales", password="secret123")
+        cls.user.groups.add(Group.objects.create(name="Sales"))
+        cls.customer = Customer.objects.create(code="C1", name="Customer")
+        cls.a = make_product("A", stock_qty=5, price="2.50")
+        cls.b = make_product("B", stock_qty=1, price="4.00")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def order(self, *lines, status="pending"):
+        return {
+            "customer": self.customer.pk,
+            "order_date": "2026-01-15",
+            "status": status,
+            "items": [
+                {"product": p.pk, "qty": qty, "price": str(p.selling_price)}
+                for p, qty in lines
+            ],
+        }
+
+    def test_bulk_create_reports_per_order_results(self):
+        payload = [
+            self.order((self.a, 2), (self.b, 1)),
+            self.order((self.b, 3), status="confirmed"),
+            {"customer": 999, "items": [{"product": 999, "qty": 1, "price": "1"}]},
+            self.order((self.a, 1), status="confirmed"),
+        ]
+
+        resp = self.client.post("/api/orders/bulk/", payload, format="json")
+
+        self.assertEqual(resp.status_code, 200)
+        results = resp.json()["results"]
+        self.assertEqual([r["ok"] for r in results], [True, False, False, True])
+        self.assertEqual(results[0]["total_amount"], "9.00")
+        self.assertIn("Not enough stock for product B", results[1]["errors"][0])
+        self.assertIn("customer", results[2]["errors"])
+        self.assertEqual(SalesOrder.objects.count(), 2)
+        self.assertEqual(SalesOrderItem.objects.count(), 3)
+        self.a.refresh_from_db()
+        self.assertEqual(self.a.stock_qty, 4)
+
+    def test_bad_pks_are_rejected(self):
+        for pk in ("²", "x", None, True, [1]):
+            payload = {**self.order((self.a, 1)), "items": [{"product": pk, "qty": 1, "price": "1.00"}]}
+            resp = self.client.post("/api/orders/create/", payload, format="json")
+            self.assertEqual(resp.status_code, 400, pk)
+            self.assertIn("items", resp.json())
+            results = self.client.post("/api/orders/bulk/", [payload], format="json").json()["results"]
+            self.assertFalse(results[0]["ok"], pk)
+        resp = self.client.post("/api/orders/create/", {**self.order((self.a, 1)), "customer": "²"}, format="json")
+        self.assertEqual(resp.status_code, 400)
+
+    def test_create_resolves_products_in_one_query(self):
+        products = [make_product(f"P{i}") for i in range(10)]
+        small = self.order((products[0], 1))
+        large = self.order(*[(p, 1) for p in products])
+
+        self.client.post("/api/orders/create/", small, format="json")
+        with self.assertNumQueries(6):
+            self.client.post("/api/orders/create/", small, format="json")
+        with self.assertNumQueries(6):
+            resp = self.client.post("/api/orders/create/", large, format="json")
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.json()["total_amount"], "50.00")
+
+
+class SalesOrderTransitionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("sales", password="secret123")
+        cls.user.groups.add(Group.objects.create(name="Sales"))
+        cls.customer = Customer.objects.create(code="C1", name="Customer")
+        cls.a = make_product("A", stock_qty=5, price="2.00")
+        cls.b = make_product("B", stock_qty=10, price="3.00")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def transition(self, orders, status):
+        return self.client.post(
+            "/api/orders/transition/", {"orders": [o.pk for o in orders], "status": status}, format="json"
+        )
+
+    def stock(self):
+        return list(Product.objects.order_by("sku").values_list("stock_qty", flat=True))
+
+    def test_confirms_what_fits_and_reports_the_rest(self):
+        first = make_order(self.customer, self.user, [(self.a, 3)])
+        short = make_order(self.customer, self.user, [(self.a, 3)])
+        mixed = make_order(self.customer, self.user, [(self.b, 2), (self.a, 1), (self.b, 1)])
+        missing = SalesOrder(pk=999)
+
+        resp = self.transition([first, short, mixed, missing], "confirmed")
+
+        self.assertEqual(resp.status_code, 200)
+        results = resp.json()["results"]
+        self.assertEqual([r["ok"] for r in results], [True, False, True, False])
+        self.assertEqual(results[1]["errors"], ["Not enough stock for product A. Available=2, Requested=3"])
+        self.assertEqual(results[3]["errors"], ["Not found."])
+        self.assertEqual(results[2]["version"], mixed.version + 1)
+        self.assertEqual(self.stock(), [1, 7])
+        self.assertEqual(
+            dict(SalesOrder.objects.values_list("pk", "status")),
+            {first.pk: "confirmed", short.pk: "pending", mixed.pk: "confirmed"},
+        )
+        self.assertEqual(StockMovement.objects.count(), 4)
+        self.assertEqual(
+            sorted(DailyProductSales.objects.values_list("product__sku", "qty")), [("A", 4), ("B", 3)]
+        )
+        self.assertEqual(DailyCustomerSales.objects.get().orders, 2)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.current_balance, Decimal("17.00"))
+
+        # Cancelling returns the stock; the pending order just changes status.
+        resp = self.transition([first, mixed, short], "cancelled")
+        self.assertTrue(all(r["ok"] for r in resp.json()["results"]))
+        self.assertEqual(self.stock(), [5, 10])
+        self.assertEqual(DailyCustomerSales.objects.get().orders, 0)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.current_balance, Decimal("0.00"))
+
+    def test_query_count_does_not_grow_with_orders(self):
+        def batch(n):
+            return [make_order(self.customer, self.user, [(self.a, 1), (self.b, 1)]) for _ in range(n)]
+
+        Product.objects.filter(pk=self.a.pk).update(stock_qty=100)
+        small, large = batch(1), batch(4)
+        self.transition(batch(1), "confirmed")
+        with CaptureQueriesContext(connection) as one:
+            self.transition(small, "confirmed")
+        with CaptureQueriesContext(connection) as many:
+            resp = self.transition(large, "confirmed")
+        self.assertTrue(all(r["ok"] for r in resp.json()["results"]))
+        self.assertEqual(len(many.captured_queries), len(one.captured_queries))
+        self.assertEqual(self.stock(), [94, 4])
+
+    def test_conflict_is_not_replayed_for_the_same_idempotency_key(self):
+        order = make_order(self.customer, self.user, [(self.a, 1)])
+        payload = {"orders": [order.pk], "status": "confirmed"}
+        headers = {"Idempotency-Key": "eod-1"}
+        with mock.patch(
+            "erp.views.transition_orders",
+            side_effect=ValidationError("Orders changed concurrently, please retry."),
+        ):
+            resp = self.client.post("/api/orders/transition/", payload, format="json", headers=headers)
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(resp.json()["detail"], "Orders changed concurrently, please retry.")
+
+        resp = self.client.post("/api/orders/transition/", payload, format="json", headers=headers)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn("Idempotent-Replayed", resp)
+        self.assertTrue(resp.json()["results"][0]["ok"])
+
+    def test_rejects_bad_requests(self):
+        self.assertEqual(self.transition([], "confirmed").status_code, 400)
+        order = make_order(self.customer, self.user, [(self.a, 1)])
+        self.assertEqual(self.transition([order], "shipped").status_code, 400)
+
+
+class ProductReportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("viewer", password="secret123")
+        make_product("A", stock_qty=3, price="2.50")
+        make_product("B", stock_qty=7)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_xlsx_report(self):
+        resp = self.client.get("/api/reports/products.xlsx")
+        self.assertEqual(resp.status_code, 200)
+        wb = openpyxl.load_workbook(io.BytesIO(b"".join(resp.streaming_content)))
+        rows = list(wb["Products"].values)
+        self.assertEqual(rows[0][:2], ("ID", "SKU"))
+        self.assertEqual(rows[1][1:], ("A", "Product A", None, 1, 2.5, 3))
+        self.assertEqual(len(rows), 3)
+
+    def test_large_xlsx_report_goes_to_the_job_queue(self):
+        with self.settings(ERP_REPORT_XLSX_MAX_ROWS=2):
+            self.assertEqual(self.client.get("/api/reports/products.xlsx").status_code, 200)
+        with self.settings(ERP_REPORT_XLSX_MAX_ROWS=1):
+            resp = self.client.get("/api/reports/products.xlsx")
+            self.assertEqual(resp.status_code, 202)
+            self.assertEqual(Job.objects.get(pk=resp.data["job"]).payload, {"format": "xlsx"})
+            self.assertEqual(self.client.get("/api/reports/products.csv").status_code, 200)
+
+    def test_csv_report_streams(self):
+        resp = self.client.get("/api/reports/products.csv")
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        lines = b"".join(resp.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "ID,SKU,Name,Category,Cost,Selling,Stock")
+        self.assertEqual(lines[1].split(",")[1:], ["A", "Product A", "", "1.00", "2.50", "3"])
+        self.assertEqual(len(lines), 3)
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("viewer", password="secret123")
+        for i in range(5):
+            make_product(f"P{i}")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_products_are_paged_by_cursor(self):
+        skus = []
+        url = "/api/products/?page_size=2"
+        queries = 2  # The first page also reads the table version.
+        while url:
+            with self.assertNumQueries(queries):
+                body = self.client.get(url).json()
+            skus += [p["sku"] for p in body["results"]]
+            url = body["next"]
+            queries = 1
+        self.assertEqual(skus, ["P0", "P1", "P2", "P3", "P4"])
+
+
+class RoleCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.sales = Group.objects.create(name="Sales")
+        self.user = User.objects.create_user("staff", password="secret123")
+
+    def fresh(self):
+        return User.objects.get(pk=self.user.pk)
+
+    def test_roles_are_cached_across_requests(self):
+        self.user.groups.add(self.sales)
+        get_user_roles(self.fresh())
+
+        user = self.fresh()
+        with self.assertNumQueries(0):
+            self.assertTrue(is_sales(user))
+            self.assertFalse(is_admin(user))
+
+    def test_group_membership_changes_invalidate(self):
+        self.assertFalse(is_sales(self.fresh()))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.add(self.sales)
+        self.assertTrue(is_sales(self.fresh()))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sales.user_set.remove(self.user)
+        self.assertFalse(is_sales(self.fresh()))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.add(self.sales)
+        self.assertTrue(is_sales(self.fresh()))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sales.delete()
+        self.assertFalse(is_sales(self.fresh()))
+
+    def test_changes_from_other_processes_expire_cached_roles(self):
+        self.assertFalse(is_sales(self.fresh()))
+        # Without the on_commit hooks, as in a process that did not make the
+        # change, only the database version moves.
+        self.user.groups.add(self.sales)
+        self.assertFalse(is_sales(self.fresh()))
+        with self.settings(ERP_TOKEN_VERSION_CACHE_TIMEOUT=0):
+            cache.delete(TOKEN_VERSION_KEY.format(self.user.pk))
+            self.assertTrue(is_sales(self.fresh()))
+
+
+class JwtRoleClaimsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = Group.objects.create(name="Admin")
+        self.user = User.objects.create_user("staff", password="secret123")
+        self.client = APIClient()
+
+    def obtain(self):
+        resp = self.client.post(
+            "/api/auth/token/", {"username": "staff", "password": "secret123"}, format="json"
+        )
+        self.assertEqual(resp.status_code, 200)
+        return resp.data
+
+    def authenticate(self, access):
+        request = APIRequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {access}")
+        return ClaimsJWTAuthentication().authenticate(request)
+
+    def test_claims_authenticate_without_queries(self):
+        self.user.groups.add(self.admin)
+        access = self.obtain()["access"]
+
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate(access)
+            self.assertEqual((user.pk, user.username), (self.user.pk, "staff"))
+            self.assertTrue(is_admin(user))
+            self.assertFalse(is_sales(user))
+
+        # The claims user can be stored as a foreign key.
+        order = make_order(Customer.objects.create(code="C1", name="Cust"), user, [])
+        self.assertEqual(order.created_by_id, self.user.pk)
+
+    def test_role_and_status_changes_fall_back_to_database(self):
+        access = self.obtain()["access"]
+        self.assertFalse(is_admin(self.authenticate(access)[0]))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.add(self.admin)
+        with self.assertNumQueries(3):
+            user, _ = self.authenticate(access)
+            self.assertTrue(is_admin(user))
+
+        # A refreshed access token carries the new roles again.
+        refreshed = self.client.post(
+            "/api/auth/token/refresh/", {"refresh": self.obtain()["refresh"]}, format="json"
+        ).data["access"]
+        with self.assertNumQueries(0):
+            self.assertTrue(is_admin(self.authenticate(refreshed)[0]))
+
+        refresh = self.obtain()["refresh"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(refreshed)
+        resp = self.client.post("/api/auth/token/refresh/", {"refresh": refresh}, format="json")
+        self.assertEqual(resp.status_code, 401)
+
+    def test_revocation_reaches_other_processes(self):
+        access = self.obtain()["access"]
+        self.assertFalse(is_admin(self.authenticate(access)[0]))
+
+        # The on_commit hooks do not run, as in another process: the cached
+        # version still matches until it expires.
+        self.user.groups.add(self.admin)
+        self.assertFalse(is_admin(self.authenticate(access)[0]))
+        with self.settings(ERP_TOKEN_VERSION_CACHE_TIMEOUT=0):
+            cache.delete(TOKEN_VERSION_KEY.format(self.user.pk))
+            self.assertTrue(is_admin(self.authenticate(access)[0]))
+
+
+class ReadReplicaRouterTests(SimpleTestCase):
+    databases = {"default"}
+
+    def test_safe_requests_read_from_replica_outside_transactions(self):
+        router = ReadReplicaRouter()
+        with mock.patch.dict(settings.DATABASES, {"replica": settings.DATABASES["default"]}):
+            self.assertIsNone(router.db_for_read(Product))
+            with read_from_replica():
+                self.assertEqual(router.db_for_read(Product), "replica")
+                with mock.patch.object(connections["default"], "in_atomic_block", True):
+                    self.assertEqual(router.db_for_read(Product), "default")
+                self.assertEqual(router.db_for_write(Product), "default")
+            with read_from_replica(False):
+                self.assertIsNone(router.db_for_read(Product))
+
+        with read_from_replica(), self.settings(ERP_DB_REPLICA_ALIAS=None):
+            self.assertIsNone(router.db_for_read(Product))
+
+    def test_sqlite_pragmas(self):
+        pragmas = {"busy_timeout": 1234, "synchronous": "OFF"}
+        with self.settings(ERP_SQLITE_PRAGMAS=pragmas), connection.cursor() as cursor:
+            with CaptureQueriesContext(connection) as ctx:
+                configure_sqlite(sender=None, connection=connection)
+            self.assertEqual(len(ctx), 0)
+            self.assertEqual(cursor.execute("PRAGMA busy_timeout").fetchone(), (1234,))
+            self.assertEqual(cursor.execute("PRAGMA synchronous").fetchone(), (0,))
+        configure_sqlite(sender=None, connection=connection)
+
+
+class StockSnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("viewer", password="secret123")
+        cls.customer = Customer.objects.create(code="C1", name="Customer")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def sell(self, product, qty, day):
+        make_order(self.customer, self.user, [(product, qty)]).confirm(user=self.user)
+        StockMovement.objects.filter(pk=StockMovement.objects.latest("id").pk).update(
+            timestamp=f"2026-01-{day:02d}T12:00:00Z"
+        )
+
+    def stock_as_of(self, product, as_of):
+        resp = self.client.get(f"/api/products/{product.pk}/?as_of={as_of}")
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()["stock_as_of"]
+
+    def test_as_of_uses_snapshots_and_deltas(self):
+        product = make_product("A", stock_qty=20)
+        self.sell(product, 3, day=2)
+        self.sell(product, 4, day=4)
+
+        # No snapshot yet: rolled back from the current counter.
+        self.assertEqual(self.stock_as_of(product, "2026-01-01"), 20)
+        self.assertEqual(self.stock_as_of(product, "2026-01-03"), 17)
+
+        call_command("snapshot_stock", stdout=io.StringIO())
+        StockSnapshot.objects.update(taken_at="2026-01-05T00:00:00Z")
+        self.assertEqual(StockSnapshot.objects.get().stock_qty, 13)
+
+        self.sell(product, 5, day=7)
+        self.assertEqual(self.stock_as_of(product, "2026-01-06"), 13)
+        self.assertEqual(self.stock_as_of(product, "2026-01-08"), 8)
+
+        call_command("snapshot_stock", stdout=io.StringIO())
+        call_command("snapshot_stock", stdout=io.StringIO())
+        self.assertEqual(
+            list(StockSnapshot.objects.order_by("id").values_list("stock_qty", flat=True)),
+            [13, 8],
+        )
+
+    def test_invalid_as_of(self):
+        product = make_product("A")
+        for as_of in ("yesterday", "2026-02-30", "2026-02-30T10:00", "2026-13-01"):
+            resp = self.client.get(f"/api/products/{product.pk}/?as_of={as_of}")
+            self.assertEqual(resp.status_code, 400, as_of)
+        self.assertEqual(self.client.get("/api/products/?as_of=2026-02-30").status_code, 400)
+        self.assertNotIn("stock_as_of", self.client.get(f"/api/products/{product.pk}/").json())
+
+
+class StockArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("viewer", password="secret123")
+        cls.customer = Customer.objects.create(code="C1", name="Customer")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.a = make_product("A", stock_qty=50)
+        self.b = make_product("B", stock_qty=50)
+        for product, qty, day in ((self.a, 3, 2), (self.b, 2, 3), (self.a, 4, 4), (self.b, 1, 4), (self.a, 5, 20)):
+            make_order(self.customer, self.user, [(product, qty)]).confirm(user=self.user)
+            StockMovement.objects.filter(pk=StockMovement.objects.latest("id").pk).update(
+                timestamp=f"2026-01-{day:02d}T12:00:00Z"
+            )
+
+    def archive(self, before):
+        call_command("archive_stock_movements", before=before, stdout=io.StringIO())
+
+    def walk(self, url):
+        ids = []
+        while url:
+            body = self.client.get(url).json()
+            ids += [m["id"] for m in body["results"]]
+            url = body["next"]
+        return ids
+
+    def walk_back(self, url):
+        ids = []
+        while url:
+            body = self.client.get(url).json()
+            ids = [m["id"] for m in body["results"]] + ids
+            url = body["previous"]
+        return ids
+
+    def stock_history(self):
+        return [
+            list(Product.objects.with_stock_as_of(when).order_by("sku").values_list("stock_as_of", flat=True))
+            for when in ("2026-01-01T00:00:00Z", "2026-01-03T00:00:00Z", "2026-01-05T00:00:00Z", "2026-01-21T00:00:00Z")
+        ]
+
+    def test_archive_keeps_totals_and_history(self):
+        history = self.stock_history()
+        listed = self.client.get("/api/stock-movements/?page_size=50").json()["results"]
+        oldest = min(listed, key=lambda m: m["id"])
+
+        self.archive("2026-01-10")
+
+        self.assertEqual(StockMovementArchive.objects.count(), 4)
+        carried = dict(
+            StockMovement.objects.filter(movement_type=StockMovement.MOVEMENT_CARRY_FORWARD)
+            .values_list("product__sku", "qty")
+        )
+        self.assertEqual(carried, {"A": -7, "B": -3})
+        # The hot table still sums to each product's ledger total.
+        for product in (self.a, self.b):
+            product.refresh_from_db()
+            hot = product.stock_movements.aggregate(total=Sum("qty"))["total"]
+            self.assertEqual(50 + hot, product.stock_qty)
+        self.assertEqual(self.stock_history(), history)
+
+        # The API reads the archived range as if nothing had moved.
+        self.assertEqual(self.client.get("/api/stock-movements/?page_size=50").json()["results"], listed)
+        expected = [m["id"] for m in listed]
+        self.assertEqual(self.walk("/api/stock-movements/?page_size=2"), expected)
+        first = self.client.get("/api/stock-movements/?page_size=2").json()
+        last_page = first
+        while last_page["next"]:
+            last_page = self.client.get(last_page["next"]).json()
+        self.assertEqual(
+            self.walk_back(last_page["previous"]) + [m["id"] for m in last_page["results"]],
+            expected,
+        )
+        resp = self.client.get(f"/api/stock-movements/{oldest['id']}/")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json(), oldest)
+
+        # A later cutoff folds the earlier carry-forward into the new one.
+        self.archive("2026-01-25")
+        self.assertEqual(StockMovementArchive.objects.count(), 5)
+        self.assertEqual(
+            sorted(StockMovement.objects.values_list("product__sku", "qty", "movement_type")),
+            [("A", -12, "carry_forward"), ("B", -3, "carry_forward")],
+        )
+        self.assertEqual(self.walk("/api/stock-movements/?page_size=2"), expected)
+        call_command("snapshot_stock", stdout=io.StringIO())
+        self.assertEqual(
+            sorted(StockSnapshot.objects.values_list("product__sku", "stock_qty")),
+            [("A", 38), ("B", 47)],
+        )
+
+
+class IdempotencyKeyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("sales", password="secret123")
+        cls.user.groups.add(Group.objects.create(name="Sales"))
+        cls.customer = Customer.objects.create(code="C1", name="Customer")
+        cls.product = make_product("A", stock_qty=5)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.payload = {
+            "customer": self.customer.pk,
+            "order_date": "2026-01-15",
+            "status": "confirmed",
+            "items": [{"product": self.product.pk, "qty": 2, "price": "5.00"}],
+        }
+
+    def create(self, key, payload=None):
+        return self.client.post(
+            "/api/orders/create/", payload or self.payload, format="json", HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_retried_create_is_replayed_without_running_again(self):
+        first = self.create("pos-1-0001")
+        self.assertEqual(first.status_code, 201)
+
+        with self.assertNumQueries(1):
+            retry = self.create("pos-1-0001")
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(SalesOrder.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_qty, 3)
+
+        self.assertEqual(self.create("pos-1-0002").status_code, 201)
+        self.assertEqual(SalesOrder.objects.count(), 2)
+
+    def test_key_reuse_for_another_request_is_rejected(self):
+        self.create("pos-1-0001")
+        other = dict(self.payload, items=[{"product": self.product.pk, "qty": 1, "price": "5.00"}])
+        self.assertEqual(self.create("pos-1-0001", other).status_code, 422)
+
+    def test_failed_request_does_not_keep_the_key(self):
+        too_many = dict(self.payload, items=[{"product": self.product.pk, "qty": 50, "price": "5.00"}])
+        with self.assertRaises(ValidationError):
+            self.create("pos-1-0001", too_many)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_status_transition_and_expiry(self):
+        order = make_order(self.customer, self.user, [(self.product, 1)])
+        url = f"/api/orders/{order.pk}/update/"
+        for _ in range(2):
+            resp = self.client.patch(
+                url, {"status": "confirmed"}, format="json", HTTP_IDEMPOTENCY_KEY="t-1", HTTP_IF_MATCH='"1"'
+            )
+            self.assertEqual(resp.status_code, 200)
+        self.assertEqual(StockMovement.objects.filter(product=self.product).count(), 1)
+
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=2))
+        out = io.StringIO()
+        call_command("purge_idempotency_keys", stdout=out)
+        self.assertIn("Deleted 1", out.getvalue())
+
+
+class OptimisticConcurrencyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", password="secret123")
+        cls.customer = Customer.objects.create(code="C1", name="Customer")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.product = make_product("A", stock_qty=10)
+
+    def test_product_update_requires_current_etag(self):
+        url = f"/api/products/{self.product.pk}/"
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(etag, '"1"')
+
+        resp = self.client.patch(url + "update/", {"name": "B"}, format="json")
+        self.assertEqual(resp.status_code, 428)
+
+        with self.assertNumQueries(3), self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.patch(url + "update/", {"name": "B"}, format="json", HTTP_IF_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual((resp["ETag"], resp.json()["version"]), ('"2"', 2))
+
+        # Stock movements change the row too.
+        with self.captureOnCommitCallbacks(execute=True):
+            make_order(self.customer, self.user, [(self.product, 1)]).confirm(user=self.user)
+        resp = self.client.patch(url + "update/", {"name": "C"}, format="json", HTTP_IF_MATCH='"2"')
+        self.assertEqual(resp.status_code, 412)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.name, self.product.version), ("B", 3))
+        self.assertEqual(self.client.get(url)["ETag"], '"3"')
+
+    def test_order_update_is_conditional(self):
+        order = make_order(self.customer, self.user, [(self.product, 4)])
+        url = f"/api/orders/{order.pk}/"
+        self.assertEqual(self.client.get(url)["ETag"], '"1"')
+
+        resp = self.client.patch(url + "update/", {"status": "confirmed"}, format="json", HTTP_IF_MATCH='"1"')
+        self.assertEqual((resp.status_code, resp["ETag"]), (200, '"2"'))
+        resp = self.client.patch(url + "update/", {"status": "cancelled"}, format="json", HTTP_IF_MATCH='"1"')
+        self.assertEqual(resp.status_code, 412)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_qty, 6)
+        self.assertEqual(StockMovement.objects.count(), 1)
+
+    def test_change_after_read_conflicts_before_touching_stock(self):
+        order = make_order(self.customer, self.user, [(self.product, 4)])
+        SalesOrder.objects.filter(pk=order.pk).update(version=F("version") + 1)
+        with self.assertRaises(VersionConflict):
+            order.set_status(SalesOrder.STATUS_CONFIRMED, user=self.user, expected_version=order.version)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_qty, 10)
+        self.assertFalse(StockMovement.objects.exists())
+
+    def test_saves_and_imports_bump_version(self):
+        self.product.name = "Renamed"
+        self.product.save()
+        self.assertEqual(self.product.version, 2)
+        import_products([["sku", "name", "cost_price", "selling_price"], ["A", "Imported", "1", "2"]])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.version, 3)
+
+
+class SalesRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("viewer", password="secret123")
+        cls.customer = Customer.objects.create(code="C1", name="Customer")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def order(self, lines, day):
+        order = make_order(self.customer, self.user, lines)
+        order.order_date = day
+        order.save(update_fields=["order_date"])
+        return order
+
+    def test_rollups_follow_confirm_and_cancel(self):
+        a = make_product("A", stock_qty=50, price="2.00")
+        b = make_product("B", stock_qty=50, price="3.00")
+        first = self.order([(a, 2), (b, 1), (a, 1)], "2026-01-10")
+        second = self.order([(a, 4)], "2026-01-10")
+        third = self.order([(b, 5)], "2026-01-11")
+        for order in (first, second, third):
+            order.confirm(user=self.user)
+        second.cancel(user=self.user)
+
+        self.assertEqual(
+            DailyProductSales.objects.get(day="2026-01-10", product=a).qty, 3
+        )
+        self.assertEqual(
+            DailyCustomerSales.objects.get(day="2026-01-10").revenue, Decimal("9.00")
+        )
+
+        params = "?start=2026-01-01&end=2026-01-31"
+        with self.assertNumQueries(1):
+            products = self.client.get("/api/reports/sales/products/" + params).json()
+        self.assertEqual(
+            [(p["sku"], p["qty"], p["revenue"]) for p in products],
+            [("B", 6, "18.00"), ("A", 3, "6.00")],
+        )
+        customers = self.client.get("/api/reports/sales/customers/" + params).json()
+        self.assertEqual([(c["orders"], c["revenue"]) for c in customers], [(2, "24.00")])
+        daily = self.client.get("/api/reports/sales/daily/" + params).json()
+        self.assertEqual(
+            [(d["day"], d["orders"]) for d in daily], [("2026-01-10", 1), ("2026-01-11", 1)]
+        )
+
+        before = list(DailyProductSales.objects.order_by("day", "product").values_list("qty", "revenue"))
+        call_command("rebuild_sales_rollups", stdout=io.StringIO())
+        after = list(DailyProductSales.objects.order_by("day", "product").values_list("qty", "revenue"))
+        self.assertEqual([r for r in before if r[0]], after)
+
+    def test_report_rejects_bad_range(self):
+        resp = self.client.get("/api/reports/sales/daily/?start=2026-02-01&end=2026-01-01")
+        self.assertEqual(resp.status_code, 400)
+
+
+class CustomerBalanceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("viewer", password="secret123")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.customer = Customer.objects.create(code="C1", name="Customer", opening_balance=Decimal("100.00"))
+        self.product = make_product("A", stock_qty=100, price="10.00")
+
+    def order(self, qty, day):
+        order = make_order(self.customer, self.user, [(self.product, qty)])
+        order.order_date = day
+        order.total_amount = self.product.selling_price * qty
+        order.save(update_fields=["order_date", "total_amount"])
+        return order
+
+    def balance(self):
+        return Customer.objects.get(pk=self.customer.pk).current_balance
+
+    def test_balance_follows_confirm_cancel_and_opening_balance(self):
+        self.assertEqual(self.balance(), Decimal("100.00"))
+        first = self.order(2, "2026-01-10")
+        second = self.order(3, "2026-01-12")
+        first.confirm(user=self.user)
+        second.confirm(user=self.user)
+        self.assertEqual(self.balance(), Decimal("150.00"))
+        second.cancel(user=self.user)
+        self.assertEqual(self.balance(), Decimal("120.00"))
+
+        # A stale instance edit neither clobbers nor loses order movements.
+        self.customer.opening_balance = Decimal("40.00")
+        self.customer.save()
+        self.assertEqual(self.balance(), Decimal("60.00"))
+
+        Customer.objects.filter(pk=self.customer.pk).update(current_balance=0)
+        call_command("rebuild_sales_rollups", stdout=io.StringIO())
+        self.assertEqual(self.balance(), Decimal("60.00"))
+
+    def test_statement_starts_from_checkpoint(self):
+        self.order(1, "2026-01-05").confirm(user=self.user)
+        self.order(2, "2026-01-20").confirm(user=self.user)
+        call_command("checkpoint_balances", day="2026-01-31", stdout=io.StringIO())
+        self.assertEqual(
+            CustomerBalanceCheckpoint.objects.get(customer=self.customer).balance, Decimal("130.00")
+        )
+
+        # Backdated orders move later checkpoints too.
+        backdated = self.order(1, "2026-01-25")
+        backdated.confirm(user=self.user)
+        self.order(4, "2026-02-03").confirm(user=self.user)
+        feb = self.order(5, "2026-02-10")
+        feb.confirm(user=self.user)
+        self.assertEqual(
+            CustomerBalanceCheckpoint.objects.get(customer=self.customer).balance, Decimal("140.00")
+        )
+
+        url = f"/api/customers/{self.customer.pk}/statement/?start=2026-02-01&end=2026-02-28"
+        with self.assertNumQueries(4):
+            data = self.client.get(url).json()
+        self.assertEqual(data["opening_balance"], "140.00")
+        self.assertEqual(
+            [(e["date"], e["amount"], e["balance"]) for e in data["entries"]],
+            [("2026-02-03", "40.00", "180.00"), ("2026-02-10", "50.00", "230.00")],
+        )
+        self.assertEqual(data["closing_balance"], "230.00")
+        self.assertEqual(self.balance(), Decimal("230.00"))
+
+        # Opening mid-month: checkpoint plus the rollup since.
+        data = self.client.get(
+            f"/api/customers/{self.customer.pk}/statement/?start=2026-02-05&end=2026-02-28"
+        ).json()
+        self.assertEqual((data["opening_balance"], data["closing_balance"]), ("180.00", "230.00"))
+
+        CustomerBalanceCheckpoint.objects.update(balance=0)
+        call_command("rebuild_sales_rollups", stdout=io.StringIO())
+        self.assertEqual(
+            CustomerBalanceCheckpoint.objects.get(customer=self.customer).balance, Decimal("140.00")
+        )
+
+    def test_opening_balance_edit_moves_checkpoints(self):
+        self.order(1, "2026-01-05").confirm(user=self.user)
+        call_command("checkpoint_balances", day="2026-01-31", stdout=io.StringIO())
+
+        self.customer.opening_balance = Decimal("200.00")
+        self.customer.save()
+
+        data = self.client.get(
+            f"/api/customers/{self.customer.pk}/statement/?start=2026-02-01&end=2026-02-28"
+        ).json()
+        self.assertEqual(data["opening_balance"], "210.00")
+        self.assertEqual(self.balance(), Decimal("210.00"))
+
+
+class OrderNumberAllocatorTests(TestCase):
+    def test_block_numbers_are_sequential_and_formatted(self):
+        allocator = BlockOrderNumberAllocator(pattern="SO-{year}-{seq:04d}", block_size=3)
+        year = timezone.localdate().year
+
+        first = allocator.allocate()
+        with self.assertNumQueries(0):
+            second, third = allocator.allocate(), allocator.allocate()
+        with self.assertNumQueries(4):
+            fourth = allocator.allocate()
+
+        self.assertEqual(
+            [first, second, third, fourth],
+            [f"SO-{year}-{n:04d}" for n in (1, 2, 3, 4)],
+        )
+
+    def test_block_reserved_in_rolled_back_transaction_is_dropped(self):
+        allocator = BlockOrderNumberAllocator(pattern="{seq}", block_size=10)
+        other = BlockOrderNumberAllocator(pattern="{seq}", block_size=10)
+
+        try:
+            with transaction.atomic():
+                self.assertEqual(allocator.allocate(), "1")
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+        # The reservation was rolled back, so both allocators start from 1
+        # again, but the first must not keep serving its stale block.
+        self.assertEqual(other.allocate(), "1")
+        self.assertEqual(allocator.allocate(), "11")
+
+    def test_orders_get_allocated_numbers(self):
+        user = User.objects.create_user("sales", password="secret123")
+        customer = Customer.objects.create(code="C1", name="Customer")
+        numbers = [make_order(customer, user, []).order_number for _ in range(3)]
+        self.assertEqual(len(set(numbers)), 3)
+        self.assertEqual(numbers, sorted(numbers))
+
+
+class AsyncReadViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("viewer", password="secret123")
+        cls.customer = Customer.objects.create(code="C1", name="Customer")
+        cls.products = [make_product(f"P{i}") for i in range(3)]
+        cls.order = make_order(cls.customer, cls.user, [(cls.products[0], 2)])
+
+    def setUp(self):
+        cache.clear()
+        self.sync_client = APIClient()
+        self.sync_client.force_authenticate(self.user)
+        self.headers = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+
+    async def test_async_views_match_sync_views(self):
+        for path in (f"products/{self.products[1].pk}/", f"orders/{self.order.pk}/"):
+            resp = await self.async_client.get(f"/api/async/{path}", headers=self.headers)
+            self.assertEqual(resp.status_code, 200)
+            expected = await sync_to_async(self.sync_client.get)(f"/api/{path}")
+            self.assertEqual(resp.json(), expected.json())
+
+    async def test_middleware_runs_without_adapting_async_views(self):
+        # With DEBUG on, Django logs each middleware it has to adapt.
+        with self.settings(DEBUG=True), self.assertNoLogs("django.request", "DEBUG"):
+            resp = await self.async_client.get(
+                f"/api/async/products/{self.products[0].pk}/", headers=self.headers
+            )
+        self.assertEqual(resp.status_code, 200)
+
+    async def test_replica_routing_in_async_requests(self):
+        async def get_response(request):
+            return _use_replica.get()
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        factory = APIRequestFactory()
+        self.assertIs(await middleware(factory.get("/")), True)
+        self.assertIs(await middleware(factory.post("/")), False)
+        self.assertIs(_use_replica.get(), False)
+
+    async def test_async_list_pages_by_id(self):
+        resp = await self.async_client.get("/api/async/products/?page_size=2", headers=self.headers)
+        body = resp.json()
+        self.assertEqual([p["sku"] for p in body["results"]], ["P0", "P1"])
+        resp = await self.async_client.get(body["next"], headers=self.headers)
+        body = resp.json()
+        self.assertEqual([p["sku"] for p in body["results"]], ["P2"])
+        self.assertIsNone(body["next"])
+
+    async def test_async_views_require_authentication(self):
+        resp = await self.async_client.get("/api/async/products/")
+        self.assertEqual(resp.status_code, 401)
+        resp = await self.async_client.get("/api/async/products/999/", headers=self.headers)
+        self.assertEqual(resp.status_code, 404)
+
+
+class StockFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("viewer", password="secret123")
+        cls.customer = Customer.objects.create(code="C1", name="Customer")
+        cls.product = make_product("P", stock_qty=10)
+        make_order(cls.customer, cls.user, [(cls.product, 2)]).confirm(user=cls.user)
+        cls.first_id = StockMovement.objects.get().pk
+
+    def setUp(self):
+        self.headers = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+
+    def confirm(self, qty):
+        with self.captureOnCommitCallbacks(execute=True):
+            make_order(self.customer, self.user, [(self.product, qty)]).confirm(user=self.user)
+
+    async def events(self, last_event_id):
+        resp = await self.async_client.get(
+            "/api/stock-movements/stream/", headers={**self.headers, "Last-Event-ID": last_event_id}
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Type"], "text/event-stream")
+        return aiter(resp.streaming_content)
+
+    async def test_stream_catches_up_then_pushes_commits(self):
+        stream = await self.events(str(self.first_id - 1))
+        frame = (await anext(stream)).decode()
+        self.assertTrue(frame.startswith(f"id: {self.first_id}\n"))
+        self.assertEqual(json.loads(frame.split("data: ")[1])["stock_qty"], 8)
+
+        await sync_to_async(self.confirm)(3)
+        frame = (await anext(stream)).decode()
+        event = json.loads(frame.split("data: ")[1])
+        self.assertEqual(
+            {k: event[k] for k in ("product", "qty", "movement_type", "stock_qty")},
+            {"product": self.product.pk, "qty": -3, "movement_type": "sale", "stock_qty": 5},
+        )
+        self.assertTrue(frame.startswith(f"id: {event['id']}\n"))
+        await stream.aclose()
+
+    async def test_stream_polls_for_movements_from_other_processes(self):
+        with self.settings(ERP_STOCK_FEED_POLL_INTERVAL=0.01):
+            stream = await self.events(str(self.first_id))
+            # No on_commit hooks, as for a movement written by a job worker.
+            await sync_to_async(
+                lambda: make_order(self.customer, self.user, [(self.product, 3)]).confirm(user=self.user)
+            )()
+            event = json.loads((await anext(stream)).decode().split("data: ")[1])
+            await stream.aclose()
+        self.assertGreater(event["id"], self.first_id)
+        self.assertEqual((event["qty"], event["stock_qty"]), (-3, 5))
+
+    async def test_stream_asks_for_reload_past_the_backlog(self):
+        await sync_to_async(self.confirm)(1)
+        with self.settings(ERP_STOCK_FEED_BACKLOG=1, ERP_STOCK_FEED_KEEPALIVE=0.01):
+            stream = await self.events("0")
+            head = await StockMovement.objects.order_by("-id").values_list("id", flat=True).afirst()
+            self.assertEqual((await anext(stream)).decode(), f"event: reset\nid: {head}\ndata: {{}}\n\n")
+            self.assertEqual((await anext(stream)).decode(), ": keepalive\n\n")
+            await stream.aclose()
+
+    async def test_stream_rejects_bad_requests(self):
+        resp = await self.async_client.get("/api/stock-movements/stream/")
+        self.assertEqual(resp.status_code, 401)
+        for last_event_id in ("x", "-1", "²"):
+            resp = await self.async_client.get(
+                "/api/stock-movements/stream/", headers={**self.headers, "Last-Event-ID": last_event_id}
+            )
+            self.assertEqual(resp.status_code, 400, last_event_id)
+
+    async def test_slow_subscriber_is_dropped(self):
+        subscription = stock_feed.subscribe()
+        try:
+            with self.settings(ERP_STOCK_FEED_MAX_PENDING=1):
+                subscription.push([{"id": 1}, {"id": 2}])
+                self.assertIsNone(await subscription.get(1))
+        finally:
+            subscription.close()
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", password="secret123")
+        cls.customer = Customer.objects.create(code="C1", name="Customer")
+        cls.product = make_product("A", stock_qty=10)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f"/api/products/{self.product.pk}/"
+
+    def test_not_modified_until_product_changes(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.assertTrue(etag)
+
+        with self.assertNumQueries(0):
+            resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.patch(self.url + "update/", {"name": "Renamed"}, format="json", HTTP_IF_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["name"], "Renamed")
+        etag = resp["ETag"]
+
+        order = make_order(self.customer, self.user, [(self.product, 4)])
+        with self.captureOnCommitCallbacks(execute=True):
+            order.confirm(user=self.user)
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["stock_qty"], 6)
+
+    def test_if_modified_since_is_not_trusted(self):
+        resp = self.client.get(self.url)
+        self.assertNotIn("Last-Modified", resp)
+        # A write within the same second as the read above.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(self.url + "update/", {"name": "Renamed"}, format="json", HTTP_IF_MATCH=resp["ETag"])
+        resp = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 1))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["name"], "Renamed")
+
+    def test_writes_from_other_processes_are_seen(self):
+        # The on_commit hooks never run here, as in a process that did not
+        # make the write; only the TableVersion row records it.
+        with self.settings(ERP_TABLE_VERSION_CACHE_TIMEOUT=0):
+            etag = self.client.get("/api/products/")["ETag"]
+            make_order(self.customer, self.user, [(self.product, 4)]).confirm(user=self.user)
+            resp = self.client.get("/api/products/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["results"][0]["stock_qty"], 6)
+
+    def test_rendered_response_is_cached(self):
+        first = self.client.get("/api/products/")
+        with self.assertNumQueries(0):
+            second = self.client.get("/api/products/")
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second["ETag"], first["ETag"])
+
+
+class FastReadPathTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("viewer", password="secret123")
+        cls.customer = Customer.objects.create(code="C1", name="Customer")
+        products = [make_product(f"P{i}", stock_qty=100, price="1.25") for i in range(4)]
+        for i in range(6):
+            order = make_order(cls.customer, cls.user, [(p, i + 1) for p in products])
+            if i % 2:
+                order.confirm(user=cls.user if i % 3 else None)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        get_user_roles(self.user)
+
+    def assertMatchesSerializer(self, url, serializer_class, queryset):
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        page = resp.json()["results"]
+        expected = serializer_class(queryset[: len(page)], many=True).data
+        self.assertEqual(resp.content, JSONRenderer().render({**resp.json(), "results": expected}))
+
+    def test_output_matches_model_serializers(self):
+        self.assertMatchesSerializer(
+            "/api/orders/?page_size=4",
+            SalesOrderSerializer,
+            SalesOrder.objects.order_by("id"),
+        )
+        self.assertMatchesSerializer(
+            "/api/stock-movements/?page_size=5",
+            StockMovementSerializer,
+            StockMovement.objects.order_by("-timestamp", "id"),
+        )
+        self.assertMatchesSerializer(
+            "/api/products/?page_size=3&as_of=2026-01-01T00:00:00Z",
+            ProductSerializer,
+            Product.objects.with_stock_as_of("2026-01-01T00:00:00Z").order_by("id"),
+        )
+
+    def test_fixed_query_count_per_page(self):
+        for url, queries in (
+            ("/api/orders/?page_size=2", 2),
+            ("/api/orders/?page_size=6", 2),
+            ("/api/stock-movements/?page_size=2", 1),
+            ("/api/stock-movements/?page_size=12", 1),
+        ):
+            with self.subTest(url=url), self.assertNumQueries(queries):
+                self.client.get(url)
+
+
+class ProductImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", password="secret123")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, name, content):
+        f = io.BytesIO(content)
+        f.name = name
+        return self.client.post("/api/products/import/", {"file": f}, format="multipart")
+
+    def test_csv_upsert_reports_rejected_rows(self):
+        make_product("A", stock_qty=7)
+        csv_data = (
+            "sku,name,category,cost_price,selling_price\n"
+            "A,Renamed,Tools,1.00,3.00\n"
+            "B,New,,2.00,4.00\n"
+            "C,,,2.00,4.00\n"
+            "D,Bad price,,x,4.00\n"
+            "B,New again,,2.00,4.50\n"
+        )
+        resp = self.upload("products.csv", csv_data.encode())
+
+        self.assertEqual(resp.status_code, 200)
+        body = resp.json()
+        self.assertEqual(body["upserted"], 2)
+        self.assertEqual([r["row"] for r in body["rejected"]], [4, 5])
+        a = Product.objects.get(sku="A")
+        self.assertEqual((a.name, a.category, a.stock_qty), ("Renamed", "Tools", 7))
+        self.assertEqual(Product.objects.get(sku="B").selling_price, Decimal("4.50"))
+
+    def test_xlsx_report_round_trips(self):
+        make_product("A", stock_qty=3, price="2.50")
+        report = b"".join(self.client.get("/api/reports/products.xlsx").streaming_content)
+        Product.objects.update(stock_qty=0, name="changed")
+
+        resp = self.upload("products.xlsx", report)
+
+        self.assertEqual(resp.json(), {"upserted": 1, "rejected_count": 0, "rejected": []})
+        a = Product.objects.get(sku="A")
+        self.assertEqual((a.name, a.stock_qty), ("Product A", 3))
+        self.assertEqual(
+            list(a.stock_movements.values_list("qty", "movement_type", "user")),
+            [(3, StockMovement.MOVEMENT_ADJUSTMENT, self.user.pk)],
+        )
+
+    def test_stock_is_adjusted_through_the_ledger(self):
+        make_product("A", stock_qty=7)
+        make_product("B", stock_qty=5)
+        csv_data = (
+            "sku,name,cost_price,selling_price,stock_qty\n"
+            "A,A,1.00,2.00,\n"
+            "B,B,1.00,2.00,2\n"
+            "C,C,1.00,2.00,\n"
+            "D,D,1.00,2.00,4\n"
+            "E,E,1.00,2.00,-1\n"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.upload("products.csv", csv_data.encode())
+
+        self.assertEqual(resp.json()["upserted"], 4)
+        self.assertEqual([r["row"] for r in resp.json()["rejected"]], [6])
+        # Blank keeps existing stock and starts new products at zero.
+        self.assertEqual(
+            dict(Product.objects.values_list("sku", "stock_qty")), {"A": 7, "B": 2, "C": 0, "D": 4}
+        )
+        self.assertEqual(
+            list(StockMovement.objects.values_list("product__sku", "qty", "movement_type")),
+            [("B", -3, StockMovement.MOVEMENT_ADJUSTMENT)],
+        )
+
+    def test_missing_columns(self):
+        resp = self.upload("products.csv", b"sku,name\nA,B\n")
+        self.assertEqual(resp.status_code, 400)
+
+
+class RequestMetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("viewer", password="secret123")
+        cls.product = make_product("A")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_server_timing_and_prometheus_output(self):
+        resp = self.client.get(f"/api/products/{self.product.pk}/")
+        self.assertRegex(resp["Server-Timing"], r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries"$')
+
+        metrics = self.client.get("/api/metrics/", REMOTE_ADDR="127.0.0.1")
+        self.assertEqual(metrics.status_code, 200)
+        body = metrics.content.decode()
+        self.assertIn(
+            'erp_http_request_duration_seconds_count{view="api/products/<int:pk>/",method="GET",status="200"}',
+            body,
+        )
+        self.assertIn('erp_http_request_queries_bucket{view="api/products/<int:pk>/",method="GET",le="+Inf"}', body)
+
+    async def test_async_requests_are_timed(self):
+        headers = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+        resp = await self.async_client.get(f"/api/async/products/{self.product.pk}/", headers=headers)
+        self.assertEqual(resp.status_code, 200)
+        self.assertRegex(resp["Server-Timing"], r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="[1-9]\d* queries"$')
+
+    def test_metrics_access(self):
+        self.assertEqual(self.client.get("/api/metrics/", REMOTE_ADDR="10.1.2.3").status_code, 403)
+        with self.settings(ERP_METRICS_TOKEN="s3cret"):
+            resp = self.client.get(
+                "/api/metrics/", REMOTE_ADDR="10.1.2.3", HTTP_AUTHORIZATION="Bearer s3cret"
+            )
+            self.assertEqual(resp.status_code, 200)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("till", password="secret123")
+        Product.objects.create(sku="COLA-330", name="Cola can", cost_price=1, selling_price=2)
+        Product.objects.create(sku="WATER-1", name="Mineral water, cola flavour", cost_price=1, selling_price=2)
+        Product.objects.create(sku="CHIPS-1", name="Salted chips", cost_price=1, selling_price=2)
+        Customer.objects.create(code="AC-1", name="Acme Trading", phone="+20 100 555 0199")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def search(self, **params):
+        resp = self.client.get("/api/search/", params)
+        self.assertEqual(resp.status_code, 200)
+        return resp.data
+
+    def test_ranked_prefix_matching(self):
+        data = self.search(q="col")
+        self.assertEqual([p["sku"] for p in data["products"]], ["COLA-330", "WATER-1"])
+        self.assertEqual(data["products"][0]["selling_price"], "2.00")
+        self.assertEqual(data["customers"], [])
+
+        self.assertEqual([p["sku"] for p in self.search(q="min col", type="products")["products"]], ["WATER-1"])
+        self.assertEqual(len(self.search(q="c", type="products", limit=1)["products"]), 1)
+        self.assertEqual(self.search(q="acm")["customers"][0]["code"], "AC-1")
+        self.assertEqual(self.search(q="0199", type="customers")["customers"][0]["code"], "AC-1")
+        self.assertEqual(self.search(q='"*)(', type="products")["products"], [])
+        self.assertEqual(self.client.get("/api/search/", {"type": "orders"}).status_code, 400)
+
+        etag = self.client.get("/api/search/", {"q": "col"})["ETag"]
+        with self.assertNumQueries(0):
+            resp = self.client.get("/api/search/", {"q": "col"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+
+    def test_index_follows_writes(self):
+        chips = Product.objects.get(sku="CHIPS-1")
+        chips.name = "Paprika crisps"
+        chips.save()
+        self.assertEqual(self.search(q="salted", type="products")["products"], [])
+        self.assertEqual(self.search(q="papr", type="products")["products"][0]["sku"], "CHIPS-1")
+
+        import_products([["sku", "name", "cost_price", "selling_price"], ["CHIPS-1", "Sea salt crisps", "1", "2"]])
+        self.assertEqual(self.search(q="sea salt", type="products")["products"][0]["sku"], "CHIPS-1")
+
+        chips.delete()
+        self.assertEqual(self.search(q="crisps", type="products")["products"], [])
+
+
+class BackgroundJobTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("boss", password="secret123")
+        cls.other = User.objects.create_user("other", password="secret123")
+        cls.customer = Customer.objects.create(code="C1", name="Customer")
+        cls.product = make_product("A", stock_qty=5)
+
+    def setUp(self):
+        cache.clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(self.settings(MEDIA_ROOT=media.name))
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def run_jobs(self):
+        call_command("run_jobs", once=True, processes=0, stdout=io.StringIO())
+
+    def test_report_returns_202_and_job_result(self):
+        resp = self.client.get("/api/reports/products.xlsx", HTTP_PREFER="respond-async")
+        self.assertEqual(resp.status_code, 202)
+        self.assertEqual(resp["Location"], resp.data["url"])
+        job_url = f"/api/jobs/{resp.data['job']}/"
+        self.assertEqual(self.client.get(job_url).data["status"], Job.STATUS_QUEUED)
+        self.assertEqual(self.client.get(job_url + "result/").status_code, 409)
+
+        self.run_jobs()
+
+        job = self.client.get(job_url).data
+        self.assertEqual(job["status"], Job.STATUS_SUCCEEDED)
+        self.assertEqual(job["result"], {"rows": 1})
+        result = self.client.get(job["result_url"])
+        ws = openpyxl.load_workbook(io.BytesIO(b"".join(result.streaming_content))).active
+        self.assertEqual(ws.cell(row=2, column=2).value, "A")
+
+        other = APIClient()
+        other.force_authenticate(self.other)
+        self.assertEqual(other.get(job_url).status_code, 404)
+
+    def test_order_confirm_runs_in_worker(self):
+        ok = make_order(self.customer, self.admin, [(self.product, 3)])
+        short = make_order(self.customer, self.admin, [(self.product, 3)])
+
+        for order in (ok, short):
+            resp = self.client.patch(
+                f"/api/orders/{order.pk}/update/?async=1", {"status": "confirmed"}, format="json",
+                HTTP_IF_MATCH="*",
+            )
+            self.assertEqual(resp.status_code, 202)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_qty, 5)
+
+        with self.assertLogs("erp.jobs", "ERROR"):
+            self.run_jobs()
+
+        ok.refresh_from_db()
+        short.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertEqual((ok.status, short.status), ("confirmed", "pending"))
+        self.assertEqual(self.product.stock_qty, 2)
+        failed = Job.objects.get(status=Job.STATUS_FAILED)
+        self.assertEqual(failed.payload["order_id"], short.pk)
+        self.assertIn("Not enough stock", failed.error)
+
+
+class AdminScalingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("boss", password="secret123")
+        cls.customer = Customer.objects.create(code="C1", name="Customer")
+        cls.product = make_product("A", stock_qty=10)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_order_changelist_queries_do_not_grow_with_rows(self):
+        make_order(self.customer, self.admin, [])
+        few = self.changelist_queries("/admin/erp/salesorder/")
+        for n in range(2, 12):
+            make_order(Customer.objects.create(code=f"C{n}", name="Other"), self.admin, [])
+        self.assertEqual(self.changelist_queries("/admin/erp/salesorder/"), few)
+
+    def test_large_unfiltered_tables_use_estimated_count(self):
+        products = [make_product(f"P{n}") for n in range(3)]
+        products[1].delete()
+        with self.settings(ERP_ADMIN_EXACT_COUNT_LIMIT=2):
+            paginator = EstimatedCountPaginator(Product.objects.order_by("pk"), 50)
+            # rowid span: A, P0, (deleted P1), P2.
+            self.assertEqual(paginator.count, 4)
+            filtered = EstimatedCountPaginator(Product.objects.filter(sku__startswith="P").order_by("pk"), 50)
+            self.assertEqual(filtered.count, 2)
+        self.assertEqual(EstimatedCountPaginator(Product.objects.order_by("pk"), 50).count, 3)
+
+    def test_confirm_from_admin_reads_old_status_from_form(self):
+        order = make_order(self.customer, self.admin, [(self.product, 4)])
+        item = order.items.get()
+        data = {
+            "customer": self.customer.pk,
+            "created_by": self.admin.pk,
+            "order_date": "2024-01-01",
+            "status": "confirmed",
+            "items-TOTAL_FORMS": "1",
+            "items-INITIAL_FORMS": "1",
+            "items-0-id": item.pk,
+            "items-0-order": order.pk,
+            "items-0-product": self.product.pk,
+            "items-0-qty": "4",
+            "items-0-price": "5.00",
+        }
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post(f"/admin/erp/salesorder/{order.pk}/change/", data)
+        self.assertEqual(resp.status_code, 302)
+        order_reads = [
+            q["sql"] for q in ctx.captured_queries
+            if q["sql"].startswith("SELECT") and 'FROM "erp_salesorder"' in q["sql"]
+        ]
+        self.assertEqual(len(order_reads), 1)
+
+        order.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertEqual(order.status, "confirmed")
+        self.assertEqual(self.product.stock_qty, 6)
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_seed_and_bench_cover_every_route(self):
+        out = io.StringIO()
+        call_command("seed_erp", products=20, customers=5, orders=30, movements=50, stdout=out)
+        self.assertEqual(Product.objects.filter(sku__startswith="BENCH-").count(), 20)
+        self.assertTrue(StockMovement.objects.filter(timestamp__lt=timezone.now() - timedelta(days=1)).exists())
+        self.assertTrue(StockMovement._meta.get_field("timestamp").auto_now_add)
+
+        with (
+            tempfile.NamedTemporaryFile(suffix=".json") as f,
+            tempfile.TemporaryDirectory() as media,
+            self.settings(ALLOWED_HOSTS=["testserver"], MEDIA_ROOT=media),
+        ):
+            call_command("bench_erp", requests=1, output=f.name, stdout=out, stderr=out)
+            report = json.load(f)
+
+        self.assertNotIn("No benchmark scenario", out.getvalue())
+        self.assertIn("flow: create/confirm/cancel", report["results"])
+        for name, result in report["results"].items():
+            self.assertTrue(all(status < 400 for status in result["statuses"]), name)
+            self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+
+
+@skipUnless(connection.vendor == "postgresql", "SQLite commits one writer at a time, in id order.")
+class CommittedMaxIdTests(TransactionTestCase):
+    def test_waits_for_lower_ids_still_being_inserted(self):
+        product = make_product("A", stock_qty=10)
+        inserted, release = threading.Event(), threading.Event()
+
+        def slow_insert():
+            try:
+                with transaction.atomic():
+                    StockMovement.objects.create(
+                        product=product, qty=-1, movement_type=StockMovement.MOVEMENT_SALE
+                    )
+                    inserted.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        def read_head():
+            try:
+                heads.append(committed_max_id(StockMovement))
+            finally:
+                connection.close()
+
+        heads = []
+        writer = threading.Thread(target=slow_insert)
+        writer.start()
+        inserted.wait(5)
+        # Commits first, with the higher id.
+        later = StockMovement.objects.create(
+            product=product, qty=-2, movement_type=StockMovement.MOVEMENT_SALE
+        )
+        reader = threading.Thread(target=read_head)
+        reader.start()
+        reader.join(0.2)
+        self.assertTrue(reader.is_alive())
+
+        release.set()
+        writer.join()
+        reader.join()
+        self.assertEqual(heads, [later.pk])
+        self.assertEqual(StockMovement.objects.filter(pk__lte=later.pk).count(), 2)
+
+
+class SalesOrderConcurrencyTests(TransactionTestCase):
+    def test_concurrent_confirms_never_oversell(self):
+        user = User.objects.create_user("sales", password="secret123")
+        customer = Customer.objects.create(code="C1", name="Customer")
+        product = make_product("HOT", stock_qty=12)
+        orders = [make_order(customer, user, [(product, 5)]) for _ in range(6)]
+
+        barrier = threading.Barrier(len(orders))
+        confirmed = []
+
+        def confirm(order):
+            barrier.wait()
+            try:
+                # SQLite reports lock contention instead of blocking, so
+                # retry like a client would until the stock check decides.
+                for _ in range(200):
+                    try:
+                        order.confirm(user=user)
+                    except OperationalError:
+                        time.sleep(0.005)
+                        continue
+                    confirmed.append(order.pk)
+                    break
+            except ValidationError:
+                pass
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=confirm, args=(o,)) for o in orders]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        product.refresh_from_db()
+        self.assertGreaterEqual(product.stock_qty, 0)
+        self.assertEqual(len(confirmed), 2)
+        self.assertEqual(product.stock_qty, 12 - 5 * len(confirmed))
+        self.assertEqual(
+            StockMovement.objects.filter(product=product).count(), len(confirmed)
+        )
+        self.assertEqual(
+            SalesOrder.objects.filter(status=SalesOrder.STATUS_CONFIRMED).count(),
+            len(confirmed),
+        )
+
+
+class IdempotencyConcurrencyTests(TransactionTestCase):
+    def test_concurrent_duplicates_run_once(self):
+        user = User.objects.create_user("sales", password="secret123")
+        user.groups.add(Group.objects.create(name="Sales"))
+        customer = Customer.objects.create(code="C1", name="Customer")
+        product = make_product("HOT", stock_qty=12)
+        payload = {
+            "customer": customer.pk,
+            "order_date": "2026-01-15",
+            "status": "confirmed",
+            "items": [{"product": product.pk, "qty": 5, "price": "5.00"}],
+        }
+
+        barrier = threading.Barrier(4)
+        responses = []
+
+        def submit():
+            client = APIClient()
+            client.force_authenticate(user)
+            barrier.wait()
+            try:
+                # SQLite reports lock contention instead of blocking, so
+                # retry like a client would.
+                for _ in range(200):
+                    try:
+                        resp = client.post(
+                            "/api/orders/create/", payload, format="json", HTTP_IDEMPOTENCY_KEY="dup"
+                        )
+                    except OperationalError:
+                        time.sleep(0.005)
+                        continue
+                    responses.append(resp)
+                    break
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=submit) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(responses), 4)
+        self.assertEqual({r.status_code for r in responses}, {201})
+        self.assertEqual(len({r.json()["id"] for r in responses}), 1)
+        self.assertEqual(SalesOrder.objects.count(), 1)
+        product.refresh_from_db()
+        self.assertEqual(product.stock_qty, 7)
@@ -1,21 +1,34 @@
 from django.urls import path
 
+from .async_views import (
+    AsyncProductListAPIView, AsyncProductRetrieveAPIView,
+    AsyncCustomerListAPIView, AsyncCustomerRetrieveAPIView,
+    AsyncSalesOrderListAPIView, AsyncSalesOrderRetrieveAPIView,
+    StockMovementStreamView,
+)
+from .metrics import metrics_view
 from .views import (
     ProductListAPIView, ProductCreateAPIView, ProductRetrieveAPIView,
-    ProductUpdateAPIView, ProductDeleteAPIView,
+    ProductUpdateAPIView, ProductDeleteAPIView, ProductImportAPIView,
     CustomerListAPIView, CustomerCreateAPIView, CustomerRetrieveAPIView,
     CustomerUpdateAPIView, CustomerDeleteAPIView,
     SalesOrderListAPIView, SalesOrderCreateAPIView, SalesOrderRetrieveAPIView,
+    SalesOrderBulkCreateAPIView, SalesOrderTransitionAPIView,
     SalesOrderUpdateAPIView, SalesOrderDeleteAPIView,
     StockMovementListAPIView, StockMovementRetrieveAPIView,
-    UserRegisterAPIView,ProductsExcelReportAPIView,
+    UserRegisterAPIView,ProductsExcelReportAPIView, ProductsCsvReportAPIView,
+    ProductSalesReportAPIView, CustomerSalesReportAPIView, DailySalesReportAPIView,
+    CustomerStatementAPIView,
+    JobRetrieveAPIView, JobResultAPIView, SearchAPIView,
 )
 
 
 urlpatterns = [
     path("auth/register/", UserRegisterAPIView.as_view(), name="register"),
+    path("search/", SearchAPIView.as_view()),
     path("products/", ProductListAPIView.as_view()),
     path("products/create/", ProductCreateAPIView.as_view()),
+    path("products/import/", ProductImportAPIView.as_view()),
     path("products/<int:pk>/", ProductRetrieveAPIView.as_view()),
     path("products/<int:pk>/update/", ProductUpdateAPIView.as_view()),
     path("products/<int:pk>/delete/", ProductDeleteAPIView.as_view()),
@@ -24,13 +37,30 @@ urlpatterns = [
     path("customers/<int:pk>/", CustomerRetrieveAPIView.as_view()),
     path("customers/<int:pk>/update/", CustomerUpdateAPIView.as_view()),
     path("customers/<int:pk>/delete/", CustomerDeleteAPIView.as_view()),
+    path("customers/<int:pk>/statement/", CustomerStatementAPIView.as_view()),
     path("orders/", SalesOrderListAPIView.as_view()),
     path("orders/create/", SalesOrderCreateAPIView.as_view()),
+    path("orders/bulk/", SalesOrderBulkCreateAPIView.as_view()),
+    path("orders/transition/", SalesOrderTransitionAPIView.as_view()),
     path("orders/<int:pk>/", SalesOrderRetrieveAPIView.as_view()),
     path("orders/<int:pk>/update/", SalesOrderUpdateAPIView.as_view()),
     path("orders/<int:pk>/delete/", SalesOrderDeleteAPIView.as_view()),
     path("stock-movements/", StockMovementListAPIView.as_view()),
     path("stock-movements/<int:pk>/", StockMovementRetrieveAPIView.as_view()),
+    path("stock-movements/stream/", StockMovementStreamView.as_view()),
     path("reports/products.xlsx", ProductsExcelReportAPIView.as_view()),
+    path("reports/products.csv", ProductsCsvReportAPIView.as_view()),
+    path("reports/sales/products/", ProductSalesReportAPIView.as_view()),
+    path("reports/sales/customers/", CustomerSalesReportAPIView.as_view()),
+    path("reports/sales/daily/", DailySalesReportAPIView.as_view()),
+    path("jobs/<int:pk>/", JobRetrieveAPIView.as_view(), name="job-detail"),
+    path("jobs/<int:pk>/result/", JobResultAPIView.as_view(), name="job-result"),
+    path("metrics/", metrics_view, name="metrics"),
+    path("async/products/", AsyncProductListAPIView.as_view()),
+    path("async/products/<int:pk>/", AsyncProductRetrieveAPIView.as_view()),
+    path("async/customers/", AsyncCustomerListAPIView.as_view()),
+    path("async/customers/<int:pk>/", AsyncCustomerRetrieveAPIView.as_view()),
+    path("async/orders/", AsyncSalesOrderListAPIView.as_view()),
+    path("async/orders/<int:pk>/", AsyncSalesOrderRetrieveAPIView.as_view()),
 
 ]
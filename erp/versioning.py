@@ -0,0 +1,104 @@
+"""
+Optimistic concurrency for product and order updates.
+
+``Product`` and ``SalesOrder`` carry a ``version`` column that every write
+bumps. Detail responses send it as a strong ETag. Update requests must echo
+it in ``If-Match`` (428 without one) and are applied as one conditional
+``UPDATE ... WHERE version = <If-Match>``, so a request that lost the race
+gets 412 straight away instead of queueing on a row lock.
+"""
+from django.db.models import F
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from .caching import bump_table_version
+from .models import VersionConflict
+
+
+class PreconditionRequired(APIException):
+    status_code = status.HTTP_428_PRECONDITION_REQUIRED
+    default_detail = "Updates require an If-Match header with the resource's ETag."
+    default_code = "precondition_required"
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = "The resource changed since it was read; fetch it again and retry."
+    default_code = "precondition_failed"
+
+
+def version_etag(version):
+    return '"%d"' % version
+
+
+def expected_version(request, instance):
+    """The version ``request``'s If-Match header allows ``instance`` to be at."""
+    header = request.headers.get("If-Match")
+    if not header:
+        raise PreconditionRequired()
+    etags = parse_etags(header)
+    if etags != ["*"] and version_etag(instance.version) not in etags:
+        raise PreconditionFailed()
+    return instance.version
+
+
+class VersionedUpdateMixin:
+    """
+    ``update()`` for UpdateAPIView subclasses of versioned models. The
+    If-Match check runs against the loaded row; ``perform_versioned_update``
+    then writes conditionally on that version, which catches any change
+    made in between.
+    """
+
+    def update(self, request, *args, **kwargs):
+        partial = kwargs.pop("partial", False)
+        instance = self.get_object()
+        version = expected_version(request, instance)
+        serializer = self.get_serializer(instance, data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        try:
+            self.perform_versioned_update(serializer, version)
+        except VersionConflict:
+            raise PreconditionFailed()
+
+        response = Response(serializer.data)
+        response["ETag"] = version_etag(serializer.instance.version)
+        return response
+
+    def perform_versioned_update(self, serializer, version):
+        instance = serializer.instance
+        fields = serializer.validated_data
+        model = type(instance)
+        updated = model._default_manager.filter(pk=instance.pk, version=version).update(
+            version=F("version") + 1, **fields
+        )
+        if not updated:
+            raise VersionConflict()
+        for name, value in fields.items():
+            setattr(instance, name, value)
+        instance.version = version + 1
+        # queryset.update() sends no post_save.
+        bump_table_version(model)
+
+
+class VersionETagMixin:
+    """
+    Adds the row-version ETag to RetrieveAPIView responses; placed before
+    ConditionalGetMixin it also becomes that mixin's ETag.
+    """
+
+    def get_object(self):
+        if not hasattr(self, "_object"):
+            self._object = super().get_object()
+        return self._object
+
+    def get_etag(self, cache_key):
+        return version_etag(self.get_object().version)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        response = Response(self.get_serializer(instance).data)
+        response["ETag"] = version_etag(instance.version)
+        return response
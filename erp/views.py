@@ -1,17 +1,44 @@
-from rest_framework import generics
+from datetime import datetime, time, timedelta
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.db.models import Sum
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import generics, status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 
-from .models import Product, Customer, SalesOrder, StockMovement
+from .models import (
+    Product, Customer, Job, SalesOrder, StockMovement, StockMovementArchive,
+    DailyCustomerSales, DailyProductSales, transition_orders,
+)
 from .serializers import (
     ProductSerializer,
     CustomerSerializer,
     SalesOrderSerializer,
     StockMovementSerializer,
 )
+from .caching import ConditionalGetMixin
+from .idempotency import IdempotentMixin
+from .importers import ProductImportError, import_products, read_rows
+from .jobs import AsyncJobMixin, enqueue
+from .search import search
+from .versioning import VersionETagMixin, VersionedUpdateMixin, expected_version
+from .read_serializers import (
+    PRODUCT_FIELDS, SALES_ORDER_FIELDS, STOCK_MOVEMENT_FIELDS,
+    product_rows, sales_order_rows, stock_movement_rows,
+)
+from .pagination import LedgerCursorPagination
 from .permissions import (
     ProductPermission,
     CustomerPermission,
     SalesOrderPermission,
+    is_admin,
 )
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework import generics, permissions
@@ -23,6 +50,14 @@ from .serializers import (
     SalesOrderSerializer,
     StockMovementSerializer,
     UserRegisterSerializer,
+    ProductSalesReportSerializer,
+    CustomerSalesReportSerializer,
+    DailySalesReportSerializer,
+    CustomerStatementSerializer,
+    JobSerializer,
+    OrderTransitionSerializer,
+    SearchResultSerializer,
+    prefetch_order_relations,
 )
 
 
@@ -31,10 +66,101 @@ class UserRegisterAPIView(generics.CreateAPIView):
     serializer_class = UserRegisterSerializer
     permission_classes = [permissions.AllowAny]
 
-class ProductListAPIView(generics.ListAPIView):
+class ValuesListMixin:
+    """
+    Read-only fast path for list views: page over ``values(*read_fields)``
+    and render the rows with ``render_rows`` instead of the serializer.
+    """
+
+    read_fields = ()
+    render_rows = None
+
+    def get_read_fields(self, queryset):
+        return self.read_fields
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        queryset = queryset.values(*self.get_read_fields(queryset))
+
+        page = self.paginate_queryset(queryset)
+        rows = page if page is not None else list(queryset)
+        data = self.render_rows(rows)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
+class StockAsOfMixin:
+    """Adds ``stock_as_of`` to products when ``?as_of=<date or datetime>`` is given."""
+
+    def get_as_of(self):
+        raw = self.request.query_params.get("as_of")
+        if not raw:
+            return None
+
+        try:
+            when = parse_datetime(raw)
+            day = parse_date(raw) if when is None else None
+        except ValueError:
+            # Well-formed but impossible, e.g. 2026-02-30.
+            when = day = None
+        if when is None:
+            if day is None:
+                raise ValidationError({"as_of": "Expected an ISO date or datetime."})
+            when = datetime.combine(day, time.max)
+        if timezone.is_naive(when):
+            when = timezone.make_aware(when)
+        return when
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        when = self.get_as_of()
+        if when is not None:
+            qs = qs.with_stock_as_of(when)
+        return qs
+
+
+class ProductListAPIView(ConditionalGetMixin, ValuesListMixin, StockAsOfMixin, generics.ListAPIView):
     queryset = Product.objects.all().order_by("id")
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticated, ProductPermission]
+    version_models = (Product,)
+    read_fields = PRODUCT_FIELDS
+    render_rows = staticmethod(product_rows)
+
+    def get_read_fields(self, queryset):
+        fields = list(self.read_fields)
+        if "stock_as_of" in queryset.query.annotations:
+            fields.append("stock_as_of")
+        return fields
+
+
+class SearchAPIView(ConditionalGetMixin, generics.ListAPIView):
+    """
+    Type-ahead lookup: ``?q=<terms>&type=products|customers&limit=<n>``.
+    Every term is matched as a word prefix; best matches come first.
+    """
+
+    serializer_class = SearchResultSerializer
+    permission_classes = [IsAuthenticated]
+    version_models = (Product, Customer)
+    search_models = {"products": Product, "customers": Customer}
+    pagination_class = None
+    default_limit = 10
+    max_limit = 50
+
+    def list(self, request, *args, **kwargs):
+        params = request.query_params
+        kinds = params.get("type", "products,customers").split(",")
+        if not set(kinds) <= set(self.search_models):
+            raise ValidationError({"type": "Expected products and/or customers."})
+        try:
+            limit = max(1, min(int(params.get("limit", self.default_limit)), self.max_limit))
+        except ValueError:
+            raise ValidationError({"limit": "Expected an integer."})
+
+        query = params.get("q", "")
+        return Response({kind: search(self.search_models[kind], query, limit) for kind in kinds})
 
 
 class ProductCreateAPIView(generics.CreateAPIView):
@@ -43,13 +169,40 @@ class ProductCreateAPIView(generics.CreateAPIView):
     permission_classes = [IsAuthenticated, ProductPermission]
 
 
-class ProductRetrieveAPIView(generics.RetrieveAPIView):
+class ProductRetrieveAPIView(VersionETagMixin, ConditionalGetMixin, StockAsOfMixin, generics.RetrieveAPIView):
+    queryset = Product.objects.all()
+    serializer_class = ProductSerializer
+    permission_classes = [IsAuthenticated, ProductPermission]
+    version_models = (Product,)
+
+
+class ProductImportAPIView(generics.GenericAPIView):
+    """
+    Upsert products by ``sku`` from an uploaded ``file`` (.xlsx or .csv).
+    Returns the number of upserted rows and the rejected ones.
+    """
+
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticated, ProductPermission]
+    parser_classes = [MultiPartParser]
+    chunk_size = 1000
+
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response({"file": "This field is required."}, status=status.HTTP_400_BAD_REQUEST)
 
+        try:
+            result = import_products(
+                read_rows(upload, upload.name), chunk_size=self.chunk_size, user=request.user
+            )
+        except ProductImportError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_200_OK)
 
-class ProductUpdateAPIView(generics.UpdateAPIView):
+
+class ProductUpdateAPIView(VersionedUpdateMixin, generics.UpdateAPIView):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticated, ProductPermission]
@@ -62,10 +215,11 @@ class ProductDeleteAPIView(generics.DestroyAPIView):
 
 # ========= CUSTOMERS =========
 
-class CustomerListAPIView(generics.ListAPIView):
+class CustomerListAPIView(ConditionalGetMixin, generics.ListAPIView):
     queryset = Customer.objects.all().order_by("id")
     serializer_class = CustomerSerializer
     permission_classes = [IsAuthenticated, CustomerPermission]
+    version_models = (Customer,)
 
 
 class CustomerCreateAPIView(generics.CreateAPIView):
@@ -74,10 +228,11 @@ class CustomerCreateAPIView(generics.CreateAPIView):
     permission_classes = [IsAuthenticated, CustomerPermission]
 
 
-class CustomerRetrieveAPIView(generics.RetrieveAPIView):
+class CustomerRetrieveAPIView(ConditionalGetMixin, generics.RetrieveAPIView):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
     permission_classes = [IsAuthenticated, CustomerPermission]
+    version_models = (Customer,)
 
 
 class CustomerUpdateAPIView(generics.UpdateAPIView):
@@ -92,33 +247,161 @@ class CustomerDeleteAPIView(generics.DestroyAPIView):
     permission_classes = [IsAuthenticated, CustomerPermission]
 # ========= SALES ORDERS =========
 
-class SalesOrderListAPIView(generics.ListAPIView):
-    queryset = (
-        SalesOrder.objects.all()
-        .select_related("customer", "created_by")
-        .prefetch_related("items")
-    )
+class SalesOrderListAPIView(ValuesListMixin, generics.ListAPIView):
+    queryset = SalesOrder.objects.all().order_by("id")
     serializer_class = SalesOrderSerializer
     permission_classes = [IsAuthenticated, SalesOrderPermission]
+    read_fields = SALES_ORDER_FIELDS
+    render_rows = staticmethod(sales_order_rows)
 
 
-class SalesOrderCreateAPIView(generics.CreateAPIView):
+class SalesOrderCreateAPIView(IdempotentMixin, generics.CreateAPIView):
     queryset = SalesOrder.objects.all()
     serializer_class = SalesOrderSerializer
     permission_classes = [IsAuthenticated, SalesOrderPermission]
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.method == "POST":
+            context.update(prefetch_order_relations([self.request.data]))
+        return context
+
+
+class SalesOrderBulkCreateAPIView(generics.GenericAPIView):
+    """
+    Create many orders in one request (POS end-of-shift sync).
+
+    Products and customers for the whole batch are resolved up front; each
+    order is then created in its own savepoint so one bad order does not
+    discard the rest. Returns one result per submitted order, in order.
+    """
 
-class SalesOrderRetrieveAPIView(generics.RetrieveAPIView):
+    queryset = SalesOrder.objects.all()
+    serializer_class = SalesOrderSerializer
+    permission_classes = [IsAuthenticated, SalesOrderPermission]
+    max_batch_size = 500
+
+    def post(self, request, *args, **kwargs):
+        orders = request.data
+        if not isinstance(orders, list):
+            return Response(
+                {"detail": "Expected a list of orders."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(orders) > self.max_batch_size:
+            return Response(
+                {"detail": f"At most {self.max_batch_size} orders per request."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        context = self.get_serializer_context()
+        context.update(prefetch_order_relations(orders))
+
+        results = []
+        for index, data in enumerate(orders):
+            serializer = self.get_serializer_class()(data=data, context=context)
+            if not serializer.is_valid():
+                results.append({"index": index, "ok": False, "errors": serializer.errors})
+                continue
+
+            try:
+                with transaction.atomic():
+                    order = serializer.save()
+            except DjangoValidationError as e:
+                results.append({"index": index, "ok": False, "errors": e.messages})
+                continue
+
+            results.append(
+                {
+                    "index": index,
+                    "ok": True,
+                    "id": order.id,
+                    "order_number": order.order_number,
+                    "status": order.status,
+                    "total_amount": str(order.total_amount),
+                }
+            )
+
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+
+class SalesOrderRetrieveAPIView(VersionETagMixin, generics.RetrieveAPIView):
     queryset = SalesOrder.objects.all().select_related("customer", "created_by")
     serializer_class = SalesOrderSerializer
     permission_classes = [IsAuthenticated, SalesOrderPermission]
 
 
-class SalesOrderUpdateAPIView(generics.UpdateAPIView):
+class SalesOrderUpdateAPIView(IdempotentMixin, AsyncJobMixin, VersionedUpdateMixin, generics.UpdateAPIView):
     queryset = SalesOrder.objects.all().select_related("customer", "created_by")
     serializer_class = SalesOrderSerializer
     permission_classes = [IsAuthenticated, SalesOrderPermission]
 
+    def update(self, request, *args, **kwargs):
+        if not self.wants_async(request):
+            return super().update(request, *args, **kwargs)
+
+        # Validate now, confirm/cancel in the job worker.
+        order = self.get_object()
+        version = expected_version(request, order)
+        serializer = self.get_serializer(order, data=request.data, partial=kwargs.get("partial", False))
+        serializer.is_valid(raise_exception=True)
+        job = enqueue(
+            "order_status",
+            {
+                "order_id": order.pk,
+                "status": serializer.validated_data.get("status", order.status),
+                "version": version,
+            },
+            user=request.user,
+        )
+        return self.accepted(job)
+
+    def perform_versioned_update(self, serializer, version):
+        # Stock and rollups move with the status, so this goes through
+        # SalesOrder.set_status rather than a plain field update.
+        serializer.save(expected_version=version)
+
+
+class TransitionConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Orders changed concurrently, please retry."
+    default_code = "conflict"
+
+
+class SalesOrderTransitionAPIView(IdempotentMixin, AsyncJobMixin, generics.GenericAPIView):
+    """
+    Move many orders to one status (back-office end-of-day confirm).
+
+    Runs as a single ``transition_orders`` call: products are locked once
+    and stock is written netted across the orders. Orders that fail the
+    stock check are reported and left as they were; the rest go through.
+    ``Prefer: respond-async`` (or ``?async=1``) runs it as a background job.
+    """
+
+    queryset = SalesOrder.objects.all()
+    serializer_class = OrderTransitionSerializer
+    permission_classes = [IsAuthenticated, SalesOrderPermission]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        order_ids = serializer.validated_data["orders"]
+        new_status = serializer.validated_data["status"]
+
+        if self.wants_async(request):
+            job = enqueue(
+                "order_transition", {"orders": order_ids, "status": new_status}, user=request.user
+            )
+            return self.accepted(job)
+
+        try:
+            results = transition_orders(order_ids, new_status, user=request.user)
+        except DjangoValidationError as e:
+            # Raised, not returned, so an Idempotency-Key is not bound to it
+            # and the retry the message asks for can go through.
+            raise TransitionConflict(e.messages[0])
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
 
 class SalesOrderDeleteAPIView(generics.DestroyAPIView):
     queryset = SalesOrder.objects.all()
@@ -128,48 +411,230 @@ class SalesOrderDeleteAPIView(generics.DestroyAPIView):
 # ========= STOCK MOVEMENTS =========
 
 class StockMovementListAPIView(generics.ListAPIView):
-    queryset = (
-        StockMovement.objects.all()
-        .select_related("product", "user")
-        .order_by("-timestamp")
-    )
+    """The ledger, hot and archived movements merged by LedgerCursorPagination."""
+
+    queryset = StockMovement.objects.all().order_by("-timestamp", "id")
     serializer_class = StockMovementSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = LedgerCursorPagination
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginator.paginate_ledger(
+            self.get_queryset().values(*STOCK_MOVEMENT_FIELDS),
+            StockMovementArchive.objects.values(*STOCK_MOVEMENT_FIELDS),
+            request,
+            view=self,
+        )
+        return self.get_paginated_response(stock_movement_rows(page))
 
 
 class StockMovementRetrieveAPIView(generics.RetrieveAPIView):
-    queryset = StockMovement.objects.all().select_related("product", "user")
+    queryset = StockMovement.objects.ledger().select_related("product", "user")
     serializer_class = StockMovementSerializer
     permission_classes = [IsAuthenticated]
 
-import openpyxl
-from openpyxl.utils import get_column_letter
-from django.http import HttpResponse
+    def get_object(self):
+        # Archived movements keep their id; StockMovementSerializer renders
+        # either model.
+        try:
+            return super().get_object()
+        except Http404:
+            return get_object_or_404(
+                StockMovementArchive.objects.select_related("product", "user"),
+                pk=self.kwargs["pk"],
+            )
+
+import csv
+import tempfile
+
+from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
+
+from .reports import (
+    PRODUCT_REPORT_HEADERS, XLSX_CONTENT_TYPE, customer_statement, product_report_rows,
+    write_products_xlsx,
+)
+
+
+class ProductsExcelReportAPIView(AsyncJobMixin, generics.ListAPIView):
+    """
+    The product report as xlsx. An xlsx file is a zip that is only complete
+    once written, so it is built in a temporary file before the first byte
+    is sent. Catalogues over ERP_REPORT_XLSX_MAX_ROWS products are therefore
+    always exported by a job (202 + job URL, as with ``Prefer:
+    respond-async``); the CSV report streams at any size.
+    """
 
-class ProductsExcelReportAPIView(generics.ListAPIView):
     queryset = Product.objects.all().order_by("id")
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticated, ProductPermission]
+    report_format = "xlsx"
 
     def get(self, request, *args, **kwargs):
         qs = self.filter_queryset(self.get_queryset())  # ✅ نفس filters/search/order لو موجودين
+        if self.wants_async(request) or qs[settings.ERP_REPORT_XLSX_MAX_ROWS :].exists():
+            return self.accepted(
+                enqueue("products_report", {"format": self.report_format}, user=request.user)
+            )
+
+        out = tempfile.TemporaryFile()
+        write_products_xlsx(qs, out)
+        out.seek(0)
+        return FileResponse(
+            out,
+            as_attachment=True,
+            filename="products_report.xlsx",
+            content_type=XLSX_CONTENT_TYPE,
+        )
 
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Products"
 
-        headers = ["ID", "SKU", "Name", "Category", "Cost", "Selling", "Stock"]
-        ws.append(headers)
+class _Echo:
+    def write(self, value):
+        return value
 
-        for p in qs:
-            ws.append([p.id, p.sku, p.name, p.category, float(p.cost_price), float(p.selling_price), p.stock_qty])
 
-        for col in range(1, len(headers) + 1):
-            ws.column_dimensions[get_column_letter(col)].width = 18
+class ProductsCsvReportAPIView(ProductsExcelReportAPIView):
+    """Same report as CSV, streamed to the client row by row."""
 
-        resp = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-        resp["Content-Disposition"] = 'attachment; filename="products_report.xlsx"'
-        wb.save(resp)
+    report_format = "csv"
+
+    def get(self, request, *args, **kwargs):
+        if self.wants_async(request):
+            return self.accepted(
+                enqueue("products_report", {"format": self.report_format}, user=request.user)
+            )
+
+        qs = self.filter_queryset(self.get_queryset())
+        writer = csv.writer(_Echo())
+
+        def rows():
+            yield writer.writerow(PRODUCT_REPORT_HEADERS)
+            for row in product_report_rows(qs):
+                yield writer.writerow(row)
+
+        resp = StreamingHttpResponse(rows(), content_type="text/csv")
+        resp["Content-Disposition"] = 'attachment; filename="products_report.csv"'
         return resp
+
+
+# ========= SALES REPORTS =========
+
+class SalesReportAPIView(generics.ListAPIView):
+    """
+    Base for the sales reports. They read only the daily rollup tables, so
+    the cost depends on the ``start``/``end`` range, not on order history.
+    """
+
+    permission_classes = [IsAuthenticated, SalesOrderPermission]
+    pagination_class = None
+    default_days = 30
+    default_limit = 50
+    max_limit = 500
+
+    def get_date_range(self):
+        params = self.request.query_params
+        try:
+            end = parse_date(params["end"]) if params.get("end") else timezone.localdate()
+            start = parse_date(params["start"]) if params.get("start") else None
+        except ValueError:
+            end = start = None
+        if end is not None and start is None and not params.get("start"):
+            start = end - timedelta(days=self.default_days - 1)
+        if start is None or end is None:
+            raise ValidationError({"detail": "start/end must be ISO dates."})
+        if start > end:
+            raise ValidationError({"detail": "start must not be after end."})
+        return start, end
+
+    def get_limit(self):
+        try:
+            limit = int(self.request.query_params.get("limit", self.default_limit))
+        except ValueError:
+            raise ValidationError({"limit": "Expected an integer."})
+        return max(1, min(limit, self.max_limit))
+
+
+class ProductSalesReportAPIView(SalesReportAPIView):
+    serializer_class = ProductSalesReportSerializer
+
+    def get_queryset(self):
+        return (
+            DailyProductSales.objects.filter(day__range=self.get_date_range())
+            .values("product_id", "product__sku", "product__name")
+            .annotate(qty=Sum("qty"), revenue=Sum("revenue"))
+            .order_by("-revenue", "product_id")[: self.get_limit()]
+        )
+
+
+class CustomerSalesReportAPIView(SalesReportAPIView):
+    serializer_class = CustomerSalesReportSerializer
+
+    def get_queryset(self):
+        return (
+            DailyCustomerSales.objects.filter(day__range=self.get_date_range())
+            .values("customer_id", "customer__code", "customer__name")
+            .annotate(orders=Sum("orders"), revenue=Sum("revenue"))
+            .order_by("-revenue", "customer_id")[: self.get_limit()]
+        )
+
+
+class DailySalesReportAPIView(SalesReportAPIView):
+    serializer_class = DailySalesReportSerializer
+
+    def get_queryset(self):
+        return (
+            DailyCustomerSales.objects.filter(day__range=self.get_date_range())
+            .values("day")
+            .annotate(orders=Sum("orders"), revenue=Sum("revenue"))
+            .order_by("day")
+        )
+
+
+class CustomerStatementAPIView(SalesReportAPIView):
+    """
+    A customer's confirmed orders over ``start``/``end`` with a running
+    balance, opened from the nearest balance checkpoint before ``start``.
+    """
+
+    queryset = Customer.objects.all()
+    serializer_class = CustomerStatementSerializer
+
+    def list(self, request, *args, **kwargs):
+        customer = self.get_object()
+        start, end = self.get_date_range()
+        return Response(self.get_serializer(customer_statement(customer, start, end)).data)
+
+
+# ========= JOBS =========
+
+class JobQuerysetMixin:
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if is_admin(self.request.user):
+            return qs
+        return qs.filter(created_by=self.request.user)
+
+
+class JobRetrieveAPIView(JobQuerysetMixin, generics.RetrieveAPIView):
+    pass
+
+
+class JobResultAPIView(JobQuerysetMixin, generics.RetrieveAPIView):
+    def retrieve(self, request, *args, **kwargs):
+        job = self.get_object()
+        if job.status != Job.STATUS_SUCCEEDED:
+            return Response(
+                {"detail": "Job has no result.", "status": job.status, "error": job.error},
+                status=status.HTTP_409_CONFLICT,
+            )
+        if job.result_file:
+            return FileResponse(
+                job.result_file.open("rb"),
+                as_attachment=True,
+                filename=job.result_file.name.rsplit("/", 1)[-1],
+            )
+        return Response(job.result)
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -47,6 +50,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'erp.metrics.RequestMetricsMiddleware',
+    'erp.db.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -78,14 +83,89 @@ WSGI_APPLICATION = 'mini_erp.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Profiles are picked with ERP_DB_PROFILE ("sqlite" or "postgres"). Setting
+# ERP_DB_REPLICA adds a "replica" alias for safe-method reads (see erp/db.py):
+# a file path for SQLite (the primary's own path gives a second, WAL-backed
+# reader connection), a host for PostgreSQL.
+
+ERP_DB_PROFILE = os.environ.get("ERP_DB_PROFILE", "sqlite")
+ERP_DB_REPLICA = os.environ.get("ERP_DB_REPLICA", "")
+ERP_DB_REPLICA_ALIAS = "replica"
+
+_conn = {
+    "CONN_MAX_AGE": int(os.environ.get("ERP_DB_CONN_MAX_AGE", 60)),
+    "CONN_HEALTH_CHECKS": True,
+}
+
+if ERP_DB_PROFILE == "sqlite":
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get("ERP_DB_NAME", BASE_DIR / 'db.sqlite3'),
+            **_conn,
+        }
     }
+    _replica = {"NAME": ERP_DB_REPLICA}
+elif ERP_DB_PROFILE == "postgres":
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get("ERP_DB_NAME", "mini_erp"),
+            'USER': os.environ.get("ERP_DB_USER", ""),
+            'PASSWORD': os.environ.get("ERP_DB_PASSWORD", ""),
+            'HOST': os.environ.get("ERP_DB_HOST", ""),
+            'PORT': os.environ.get("ERP_DB_PORT", ""),
+            **_conn,
+        }
+    }
+    _replica = {"HOST": ERP_DB_REPLICA}
+else:
+    raise ImproperlyConfigured(f"Unknown ERP_DB_PROFILE {ERP_DB_PROFILE!r}.")
+
+if ERP_DB_REPLICA:
+    DATABASES[ERP_DB_REPLICA_ALIAS] = {
+        **DATABASES["default"],
+        **_replica,
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["erp.db.ReadReplicaRouter"]
+
+# Applied to every SQLite connection; WAL lets readers run alongside the
+# order-confirm writers instead of queueing on the database lock.
+ERP_SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "busy_timeout": int(os.environ.get("ERP_SQLITE_BUSY_TIMEOUT_MS", 5000)),
+    "synchronous": "NORMAL",
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Rendered catalogue responses keyed by ETag (see erp/caching.py).
+    "erp_responses": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "erp-responses",
+        "TIMEOUT": 300,
+        "OPTIONS": {"MAX_ENTRIES": 1000},
+    },
+}
+
+ERP_RESPONSE_CACHE = "erp_responses"
+# How long a process trusts its cached table versions; the bound on how stale
+# conditional GETs are after another process writes.
+ERP_TABLE_VERSION_CACHE_TIMEOUT = 2
+ERP_RESPONSE_CACHE_MAX_BYTES = 256 * 1024
+
+# Bearer token required by /api/metrics/; when unset only local scrapers are allowed.
+ERP_METRICS_TOKEN = None
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -119,13 +199,60 @@ USE_TZ = True
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "erp.authentication.ClaimsJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticated",
     ),
+    "DEFAULT_PAGINATION_CLASS": "erp.pagination.IdCursorPagination",
+}
+
+# Access tokens carry a user snapshot and role claims (see erp/authentication.py).
+# A process trusts its cached token versions for ERP_TOKEN_VERSION_CACHE_TIMEOUT
+# seconds, so claims revoked by another process are honoured at most that long.
+ERP_TOKEN_VERSION_CACHE_TIMEOUT = 5
+SIMPLE_JWT = {
+    "TOKEN_OBTAIN_SERIALIZER": "erp.authentication.RoleClaimsTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "erp.authentication.RoleClaimsTokenRefreshSerializer",
 }
 
+# reports/products.xlsx is built whole before it is sent, so larger catalogues
+# are exported through a job instead (reports/products.csv always streams).
+ERP_REPORT_XLSX_MAX_ROWS = 20_000
+
+# Background jobs (see erp/jobs.py and `manage.py run_jobs`). A running job
+# older than ERP_JOB_TIMEOUT seconds is assumed lost and retried.
+ERP_JOB_TIMEOUT = 60 * 30
+ERP_JOB_MAX_ATTEMPTS = 3
+
+# Responses to requests sent with an Idempotency-Key are replayed for
+# retries within ERP_IDEMPOTENCY_TTL seconds (see erp/idempotency.py);
+# `manage.py purge_idempotency_keys` deletes older ones.
+ERP_IDEMPOTENCY_TTL = 60 * 60 * 24
+
+# `manage.py archive_stock_movements` moves ledger rows older than this many
+# days to StockMovementArchive, leaving one carry-forward row per product.
+ERP_STOCK_MOVEMENT_HOT_DAYS = 180
+
+# stock-movements/stream/ (see erp/stock_feed.py): the most movements a
+# reconnecting client is sent from Last-Event-ID before it is told to reload
+# (and the most read per poll), how often in seconds each process reads new
+# movements while streams are open, the idle keepalive interval in seconds,
+# and the most undelivered events a slow client may hold before its stream is
+# closed.
+ERP_STOCK_FEED_BACKLOG = 1000
+ERP_STOCK_FEED_POLL_INTERVAL = 2
+ERP_STOCK_FEED_KEEPALIVE = 15
+ERP_STOCK_FEED_MAX_PENDING = 1000
+
+# Admin changelists of larger (unfiltered) tables show an estimated count.
+ERP_ADMIN_EXACT_COUNT_LIMIT = 50_000
+
+# Sales order numbering (see erp/numbering.py)
+ERP_ORDER_NUMBER_ALLOCATOR = "erp.numbering.BlockOrderNumberAllocator"
+ERP_ORDER_NUMBER_FORMAT = "SO-{year}-{seq:06d}"
+ERP_ORDER_NUMBER_BLOCK_SIZE = 50
+
 SPECTACULAR_SETTINGS = {
     "TITLE": "Mini ERP API",
     "DESCRIPTION": "ERP system for Products, Customers, Sales Orders, Stock Movements, and Auth.",
@@ -140,6 +267,8 @@ SPECTACULAR_SETTINGS = {
             "bearerFormat": "JWT",
         }
     },
+    # Order statuses appear on SalesOrder and the orders/transition/ request.
+    "ENUM_NAME_OVERRIDES": {"SalesOrderStatusEnum": "erp.models.SalesOrder.STATUS_CHOICES"},
 }
 
 
@@ -147,3 +276,7 @@ SPECTACULAR_SETTINGS = {
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
 STATIC_URL = 'static/'
+
+# Uploaded / generated files (job results)
+MEDIA_ROOT = BASE_DIR / 'media'
+MEDIA_URL = 'media/'